@@ -5,18 +5,21 @@ This module contains the AI model integration for analyzing road images.
 It uses OpenCV and TensorFlow for image processing and defect detection.
 """
 
+import hashlib
+import shutil
+import time
+
 import cv2
 import numpy as np
 from pathlib import Path
 from django.conf import settings
 import logging
 
-try:
-    import google.generativeai as genai
-    _HAS_GEMINI = True
-except ImportError:
-    genai = None
-    _HAS_GEMINI = False
+from .localization import localize
+from .preprocessing import DEFAULT_INPUT_SIZE, PreprocessPipeline
+from .circuit_breaker import CircuitOpenError
+from .remote_vision import RemoteVisionError, get_remote_vision_client
+from .result_cache import get_result_cache
 
 logger = logging.getLogger(__name__)
 
@@ -29,53 +32,140 @@ class RoadDefectDetector:
     In production, replace this with a trained deep learning model.
     """
     
+    GEMINI_MODEL_NAME = "Gemini 1.5 Flash"
+    GEMINI_MODEL_VERSION = "1.0"
+    
+    GEMINI_PROMPT = """
+You are a pavement engineer. Analyze this road surface image and respond ONLY with a compact JSON object.
+Keys:
+- defect_type: one of [crack, pothole, rough_surface, alligator_crack, edge_crack, joint_crack, no_defect]
+- severity_score: number from 0 to 100 (higher = worse)
+- condition_label: one of [good, moderate, poor, critical]
+- ai_confidence: number between 0 and 1
+- maintenance_suggestion: 1–3 sentence maintenance recommendation
+"""
+    
+    # Model input the detector consumes, see analysis.preprocessing
+    INPUT_REPRESENTATION = 'gray'
+    INPUT_SIZE = DEFAULT_INPUT_SIZE
+    
+    # (lower edge density bound, defect type, severity per unit density), most severe first
+    EDGE_DENSITY_CLASSES = (
+        (0.15, 'crack', 300),
+        (0.10, 'rough_surface', 250),
+        (0.05, 'edge_crack', 200),
+    )
+    
+    # Confidence: distance of the edge density from the nearest class bound
+    # (certain at CONFIDENCE_MARGIN or more), combined with how many tiles of
+    # each CONFIDENCE_GRIDS subdivision fall in the same class as the whole
+    # frame, mapped onto CONFIDENCE_RANGE
+    CONFIDENCE_MARGIN = 0.025
+    CONFIDENCE_GRIDS = (2, 4)
+    CONFIDENCE_MARGIN_WEIGHT = 0.6
+    CONFIDENCE_RANGE = (0.5, 0.95)
+    
+    SIMPLE_MODEL_NAME = "SimpleDetector"
+    SIMPLE_MODEL_VERSION = "1.2"
+    
     def __init__(self):
-        self.model_name = "SimpleDetector"
-        self.model_version = "1.0"
+        self.model_name = self.SIMPLE_MODEL_NAME
+        self.model_version = self.SIMPLE_MODEL_VERSION
         self.confidence_threshold = getattr(settings, 'AI_CONFIDENCE_THRESHOLD', 0.5)
+        
+        # Trained model from analysis.backends, or None for the edge detector
+        self.backend = None
+        self.input_representation = self.INPUT_REPRESENTATION
+        self.input_size = self.INPUT_SIZE
+        self.build_pipeline()
     
-    def load_model(self):
+    def build_pipeline(self):
+        """Create the preprocessing pipeline for the active model's input"""
+        # Analysis also needs the decoded frame to annotate; annotated images
+        # are only shown downscaled, so it need not be full resolution
+        self.pipeline = PreprocessPipeline(
+            (self.input_representation, 'original'),
+            size=self.input_size,
+            original_min_size=getattr(settings, 'AI_ANNOTATION_MIN_SIZE', 1600) or None,
+        )
+    
+    def load_model(self, intra_op_threads=None):
         """
         Load the AI model.
         
-        In production, this should load a pre-trained model:
-        - TensorFlow/Keras model (.h5)
-        - PyTorch model (.pth)
-        - ONNX model (.onnx)
+        settings.AI_MODEL_BACKEND names a backend from analysis.backends
+        (e.g. 'onnxruntime') that loads the settings.AI_MODEL_PRECISION variant
+        listed in the manifest of settings.AI_MODEL_PATH, or
+        settings.AI_MODEL_FILE if there is no manifest. Without a backend, or
+        if the model cannot be loaded, the built-in edge detector is used.
         
-        Example:
-            self.model = tf.keras.models.load_model('path/to/model.h5')
+        Args:
+            intra_op_threads: Overrides settings.AI_INTRA_OP_THREADS, e.g. for
+                worker processes pinned to a thread count
         """
-        # Placeholder - implement actual model loading
+        from .backends import load_backend, resolve_model_file, variant_version
+        
+        self.backend = None
+        backend_name = getattr(settings, 'AI_MODEL_BACKEND', '')
+        
+        if backend_name:
+            if intra_op_threads is None:
+                intra_op_threads = getattr(settings, 'AI_INTRA_OP_THREADS', 0)
+            model_path = settings.AI_MODEL_PATH
+            try:
+                model_path, precision = resolve_model_file(
+                    settings.AI_MODEL_PATH,
+                    getattr(settings, 'AI_MODEL_PRECISION', 'fp32'),
+                    getattr(settings, 'AI_MODEL_FILE', 'road_defects.onnx'),
+                )
+                self.backend = load_backend(
+                    backend_name,
+                    model_path,
+                    intra_op_threads=intra_op_threads,
+                    inter_op_threads=getattr(settings, 'AI_INTER_OP_THREADS', 0),
+                )
+            except Exception as e:
+                logger.error(f"Could not load {backend_name} model {model_path}, using the simple detector: {str(e)}")
+        
+        if self.backend is not None:
+            # Variants share metadata; the precision keeps their cached results apart
+            self.model_name = self.backend.model_name
+            self.model_version = variant_version(self.backend.model_version, precision)
+            self.input_representation = self.backend.input_representation
+            self.input_size = self.backend.input_size
+        else:
+            self.model_name = self.SIMPLE_MODEL_NAME
+            self.model_version = self.SIMPLE_MODEL_VERSION
+            self.input_representation = self.INPUT_REPRESENTATION
+            self.input_size = self.INPUT_SIZE
+        self.build_pipeline()
+        
         logger.info(f"Loading model: {self.model_name} v{self.model_version}")
-        pass
+    
+    def warm_up(self):
+        """Run one blank frame through the active model"""
+        width, height = self.input_size
+        if self.input_representation == 'gray':
+            blank = np.zeros((1, height, width), dtype=np.uint8)
+        else:
+            blank = np.zeros((1, height, width, 3), dtype=np.float32)
+        self.detect_defects_batch(blank)
     
     def preprocess_image(self, image_path):
         """
         Preprocess image for model input.
         
+        Kept for callers that want the normalized float RGB tensor; the
+        detector itself runs on self.pipeline's output.
+        
         Args:
             image_path: Path to the image file
             
         Returns:
-            Preprocessed image array
+            Tuple of (original BGR image, float32 RGB array of shape (224, 224, 3))
         """
-        # Read image
-        img = cv2.imread(str(image_path))
-        
-        if img is None:
-            raise ValueError(f"Could not read image: {image_path}")
-        
-        # Convert to RGB
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Resize to model input size (example: 224x224)
-        img_resized = cv2.resize(img_rgb, (224, 224))
-        
-        # Normalize
-        img_normalized = img_resized.astype(np.float32) / 255.0
-        
-        return img, img_normalized
+        frames = PreprocessPipeline(('original', 'tensor'), size=self.input_size).run(image_path)
+        return frames['original'], frames['tensor']
     
     def detect_defects(self, image_array):
         """
@@ -85,45 +175,146 @@ class RoadDefectDetector:
         Replace with actual model inference in production.
         
         Args:
-            image_array: Preprocessed image array
+            image_array: uint8 grayscale array of shape (H, W), or a float32
+                RGB array of shape (H, W, 3) scaled to 0-1 (required when a
+                trained model backend is loaded)
             
         Returns:
             Dictionary with detection results
         """
         # Placeholder logic - simulate defect detection
         # In production, use: predictions = self.model.predict(image_array)
+        return self.detect_defects_batch(image_array[np.newaxis])[0]
+    
+    def classify_edge_density(self, edge_density):
+        """
+        Map an edge density to a defect type and severity score.
         
-        # Simple edge detection as placeholder
-        gray = cv2.cvtColor((image_array * 255).astype(np.uint8), cv2.COLOR_RGB2GRAY)
-        edges = cv2.Canny(gray, 50, 150)
-        edge_density = np.sum(edges > 0) / edges.size
-        
-        # Simulate defect classification based on edge density
-        if edge_density > 0.15:
-            defect_type = 'crack'
-            severity = min(edge_density * 300, 100)
-        elif edge_density > 0.10:
-            defect_type = 'rough_surface'
-            severity = min(edge_density * 250, 100)
-        elif edge_density > 0.05:
-            defect_type = 'edge_crack'
-            severity = min(edge_density * 200, 100)
-        else:
-            defect_type = 'no_defect'
-            severity = edge_density * 100
+        Args:
+            edge_density: Fraction of edge pixels in the frame (0-1)
+            
+        Returns:
+            Tuple of (defect_type, severity_score)
+        """
+        for threshold, defect_type, scale in self.EDGE_DENSITY_CLASSES:
+            if edge_density > threshold:
+                return defect_type, min(edge_density * scale, 100)
+        return 'no_defect', edge_density * 100
+    
+    def edge_densities(self, gray):
+        """
+        Canny edge density of each frame and of its tiles.
         
-        # Simulate confidence score
-        confidence = np.random.uniform(0.7, 0.95)
+        Args:
+            gray: uint8 array of shape (N, H, W)
+            
+        Returns:
+            Tuple of (float array of shape (N,) with whole-frame densities,
+            list with one (N, g * g) array of tile densities per grid size g
+            in CONFIDENCE_GRIDS)
+        """
+        edges = np.empty_like(gray)
+        for i in range(len(gray)):
+            cv2.Canny(gray[i], 50, 150, edges=edges[i])
         
-        return {
-            'defect_type': defect_type,
-            'severity_score': float(severity),
-            'confidence': float(confidence),
-            'metadata': {
-                'edge_density': float(edge_density),
-                'processing_method': 'canny_edge_detection'
-            }
-        }
+        edges = edges > 0
+        count, height, width = edges.shape
+        densities = np.count_nonzero(edges.reshape(count, -1), axis=1) / (height * width)
+        
+        tile_densities = []
+        for grid in self.CONFIDENCE_GRIDS:
+            # Drop the remainder rows/columns so every tile has the same size
+            tile_h, tile_w = height // grid, width // grid
+            tiles = edges[:, :tile_h * grid, :tile_w * grid].reshape(count, grid, tile_h, grid, tile_w)
+            tile_densities.append(tiles.mean(axis=(2, 4)).reshape(count, -1))
+        
+        return densities, tile_densities
+    
+    def estimate_confidence(self, densities, tile_densities):
+        """
+        Deterministic confidence from edge statistics.
+        
+        Args:
+            densities: Whole-frame edge densities, shape (N,)
+            tile_densities: Tile densities per grid size, as from edge_densities
+            
+        Returns:
+            Tuple of (confidence, threshold margin, tile agreement) arrays of shape (N,)
+        """
+        bounds = np.array(sorted(threshold for threshold, _, _ in self.EDGE_DENSITY_CLASSES))
+        
+        distance = np.abs(densities[:, np.newaxis] - bounds).min(axis=1)
+        margin = np.clip(distance / self.CONFIDENCE_MARGIN, 0, 1)
+        
+        # Class indices; classes are exclusive of their lower bound
+        classes = np.searchsorted(bounds, densities, side='left')
+        agreement = np.ones(len(densities))
+        if tile_densities:
+            agreement = np.mean([
+                (np.searchsorted(bounds, tiles, side='left') == classes[:, np.newaxis]).mean(axis=1)
+                for tiles in tile_densities
+            ], axis=0)
+        
+        score = self.CONFIDENCE_MARGIN_WEIGHT * margin + (1 - self.CONFIDENCE_MARGIN_WEIGHT) * agreement
+        low, high = self.CONFIDENCE_RANGE
+        return np.round(low + (high - low) * score, 4), margin, agreement
+    
+    @staticmethod
+    def as_gray(images):
+        """
+        Return uint8 grayscale frames, converting float RGB input if needed.
+        
+        Args:
+            images: uint8 grayscale array of shape (..., H, W), or float32 RGB
+                array of shape (..., H, W, 3) scaled to 0-1
+                
+        Returns:
+            uint8 array of shape (..., H, W)
+        """
+        if images.dtype == np.uint8:
+            return images
+        gray = np.rint(images @ np.array([0.299, 0.587, 0.114], dtype=np.float32) * 255)
+        return gray.astype(np.uint8)
+    
+    def detect_defects_batch(self, batch):
+        """
+        Detect defects for a stacked batch of preprocessed images.
+        
+        Densities, confidence and class bounds are evaluated over the whole
+        batch at once; only Canny runs frame by frame. Identical input always
+        gives identical output.
+        
+        Args:
+            batch: uint8 grayscale array of shape (N, H, W), or float32 RGB
+                array of shape (N, H, W, 3) scaled to 0-1
+            
+        Returns:
+            List of detection dictionaries, one per image
+        """
+        if self.backend is not None:
+            return self.backend.predict(batch)
+        
+        gray = self.as_gray(batch)
+        
+        densities, tile_densities = self.edge_densities(gray)
+        confidence, margin, agreement = self.estimate_confidence(densities, tile_densities)
+        
+        detections = []
+        for i, density in enumerate(densities):
+            defect_type, severity = self.classify_edge_density(density)
+            detections.append({
+                'defect_type': defect_type,
+                'severity_score': float(severity),
+                'confidence': float(confidence[i]),
+                'metadata': {
+                    'edge_density': float(density),
+                    'threshold_margin': round(float(margin[i]), 4),
+                    'tile_agreement': round(float(agreement[i]), 4),
+                    'processing_method': 'canny_edge_detection'
+                }
+            })
+        
+        return detections
     
     def determine_condition(self, severity_score):
         """
@@ -178,133 +369,465 @@ class RoadDefectDetector:
             cv2.LINE_AA
         )
         
-        # In production, add bounding boxes around detected defects
-        # Example: cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        # Boxes from localize_defects, in fractions of the frame size
+        height, width = annotated.shape[:2]
+        thickness = max(2, max(height, width) // 500)
+        for box in detections.get('metadata', {}).get('boxes', []):
+            x0, y0 = int(box['x'] * width), int(box['y'] * height)
+            x1, y1 = int((box['x'] + box['width']) * width), int((box['y'] + box['height']) * height)
+            cv2.rectangle(annotated, (x0, y0), (x1 - 1, y1 - 1), (0, 0, 255), thickness)
         
         return annotated
     
-    def analyze_image(self, image_path):
+    def localize_defects(self, image):
+        """
+        Find bounding boxes of edge-dense regions in a frame.
+        
+        Args:
+            image: BGR or grayscale image array, typically the decoded original
+            
+        Returns:
+            List of box dictionaries (normalized x, y, width, height and
+            edge_density), strongest first; see analysis.localization
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        return localize(gray)
+    
+    def use_gemini(self):
+        """Return True if a Gemini API key is configured"""
+        return bool(getattr(settings, "GEMINI_API_KEY", ""))
+
+    def use_cascade(self):
+        """Return True if the local model screens images and only uncertain ones go to Gemini"""
+        return self.use_gemini() and getattr(settings, "AI_CASCADE_ENABLED", False)
+
+    def cascade_band(self):
+        """Return the (low, high) local severity scores escalated to Gemini, low inclusive, high exclusive"""
+        return (
+            float(getattr(settings, "AI_CASCADE_BAND_LOW", 3.0)),
+            float(getattr(settings, "AI_CASCADE_BAND_HIGH", 75.0)),
+        )
+
+    def active_model(self):
+        """Return (model_name, model_version) of the model that will analyze images"""
+        if self.use_cascade():
+            low, high = self.cascade_band()
+            return (
+                f"{self.model_name}+{self.GEMINI_MODEL_NAME}",
+                f"{self.model_version}+{self.GEMINI_MODEL_VERSION}@{low:g}-{high:g}",
+            )
+        if self.use_gemini():
+            return self.GEMINI_MODEL_NAME, self.GEMINI_MODEL_VERSION
+        return self.model_name, self.model_version
+
+    def cache_key(self, image_path):
+        """Return the result cache key for an image file, or None if caching is disabled"""
+        cache = get_result_cache()
+        if cache is None:
+            return None
+        return cache.make_key(cache.hash_file(image_path), *self.active_model())
+
+    def cache_result(self, cache_key, results):
+        """Store a result unless caching is disabled or a different model produced it"""
+        cache = get_result_cache()
+        if cache is None or cache_key is None:
+            return
+        if self.use_cascade():
+            # Either stage may decide; a failed escalation is a fallback
+            if not results["analysis_metadata"].get("cascade", {}).get("fallback", True):
+                cache.set(cache_key, self.cacheable_result(cache_key, results))
+        elif (results["model_name"], results["model_version"]) == self.active_model():
+            cache.set(cache_key, self.cacheable_result(cache_key, results))
+
+    def cacheable_result(self, cache_key, results):
+        """
+        Return the copy of a result to store in the result cache.
+
+        The annotated image is copied to a file owned by the cache and named
+        by the cache key, so later uploads (whatever their file names) can
+        never overwrite what a cache hit copies.
+        """
+        results = dict(results)
+        source = results.get("annotated_image_path")
+        if source:
+            target = Path(settings.MEDIA_ROOT) / "annotated_images" / "cache" / f"{cache_key}.jpg"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, target)
+            results["annotated_image_path"] = str(target)
+        return results
+
+    def analyze_image(self, image_path, use_cache=True, frame=None):
         """
         Main method to analyze an image.
 
-        If a Gemini API key and library are available, use Gemini Vision to
-        classify the road condition. Otherwise, fall back to the simple
-        OpenCV-based placeholder model.
+        Results are looked up in the content-hash result cache first; a hit
+        skips decoding, detection and annotation and gets its own copy of the
+        stored annotated image (see reuse_cached_result). Pass
+        use_cache=False to force a fresh analysis.
+        A frame the caller already decoded with self.pipeline.decode() is
+        used for detection, the Gemini request and annotation instead of
+        decoding the file again.
+
+        If a Gemini API key is configured, use Gemini Vision to
+        classify the road condition. Otherwise, or when the Gemini request
+        fails, exceeds its latency budget or is rejected by the circuit
+        breaker, fall back to the local model. With AI_CASCADE_ENABLED the
+        local model screens the image first and only uncertain images go to
+        Gemini (see _analyze_cascade).
         """
-        try:
-            gemini_key = getattr(settings, "GEMINI_API_KEY", "")
+        cache_key = self.cache_key(image_path) if use_cache else None
+        if cache_key is not None:
+            cached = get_result_cache().get(cache_key)
+            if cached is not None:
+                logger.info(f"Result cache hit for image {image_path}")
+                return self.reuse_cached_result(image_path, cached)
 
-            # Use Gemini if configured, otherwise fallback
-            if _HAS_GEMINI and gemini_key:
-                logger.info("Using Gemini Vision for road defect analysis")
-                genai.configure(api_key=gemini_key)
+        results = self._analyze_uncached(image_path, frame)
+        self.cache_result(cache_key, results)
+        return results
 
-                model = genai.GenerativeModel("gemini-1.5-flash")
+    def reuse_cached_result(self, image_path, cached):
+        """
+        Give a cache hit an annotated image of its own.
 
-                with open(image_path, "rb") as f:
-                    image_bytes = f.read()
+        The cache keeps its own copy of the annotated file, named by the
+        cache key (see cacheable_result). The key covers the image bytes and
+        the model, so that copy is what annotating this image would produce;
+        it is copied to this image's annotated path instead of being
+        re-rendered.
 
-                prompt = """
-You are a pavement engineer. Analyze this road surface image and respond ONLY with a compact JSON object.
-Keys:
-- defect_type: one of [crack, pothole, rough_surface, alligator_crack, edge_crack, joint_crack, no_defect]
-- severity_score: number from 0 to 100 (higher = worse)
-- condition_label: one of [good, moderate, poor, critical]
-- ai_confidence: number between 0 and 1
-- maintenance_suggestion: 1–3 sentence maintenance recommendation
-                """
-
-                response = model.generate_content(
-                    [
-                        prompt,
-                        {
-                            "mime_type": "image/jpeg",
-                            "data": image_bytes,
-                        },
-                    ]
-                )
+        Args:
+            image_path: Path to the image the cached result is used for
+            cached: Result dictionary returned by the result cache
+
+        Returns:
+            The result dictionary with its annotated_image_path updated
+        """
+        source = cached.get("annotated_image_path")
+        if source:
+            target = self.annotated_image_path(image_path)
+            if Path(source) != target:
+                shutil.copyfile(source, target)
+            cached["annotated_image_path"] = str(target)
+        return cached
 
-                import json
+    def _analyze_uncached(self, image_path, frame=None):
+        """Run the full analysis for one image, bypassing the result cache"""
+        try:
+            if self.use_cascade():
+                return self._analyze_cascade([image_path], [frame])[0]
 
+            # Use Gemini if configured, otherwise fallback
+            if self.use_gemini():
+                logger.info("Using Gemini Vision for road defect analysis")
+                # Decode once for both the request and the annotation
+                if frame is None:
+                    frame = self.pipeline.decode(image_path)
                 try:
-                    data = json.loads(response.text.strip())
-                except Exception:
-                    logger.warning("Gemini response not valid JSON, falling back to simple detector")
+                    data = get_remote_vision_client().analyze(image_path, self.GEMINI_PROMPT, frame)
+                except (RemoteVisionError, CircuitOpenError) as e:
+                    logger.warning(f"Gemini unavailable ({str(e)}), falling back to {self.model_name}")
                     data = None
+                else:
+                    if not data:
+                        logger.warning("Gemini response not valid JSON, falling back to simple detector")
 
                 if data:
-                    # Ensure required keys exist; apply basic defaults
-                    defect_type = data.get("defect_type", "no_defect")
-                    severity_score = float(data.get("severity_score", 0))
-                    condition_label = data.get("condition_label") or self.determine_condition(
-                        severity_score
-                    )
-                    ai_confidence = float(data.get("ai_confidence", 0.9))
-                    maintenance_suggestion = data.get("maintenance_suggestion", "").strip()
-
-                    # For now we don't have Gemini-drawn annotations; reuse original image
-                    original_img, _ = self.preprocess_image(image_path)
-                    detections = {
-                        "defect_type": defect_type,
-                        "severity_score": severity_score,
-                        "confidence": ai_confidence,
-                    }
-                    annotated_img = self.create_annotated_image(original_img, detections)
-
-                    annotated_path = None
-                    if annotated_img is not None:
-                        annotated_dir = settings.MEDIA_ROOT / "annotated_images"
-                        annotated_dir.mkdir(parents=True, exist_ok=True)
-
-                        image_name = Path(image_path).stem
-                        annotated_path = annotated_dir / f"{image_name}_annotated.jpg"
-                        cv2.imwrite(str(annotated_path), annotated_img)
-
-                    return {
-                        "defect_type": defect_type,
-                        "severity_score": severity_score,
-                        "condition_label": condition_label,
-                        "ai_confidence": ai_confidence,
-                        "model_name": "Gemini 1.5 Flash",
-                        "model_version": "1.0",
-                        "analysis_metadata": data,
-                        "annotated_image_path": str(annotated_path) if annotated_path else None,
-                        "maintenance_suggestion": maintenance_suggestion,
-                    }
-
-            # Fallback: existing simple detector
-            logger.info("Using simple OpenCV detector for road defect analysis")
-            original_img, processed_img = self.preprocess_image(image_path)
-
-            detections = self.detect_defects(processed_img)
-            condition = self.determine_condition(detections["severity_score"])
-
-            annotated_img = self.create_annotated_image(original_img, detections)
-
-            annotated_path = None
-            if annotated_img is not None:
-                annotated_dir = settings.MEDIA_ROOT / "annotated_images"
-                annotated_dir.mkdir(parents=True, exist_ok=True)
-
-                image_name = Path(image_path).stem
-                annotated_path = annotated_dir / f"{image_name}_annotated.jpg"
-                cv2.imwrite(str(annotated_path), annotated_img)
-
-            return {
-                "defect_type": detections["defect_type"],
-                "severity_score": detections["severity_score"],
-                "condition_label": condition,
-                "ai_confidence": detections["confidence"],
-                "model_name": self.model_name,
-                "model_version": self.model_version,
-                "analysis_metadata": detections.get("metadata", {}),
-                "annotated_image_path": str(annotated_path) if annotated_path else None,
-            }
+                    return self.build_gemini_result(image_path, data, frame)
+
+            # Fallback: local model (trained backend or simple edge detector)
+            logger.info(f"Using {self.model_name} for road defect analysis")
+            frames = self.pipeline.run(image_path, frame)
+
+            detections = self.detect_defects(frames[self.input_representation])
+            return self.build_result(image_path, frames['original'], detections)
 
         except Exception as e:
             logger.error(f"Error analyzing image {image_path}: {str(e)}")
             raise
 
+    def analyze_batch(self, image_paths, use_cache=True, frames=None):
+        """
+        Analyze several images in one call.
+
+        Images are decoded into a single stacked tensor and run through the
+        local model together, so per-image Python overhead is paid once
+        per batch. Images already in the result cache are not decoded at all.
+        When Gemini is configured the remaining images are sent to it
+        concurrently (see analysis.remote_vision); images it returns no
+        usable answer for, or that fail or are rejected by the circuit
+        breaker, go through the local model as one batch.
+
+        Args:
+            image_paths: Sequence of image file paths
+            use_cache: Set to False to bypass the result cache
+            frames: Optional sequence parallel to image_paths of frames
+                already decoded with self.pipeline.decode(); None entries
+                are decoded here
+
+        Returns:
+            List of result dictionaries in the same shape analyze_image returns,
+            in the same order as image_paths
+        """
+        image_paths = list(image_paths)
+        if not image_paths:
+            return []
+
+        cache = get_result_cache()
+        cache_keys = [
+            self.cache_key(image_path) if use_cache else None
+            for image_path in image_paths
+        ]
+        results = [
+            cache.get(cache_key) if cache_key is not None else None
+            for cache_key in cache_keys
+        ]
+        results = [
+            self.reuse_cached_result(image_path, result) if result is not None else None
+            for image_path, result in zip(image_paths, results)
+        ]
+
+        frames = frames or [None] * len(image_paths)
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            computed = self._analyze_batch_uncached(
+                [image_paths[i] for i in pending], [frames[i] for i in pending]
+            )
+            for i, result in zip(pending, computed):
+                results[i] = result
+                self.cache_result(cache_keys[i], result)
+
+        return results
+
+    def _analyze_batch_uncached(self, image_paths, frames=None):
+        """Analyze a batch of images, bypassing the result cache"""
+        frames = frames or [None] * len(image_paths)
+        if self.use_cascade():
+            return self._analyze_cascade(image_paths, frames)
+        if not self.use_gemini():
+            return self._analyze_local_batch(image_paths, frames)
+
+        logger.info(f"Using Gemini Vision for a batch of {len(image_paths)} images")
+        # Decode once for both the requests and the annotations
+        frames = [
+            self.pipeline.decode(image_path) if frame is None else frame
+            for image_path, frame in zip(image_paths, frames)
+        ]
+        replies = get_remote_vision_client().analyze_many(
+            image_paths, self.GEMINI_PROMPT, return_exceptions=True, frames=frames
+        )
+        results = []
+        for image_path, frame, data in zip(image_paths, frames, replies):
+            if isinstance(data, (RemoteVisionError, CircuitOpenError)):
+                data = None
+            elif isinstance(data, Exception):
+                raise data
+            results.append(self.build_gemini_result(image_path, data, frame) if data else None)
+
+        fallback = [i for i, result in enumerate(results) if result is None]
+        if fallback:
+            logger.warning(
+                f"No usable Gemini response for {len(fallback)} images, falling back to {self.model_name}"
+            )
+            computed = self._analyze_local_batch(
+                [image_paths[i] for i in fallback], [frames[i] for i in fallback]
+            )
+            for i, result in zip(fallback, computed):
+                results[i] = result
+        return results
+
+    def _analyze_cascade(self, image_paths, frames=None):
+        """
+        Screen images with the local model and escalate uncertain ones to Gemini.
+
+        Images whose local severity score falls in cascade_band() are sent
+        to Gemini concurrently; the others keep the local result, as do
+        escalated images Gemini gives no usable answer for.
+        analysis_metadata['cascade'] records which stage decided each image
+        and the time each stage took.
+        """
+        start = time.perf_counter()
+        frames = self.pipeline.run_batch(image_paths, frames)
+        detections = self.detect_defects_batch(frames[self.input_representation])
+        screen_ms = (time.perf_counter() - start) * 1000 / len(image_paths)
+
+        low, high = self.cascade_band()
+        escalate = [i for i, detection in enumerate(detections) if low <= detection["severity_score"] < high]
+
+        replies = {}
+        if escalate:
+            logger.info(f"Cascade: escalating {len(escalate)} of {len(image_paths)} images to Gemini Vision")
+            client = get_remote_vision_client()
+            futures = {
+                i: client.executor.submit(
+                    self._timed_remote_analysis, client, image_paths[i], frames["original"][i]
+                )
+                for i in escalate
+            }
+            replies = {i: future.result() for i, future in futures.items()}
+
+        results = []
+        for i, (image_path, original_img, detection) in enumerate(zip(image_paths, frames["original"], detections)):
+            cascade = {
+                "stage": "screen",
+                "screen_model": self.model_name,
+                "screen_defect_type": detection["defect_type"],
+                "screen_score": round(detection["severity_score"], 2),
+                "band": [low, high],
+                "escalated": i in replies,
+                "fallback": False,
+                "screen_ms": round(screen_ms, 2),
+            }
+
+            data = None
+            if i in replies:
+                data, remote_ms = replies[i]
+                cascade["remote_ms"] = round(remote_ms, 2)
+                cascade["fallback"] = not data
+
+            if data:
+                cascade["stage"] = "remote"
+                result = self.build_gemini_result(image_path, data, original_img)
+            else:
+                result = self.build_result(image_path, original_img, detection)
+            result["analysis_metadata"]["cascade"] = cascade
+            results.append(result)
+
+        return results
+
+    def _timed_remote_analysis(self, client, image_path, frame=None):
+        """Return the Gemini reply for an image (None if unusable or unavailable) and the milliseconds it took"""
+        start = time.perf_counter()
+        try:
+            data = client.analyze(image_path, self.GEMINI_PROMPT, frame)
+        except (RemoteVisionError, CircuitOpenError) as e:
+            logger.warning(f"Gemini unavailable for {image_path} ({str(e)}), keeping the {self.model_name} result")
+            data = None
+        return data, (time.perf_counter() - start) * 1000
+
+    def _analyze_local_batch(self, image_paths, frames=None):
+        """Run the local model over a batch of images"""
+        try:
+            logger.info(f"Using {self.model_name} for a batch of {len(image_paths)} images")
+            frames = self.pipeline.run_batch(image_paths, frames)
+            detections = self.detect_defects_batch(frames[self.input_representation])
+
+            return [
+                self.build_result(image_path, original_img, detection)
+                for image_path, original_img, detection in zip(image_paths, frames['original'], detections)
+            ]
+
+        except Exception as e:
+            logger.error(f"Error analyzing batch of {len(image_paths)} images: {str(e)}")
+            raise
+
+    def build_gemini_result(self, image_path, data, original_img=None):
+        """
+        Annotate an image and assemble the result dictionary for a Gemini reply.
+
+        Args:
+            image_path: Path to the source image file
+            data: JSON object parsed from the Gemini reply
+            original_img: Decoded original image array (BGR); decoded from
+                image_path if not given
+
+        Returns:
+            Result dictionary as returned by analyze_image
+        """
+        # Ensure required keys exist; apply basic defaults
+        defect_type = data.get("defect_type", "no_defect")
+        severity_score = float(data.get("severity_score", 0))
+        condition_label = data.get("condition_label") or self.determine_condition(
+            severity_score
+        )
+        ai_confidence = float(data.get("ai_confidence", 0.9))
+        maintenance_suggestion = data.get("maintenance_suggestion", "").strip()
+
+        # For now we don't have Gemini-drawn annotations; reuse original image
+        if original_img is None:
+            original_img = self.pipeline.decode(image_path)
+        detections = {
+            "defect_type": defect_type,
+            "severity_score": severity_score,
+            "confidence": ai_confidence,
+        }
+        annotated_img = self.create_annotated_image(original_img, detections)
+        annotated_path = self.save_annotated_image(image_path, annotated_img)
+
+        return {
+            "defect_type": defect_type,
+            "severity_score": severity_score,
+            "condition_label": condition_label,
+            "ai_confidence": ai_confidence,
+            "model_name": self.GEMINI_MODEL_NAME,
+            "model_version": self.GEMINI_MODEL_VERSION,
+            "analysis_metadata": data,
+            "annotated_image_path": str(annotated_path) if annotated_path else None,
+            "maintenance_suggestion": maintenance_suggestion,
+        }
+
+    def build_result(self, image_path, original_img, detections):
+        """
+        Annotate an image and assemble the result dictionary for the local model.
+
+        Args:
+            image_path: Path to the source image file
+            original_img: Decoded original image array (BGR)
+            detections: Detection results from detect_defects
+
+        Returns:
+            Result dictionary as returned by analyze_image
+        """
+        condition = self.determine_condition(detections["severity_score"])
+
+        if getattr(settings, "AI_TILED_LOCALIZATION", True):
+            detections.setdefault("metadata", {})["boxes"] = self.localize_defects(original_img)
+
+        annotated_img = self.create_annotated_image(original_img, detections)
+        annotated_path = self.save_annotated_image(image_path, annotated_img)
+
+        return {
+            "defect_type": detections["defect_type"],
+            "severity_score": detections["severity_score"],
+            "condition_label": condition,
+            "ai_confidence": detections["confidence"],
+            "model_name": self.model_name,
+            "model_version": self.model_version,
+            "analysis_metadata": detections.get("metadata", {}),
+            "annotated_image_path": str(annotated_path) if annotated_path else None,
+        }
+
+    def save_annotated_image(self, image_path, annotated_img):
+        """
+        Write an annotated image under MEDIA_ROOT/annotated_images.
+
+        Args:
+            image_path: Path to the source image file
+            annotated_img: Annotated image array, or None
+
+        Returns:
+            Path of the written file, or None if there was nothing to write
+        """
+        if annotated_img is None:
+            return None
+
+        annotated_path = self.annotated_image_path(image_path)
+        cv2.imwrite(str(annotated_path), annotated_img)
+        return annotated_path
+
+    def annotated_image_path(self, image_path):
+        """
+        Return the path under MEDIA_ROOT/annotated_images for an image's annotated copy.
+
+        The name carries a digest of the full source path, so images sharing
+        a file stem (IMG_0001.jpg on two survey days, road.jpg and road.png)
+        never write to the same file.
+        """
+        annotated_dir = Path(settings.MEDIA_ROOT) / "annotated_images"
+        annotated_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256(str(Path(image_path).resolve()).encode("utf-8")).hexdigest()[:12]
+        return annotated_dir / f"{Path(image_path).stem}_{digest}_annotated.jpg"
+
 
 # Singleton instance
 _detector_instance = None
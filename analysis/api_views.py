@@ -41,3 +41,38 @@ class AnalysisResultViewSet(viewsets.ReadOnlyModelViewSet):
         queryset = self.get_queryset().filter(defect_type=defect_type)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """
+        Get result cache hit/miss counters (admin only).
+        
+        Analysis runs in Celery workers, so hits, misses and stores are read
+        from the shared stats cache and cover every process when CACHES is
+        shared (REDIS_CACHE_URL); 'shared' is false when they only cover
+        this web process. 'entries' of the per-process 'lru' backend also
+        only counts this process's entries.
+        """
+        if not request.user.is_admin:
+            return Response(
+                {'error': 'Only administrators can view cache statistics'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        from .result_cache import get_result_cache
+        cache = get_result_cache()
+        
+        return Response(cache.stats() if cache is not None else {'backend': 'none'})
+    
+    @action(detail=False, methods=['get'])
+    def circuit_breakers(self, request):
+        """Get state and trip counts of the remote inference circuit breakers (admin only)"""
+        if not request.user.is_admin:
+            return Response(
+                {'error': 'Only administrators can view circuit breaker metrics'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        from .circuit_breaker import circuit_breaker_stats
+        
+        return Response(circuit_breaker_stats())
@@ -0,0 +1,328 @@
+"""
+Inference backends for trained road defect models.
+
+Backends are registered by name and selected with settings.AI_MODEL_BACKEND;
+RoadDefectDetector.load_model loads settings.AI_MODEL_FILE from
+settings.AI_MODEL_PATH with the chosen backend, and falls back to the
+built-in edge detector when no backend is configured or loading fails.
+
+Model contract:
+    input   one float32 RGB tensor scaled to 0-1, NCHW (N, 3, H, W) or
+            NHWC (N, H, W, 3); H and W are read from the model
+    output  class scores of shape (N, K), probabilities or logits; an
+            optional output named 'severity' gives 0-100 scores of shape
+            (N,) or (N, 1)
+    labels  defect types of the K classes as comma-separated model
+            metadata 'labels'; defaults to DEFAULT_LABELS
+
+model_name and model_version are read from the metadata keys of the same
+name, falling back to the graph name and the model's integer version.
+
+Reduced-precision variants of a model are listed in a manifest.json in
+settings.AI_MODEL_PATH, and settings.AI_MODEL_PRECISION selects one:
+
+    {
+        "variants": {
+            "fp32": {"file": "road_defects.onnx"},
+            "fp16": {"file": "road_defects.fp16.onnx"},
+            "int8": {"file": "road_defects.int8.onnx"}
+        }
+    }
+
+fp16 means half-precision storage (weights cast up to fp32 at load or in
+the graph); int8 means a quantized model, typically QDQ or dynamic
+quantization with fp32 inputs and outputs. Without a manifest,
+settings.AI_MODEL_FILE is the fp32 model.
+"""
+
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from .models import AnalysisResult
+from .preprocessing import DEFAULT_INPUT_SIZE
+
+try:
+    import onnxruntime as ort
+    _HAS_ONNXRUNTIME = True
+except ImportError:
+    ort = None
+    _HAS_ONNXRUNTIME = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LABELS = tuple(choice for choice, _ in AnalysisResult.DEFECT_TYPE_CHOICES)
+
+PRECISIONS = ('fp32', 'fp16', 'int8')
+
+MANIFEST_NAME = 'manifest.json'
+
+BACKENDS = {}
+
+
+def register_backend(cls):
+    """Class decorator registering an InferenceBackend subclass under cls.name"""
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+def get_backend(name):
+    """Return the backend class registered as `name`"""
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend '{name}'; available: {', '.join(sorted(BACKENDS))}")
+
+
+def load_backend(name, model_path, **options):
+    """Instantiate backend `name` with the model at `model_path`"""
+    return get_backend(name)(Path(model_path), **options)
+
+
+def load_manifest(model_dir):
+    """
+    Read the variant manifest of a model directory.
+
+    Returns:
+        Dictionary mapping precision to variant options (at least 'file'),
+        or None if the directory has no manifest
+    """
+    path = Path(model_dir) / MANIFEST_NAME
+    if not path.exists():
+        return None
+
+    with open(path) as f:
+        manifest = json.load(f)
+
+    variants = manifest.get('variants') if isinstance(manifest, dict) else None
+    if not isinstance(variants, dict):
+        raise ValueError(f"{path} must contain a 'variants' object")
+
+    resolved = {}
+    for precision, variant in variants.items():
+        if precision not in PRECISIONS:
+            raise ValueError(f"{path}: unknown precision '{precision}', expected one of {', '.join(PRECISIONS)}")
+        # A bare string is shorthand for {"file": ...}
+        variant = {'file': variant} if isinstance(variant, str) else dict(variant)
+        if not variant.get('file'):
+            raise ValueError(f"{path}: variant '{precision}' has no file")
+        resolved[precision] = variant
+    return resolved
+
+
+def model_variants(model_dir, default_file):
+    """Return {precision: model file path} for a model directory, from its manifest if it has one"""
+    model_dir = Path(model_dir)
+    manifest = load_manifest(model_dir)
+    if manifest is None:
+        return {'fp32': model_dir / default_file}
+    return {precision: model_dir / variant['file'] for precision, variant in manifest.items()}
+
+
+def resolve_model_file(model_dir, precision, default_file):
+    """
+    Pick the model file for a precision.
+
+    Falls back to the fp32 variant, with a warning, if the requested
+    precision is not available.
+
+    Returns:
+        Tuple of (model file path, precision of that file)
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown model precision '{precision}', expected one of {', '.join(PRECISIONS)}")
+
+    variants = model_variants(model_dir, default_file)
+    if precision in variants:
+        return variants[precision], precision
+    if 'fp32' not in variants:
+        raise ValueError(f"No '{precision}' or 'fp32' model variant in {model_dir}")
+
+    logger.warning(f"No '{precision}' model variant in {model_dir}, using fp32")
+    return variants['fp32'], 'fp32'
+
+
+def variant_version(model_version, precision):
+    """Model version identifying a precision variant, e.g. '2.1-int8' (fp32 keeps the plain version)"""
+    return model_version if precision == 'fp32' else f"{model_version}-{precision}"
+
+
+def softmax(scores):
+    """Row-wise softmax of a (N, K) array"""
+    exp = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class InferenceBackend:
+    """
+    Base class for model backends.
+
+    Subclasses load the model in __init__, set model_name, model_version,
+    labels and input_size, and implement infer().
+    """
+
+    name = None
+
+    # Representation of analysis.preprocessing the model consumes
+    input_representation = 'tensor'
+
+    # False if the loaded model cannot be used in a process forked after loading
+    fork_safe = True
+
+    def __init__(self, model_path, **options):
+        self.model_path = Path(model_path)
+        self.model_name = self.model_path.stem
+        self.model_version = '1.0'
+        self.labels = DEFAULT_LABELS
+        self.input_size = DEFAULT_INPUT_SIZE
+
+    def infer(self, batch):
+        """
+        Run the model on a batch.
+
+        Args:
+            batch: float32 array of shape (N, H, W, 3)
+
+        Returns:
+            Tuple of (class probabilities of shape (N, K), severity scores of
+            shape (N,) or None)
+        """
+        raise NotImplementedError
+
+    def predict(self, batch):
+        """
+        Detect defects for a batch of preprocessed tensors.
+
+        Returns:
+            List of detection dictionaries in the shape
+            RoadDefectDetector.detect_defects_batch returns
+        """
+        probabilities, severity = self.infer(batch)
+        if severity is None:
+            # Without a severity head, severity is the probability of any defect
+            if 'no_defect' in self.labels:
+                defect_probability = 1 - probabilities[:, self.labels.index('no_defect')]
+            else:
+                defect_probability = probabilities.max(axis=1)
+            severity = defect_probability * 100
+
+        best = probabilities.argmax(axis=1)
+        return [
+            {
+                'defect_type': self.labels[best[i]],
+                'severity_score': float(np.clip(severity[i], 0, 100)),
+                'confidence': float(probabilities[i, best[i]]),
+                'metadata': {
+                    'class_scores': {
+                        label: round(float(score), 4) for label, score in zip(self.labels, probabilities[i])
+                    },
+                    'processing_method': f'{self.name}_inference',
+                },
+            }
+            for i in range(len(probabilities))
+        ]
+
+    def set_metadata(self, metadata, graph_name='', version=None):
+        """Apply model_name, model_version and labels from model metadata"""
+        self.model_name = metadata.get('model_name') or graph_name or self.model_name
+        self.model_version = metadata.get('model_version') or (str(version) if version else self.model_version)
+
+        if metadata.get('labels'):
+            self.labels = tuple(label.strip() for label in metadata['labels'].split(','))
+        unknown = set(self.labels) - set(DEFAULT_LABELS)
+        if unknown:
+            raise ValueError(f"Model {self.model_path} has unknown labels: {', '.join(sorted(unknown))}")
+
+
+@register_backend
+class OnnxRuntimeBackend(InferenceBackend):
+    """
+    ONNX model run with ONNX Runtime on the CPU.
+
+    Args:
+        model_path: Path to the .onnx file
+        intra_op_threads: Threads used inside one operator (0 = runtime default)
+        inter_op_threads: Threads running independent operators (0 = runtime default)
+    """
+
+    name = 'onnxruntime'
+
+    # ONNX Runtime's thread pools do not survive fork; load in each process
+    fork_safe = False
+
+    # numpy dtypes of ONNX input types other than float32
+    INPUT_DTYPES = {
+        'tensor(float16)': np.float16,
+        'tensor(double)': np.float64,
+    }
+
+    def __init__(self, model_path, intra_op_threads=0, inter_op_threads=0):
+        super().__init__(model_path)
+        if not _HAS_ONNXRUNTIME:
+            raise ImportError("onnxruntime is not installed")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL if inter_op_threads > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+        )
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(
+            str(self.model_path), sess_options=options, providers=['CPUExecutionProvider']
+        )
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = self.INPUT_DTYPES.get(model_input.type, np.float32)
+        self.channels_first = model_input.shape[1] == 3
+        height, width = model_input.shape[2:4] if self.channels_first else model_input.shape[1:3]
+        if isinstance(height, int) and isinstance(width, int):
+            self.input_size = (width, height)
+        # A fixed batch dimension means the model has to be run in chunks of that size
+        self.batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+        self.output_names = [output.name for output in self.session.get_outputs()]
+        self.scores_name = next(name for name in self.output_names if name != 'severity')
+
+        meta = self.session.get_modelmeta()
+        self.set_metadata(meta.custom_metadata_map, meta.graph_name, meta.version)
+
+        classes = self.session.get_outputs()[self.output_names.index(self.scores_name)].shape[-1]
+        if isinstance(classes, int) and classes != len(self.labels):
+            raise ValueError(
+                f"Model {self.model_path} outputs {classes} classes but has {len(self.labels)} labels"
+            )
+        logger.info(
+            f"Loaded ONNX model {self.model_name} v{self.model_version} from {self.model_path} "
+            f"({intra_op_threads or 'default'} intra-op / {inter_op_threads or 'default'} inter-op threads)"
+        )
+
+    def infer(self, batch):
+        if not len(batch):
+            return np.empty((0, len(self.labels))), None
+        if self.channels_first:
+            batch = batch.transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=self.input_dtype)
+
+        step = self.batch_size or len(batch)
+        chunks = [
+            self.session.run(None, {self.input_name: batch[start:start + step]})
+            for start in range(0, len(batch), step)
+        ]
+        outputs = {
+            name: np.concatenate([chunk[i] for chunk in chunks])
+            for i, name in enumerate(self.output_names)
+        }
+
+        scores = outputs[self.scores_name].reshape(len(batch), -1).astype(np.float64)
+        if scores.min() < 0 or not np.allclose(scores.sum(axis=1), 1, atol=1e-3):
+            scores = softmax(scores)
+
+        severity = outputs.get('severity')
+        if severity is not None:
+            severity = severity.reshape(len(batch))
+        return scores, severity
@@ -0,0 +1,229 @@
+"""
+Circuit breakers for remote inference backends.
+
+A breaker watches the outcome of the last WINDOW calls to one backend.
+Calls that raise one of the breaker's failure types, and calls that take
+longer than the latency budget, count as failures; other exceptions say
+nothing about the backend and are not counted. Once at least MIN_CALLS have been seen and the failure
+rate reaches ERROR_RATE the breaker opens: calls are rejected at once with
+CircuitOpenError, so callers can go straight to a local fallback instead of
+waiting for timeouts. After RESET_TIMEOUT seconds the breaker is half-open
+and lets HALF_OPEN_PROBES calls through; if they succeed it closes, if any
+fails it opens again.
+
+Breakers are kept per process and per backend name; see
+get_circuit_breaker() and circuit_breaker_stats().
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """A call was rejected because the backend's circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Error-rate and latency circuit breaker.
+
+    Args:
+        name: Backend name, used in logs and metrics
+        latency_budget: Seconds a call may take before it counts as a failure
+            (None = no budget)
+        error_rate: Failure fraction of the window that opens the breaker
+        min_calls: Calls the window must hold before the rate is evaluated
+        window: Number of most recent calls the rate is computed over
+        reset_timeout: Seconds the breaker stays open before probing
+        half_open_probes: Calls let through, and needed to succeed, while half-open
+        failure_types: Exception classes that count as backend failures
+    """
+
+    def __init__(self, name, latency_budget=None, error_rate=0.5, min_calls=5, window=20,
+                 reset_timeout=30, half_open_probes=1, failure_types=(Exception,)):
+        self.name = name
+        self.failure_types = failure_types
+        self.latency_budget = latency_budget
+        self.error_rate = error_rate
+        self.min_calls = max(min(min_calls, window), 1)
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = max(half_open_probes, 1)
+
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = None
+        self.probes_started = 0
+        self.probes_succeeded = 0
+
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go ahead; must be followed by record_success or record_failure"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probes_started = self.probes_succeeded = 0
+                logger.info(f"Circuit breaker {self.name} half-open, probing")
+
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self.probes_started < self.half_open_probes:
+                self.probes_started += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self):
+        """
+        Fail fast if a call made now would be rejected, without claiming a half-open probe.
+
+        Lets callers skip preparing a request (e.g. encoding an image) that
+        the breaker would refuse anyway.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with every probe taken
+        """
+        with self._lock:
+            if self.state == OPEN:
+                rejecting = time.monotonic() - self.opened_at < self.reset_timeout
+            else:
+                rejecting = self.state == HALF_OPEN and self.probes_started >= self.half_open_probes
+            if rejecting:
+                self.rejected += 1
+        if rejecting:
+            raise CircuitOpenError(f"Circuit breaker {self.name} is open")
+
+    def release(self):
+        """Give back a call allowed by allow() that ended without a backend outcome"""
+        with self._lock:
+            if self.state == HALF_OPEN and self.probes_started > 0:
+                self.probes_started -= 1
+
+    def record_success(self, latency=None):
+        """Record a completed call; one over the latency budget counts as a failure"""
+        if self.latency_budget is not None and latency is not None and latency > self.latency_budget:
+            with self._lock:
+                self.slow_calls += 1
+            self.record_failure()
+            return
+
+        with self._lock:
+            self.calls += 1
+            if self.state == HALF_OPEN:
+                self.probes_succeeded += 1
+                if self.probes_succeeded >= self.half_open_probes:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                    logger.info(f"Circuit breaker {self.name} closed")
+            else:
+                self.outcomes.append(False)
+
+    def record_failure(self):
+        """Record a failed call"""
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self._trip()
+            elif self.state == CLOSED:
+                self.outcomes.append(True)
+                if len(self.outcomes) >= self.min_calls and self.failure_rate() >= self.error_rate:
+                    self._trip()
+
+    def _trip(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self.outcomes.clear()
+        logger.warning(f"Circuit breaker {self.name} opened for {self.reset_timeout}s")
+
+    def failure_rate(self):
+        """Failure fraction of the calls in the window"""
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call func through the breaker.
+
+        Raises:
+            CircuitOpenError: If the breaker rejects the call
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit breaker {self.name} is open")
+
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except self.failure_types:
+            self.record_failure()
+            raise
+        except Exception:
+            self.release()
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def reset(self):
+        """Close the breaker and clear its window"""
+        with self._lock:
+            self.state = CLOSED
+            self.outcomes.clear()
+            self.opened_at = None
+
+    def stats(self):
+        """Return state and counters for monitoring"""
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(self.reset_timeout - (time.monotonic() - self.opened_at), 0), 1)
+            return {
+                'name': self.name,
+                'state': self.state,
+                'trips': self.trips,
+                'calls': self.calls,
+                'failures': self.failures,
+                'slow_calls': self.slow_calls,
+                'rejected': self.rejected,
+                'window_failure_rate': round(self.failure_rate(), 4),
+                'retry_in': retry_in,
+                'latency_budget': self.latency_budget,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name, **options):
+    """
+    Return the process-wide breaker for a backend, creating it on first use.
+
+    options are CircuitBreaker arguments; a breaker whose options changed
+    (e.g. after a settings override) is replaced.
+    """
+    with _breakers_lock:
+        entry = _breakers.get(name)
+        if entry is None or entry[0] != options:
+            entry = (options, CircuitBreaker(name, **options))
+            _breakers[name] = entry
+        return entry[1]
+
+
+def circuit_breaker_stats():
+    """Return stats() of every breaker created in this process"""
+    with _breakers_lock:
+        breakers = [breaker for _, breaker in _breakers.values()]
+    return [breaker.stats() for breaker in breakers]
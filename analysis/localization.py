@@ -0,0 +1,123 @@
+"""
+Tiled defect localization.
+
+The frame is covered with overlapping square tiles and the edge density of
+every tile is read from one integral image of the Canny edge map, four
+lookups per tile, so the cost does not depend on the number of tiles.
+Tiles holding more than a tile side's worth of edge pixels, well above the
+frame's typical texture, are "hot"; 8-connected groups of hot tiles are
+merged into bounding boxes, and non-maximum suppression removes boxes that
+mostly cover one another.
+
+Boxes are returned in coordinates normalised to the frame size, so they
+stay valid for any resolution the frame was decoded at.
+"""
+
+import cv2
+import numpy as np
+
+# Tiles across the longer side of the frame
+TILES_ACROSS = 16
+
+# Tile step as a fraction of the tile size (0.5 = tiles overlap by half)
+TILE_STRIDE = 0.5
+
+# A tile is hot when its edge pixels add up to more than MIN_EDGE_LENGTH
+# tile sides (a thin crack crossing it leaves about two, one per border) and
+# its density exceeds HOT_TEXTURE_RATIO times the median tile density (the
+# frame's background texture). Measuring length rather than density keeps
+# the floor independent of tile size.
+MIN_EDGE_LENGTH = 1.0
+HOT_TEXTURE_RATIO = 3.0
+
+NMS_IOU_THRESHOLD = 0.3
+MAX_BOXES = 10
+
+
+def edge_map(gray):
+    """Binary (0/1) Canny edge map of a uint8 grayscale frame"""
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+    return np.minimum(edges, 1, out=edges)
+
+
+def tile_densities(edges, tile, stride):
+    """
+    Edge density of every tile position from an integral image.
+
+    Args:
+        edges: uint8 0/1 edge map of shape (H, W)
+        tile: Tile side in pixels
+        stride: Step between tile origins in pixels
+
+    Returns:
+        Tuple of (float array of shape (rows, cols) with densities, tile
+        origin y coordinates, tile origin x coordinates)
+    """
+    height, width = edges.shape
+    integral = cv2.integral(edges)
+
+    # The last row/column of tiles is pinned to the frame edge so nothing is left uncovered
+    ys = np.unique(np.append(np.arange(0, max(height - tile, 0) + 1, stride), max(height - tile, 0)))
+    xs = np.unique(np.append(np.arange(0, max(width - tile, 0) + 1, stride), max(width - tile, 0)))
+    y1 = np.minimum(ys + tile, height)[:, np.newaxis]
+    x1 = np.minimum(xs + tile, width)
+    y0 = ys[:, np.newaxis]
+
+    sums = integral[y1, x1] - integral[y0, x1] - integral[y1, xs] + integral[y0, xs]
+    area = (y1 - y0) * (x1 - xs)
+    return sums / area, ys, xs
+
+
+def localize(gray, tiles_across=TILES_ACROSS, min_edge_length=MIN_EDGE_LENGTH, max_boxes=MAX_BOXES):
+    """
+    Find regions of a frame with concentrated edges.
+
+    Args:
+        gray: uint8 grayscale frame of shape (H, W), at any resolution
+        tiles_across: Tiles along the longer side
+        min_edge_length: Edge pixels a hot tile must hold, in tile sides
+        max_boxes: Largest number of boxes returned
+
+    Returns:
+        List of dictionaries with 'x', 'y', 'width' and 'height' (fractions
+        of the frame size) and 'edge_density' (mean density of the merged
+        tiles), strongest first
+    """
+    height, width = gray.shape
+    tile = max(max(height, width) // tiles_across, 8)
+    stride = max(int(tile * TILE_STRIDE), 1)
+
+    densities, ys, xs = tile_densities(edge_map(gray), tile, stride)
+    threshold = max(min_edge_length / tile, HOT_TEXTURE_RATIO * float(np.median(densities)))
+    hot = (densities > threshold).astype(np.uint8)
+    if not hot.any():
+        return []
+
+    # Merge touching hot tiles; stats are in tile-grid units
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(hot, connectivity=8)
+    scores = np.bincount(labels.ravel(), weights=(densities * hot).ravel(), minlength=count)
+    scores = scores / np.maximum(stats[:, cv2.CC_STAT_AREA], 1)
+
+    boxes = []
+    for label in range(1, count):
+        col, row, cols, rows = stats[label, :4]
+        x0, y0 = xs[col], ys[row]
+        x1 = min(xs[col + cols - 1] + tile, width)
+        y1 = min(ys[row + rows - 1] + tile, height)
+        boxes.append([int(x0), int(y0), int(x1 - x0), int(y1 - y0)])
+    box_scores = [float(score) for score in scores[1:]]
+
+    keep = cv2.dnn.NMSBoxes(boxes, box_scores, threshold, NMS_IOU_THRESHOLD)
+    keep = sorted(np.array(keep).reshape(-1), key=lambda i: box_scores[i], reverse=True)[:max_boxes]
+
+    return [
+        {
+            'x': round(boxes[i][0] / width, 4),
+            'y': round(boxes[i][1] / height, 4),
+            'width': round(boxes[i][2] / width, 4),
+            'height': round(boxes[i][3] / height, 4),
+            'edge_density': round(box_scores[i], 4),
+        }
+        for i in keep
+    ]
@@ -0,0 +1,113 @@
+"""
+Benchmark detector throughput for single-image and batched analysis.
+
+Usage:
+    python manage.py benchmark_detector
+    python manage.py benchmark_detector --batch-sizes 1 8 32 128 --images path/to/frames
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from analysis.ai_model import RoadDefectDetector
+
+
+class Command(BaseCommand):
+    help = 'Report images/second for analyze_image and analyze_batch at several batch sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-sizes', nargs='+', type=int, default=[1, 8, 32, 128],
+            help='Batch sizes to benchmark (default: 1 8 32 128)'
+        )
+        parser.add_argument(
+            '--images', type=str, default='',
+            help='Directory of .jpg/.png frames to use instead of synthetic images'
+        )
+        parser.add_argument(
+            '--width', type=int, default=1280,
+            help='Width of synthetic frames (default: 1280)'
+        )
+        parser.add_argument(
+            '--height', type=int, default=720,
+            help='Height of synthetic frames (default: 720)'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Timed runs per batch size; the best run is reported (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        batch_sizes = sorted(set(options['batch_sizes']))
+        if not batch_sizes or batch_sizes[0] < 1:
+            raise CommandError('Batch sizes must be positive integers.')
+
+        with tempfile.TemporaryDirectory() as workdir:
+            workdir = Path(workdir)
+            paths = self._collect_images(options, workdir, max(batch_sizes))
+
+            # Keep annotated output out of the real media directory
+            with override_settings(MEDIA_ROOT=workdir / 'media'):
+                detector = RoadDefectDetector()
+                detector.load_model()
+
+                self.stdout.write(f'Benchmarking on {len(paths)} images, best of {options["repeat"]} runs\n')
+                self.stdout.write(f'{"mode":<22}{"batch":>8}{"seconds":>12}{"images/s":>12}')
+
+                for batch_size in batch_sizes:
+                    batch = paths[:batch_size]
+
+                    elapsed = self._time(
+                        lambda: [detector.analyze_image(p, use_cache=False) for p in batch],
+                        options['repeat']
+                    )
+                    self._report('analyze_image loop', batch_size, elapsed)
+
+                    elapsed = self._time(lambda: detector.analyze_batch(batch, use_cache=False), options['repeat'])
+                    self._report('analyze_batch', batch_size, elapsed)
+
+    def _collect_images(self, options, workdir, count):
+        """Return `count` image paths, cycling real frames or generating synthetic ones"""
+        if options['images']:
+            source = Path(options['images'])
+            found = sorted(
+                p for p in source.iterdir()
+                if p.suffix.lower() in ('.jpg', '.jpeg', '.png')
+            ) if source.is_dir() else []
+            if not found:
+                raise CommandError(f'No .jpg/.png images found in {source}')
+            return [found[i % len(found)] for i in range(count)]
+
+        rng = np.random.default_rng(0)
+        paths = []
+        for i in range(count):
+            # Textured noise with a few dark strokes, roughly like asphalt with cracks
+            frame = rng.integers(60, 140, size=(options['height'], options['width'], 3), dtype=np.uint8)
+            for _ in range(i % 5):
+                pt1 = tuple(int(v) for v in rng.integers(0, min(options['width'], options['height']), size=2))
+                pt2 = tuple(int(v) for v in rng.integers(0, min(options['width'], options['height']), size=2))
+                cv2.line(frame, pt1, pt2, (20, 20, 20), 3)
+            path = workdir / f'frame_{i:04d}.jpg'
+            cv2.imwrite(str(path), frame)
+            paths.append(path)
+        return paths
+
+    def _time(self, func, repeat):
+        """Run func `repeat` times after one warm-up call and return the best wall time"""
+        func()
+        best = float('inf')
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def _report(self, mode, batch_size, elapsed):
+        rate = batch_size / elapsed if elapsed > 0 else float('inf')
+        self.stdout.write(f'{mode:<22}{batch_size:>8}{elapsed:>12.4f}{rate:>12.1f}')
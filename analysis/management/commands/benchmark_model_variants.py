@@ -0,0 +1,151 @@
+"""
+Benchmark the precision variants of the trained model against fp32.
+
+For every variant in the model manifest (see analysis.backends), reports
+file size, latency per batch, throughput, agreement of the predicted
+defect type with the fp32 variant, mean confidence difference and, for
+labeled samples, accuracy. The sample directory holds one subdirectory per
+defect type (e.g. samples/crack/*.jpg); images directly in it are
+unlabeled and count only towards agreement.
+
+Usage:
+    python manage.py benchmark_model_variants --images samples/
+    python manage.py benchmark_model_variants --images samples/ --precisions fp32 int8 --batch-size 32 --threads 1
+"""
+
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.backends import DEFAULT_LABELS, PRECISIONS, load_backend, model_variants
+from analysis.preprocessing import PreprocessPipeline
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png')
+
+
+class Command(BaseCommand):
+    help = 'Compare latency, throughput and fp32 agreement of the fp32/fp16/int8 model variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--images', type=str, required=True,
+            help='Sample directory; subdirectories named after defect types label their images'
+        )
+        parser.add_argument(
+            '--precisions', nargs='+', choices=PRECISIONS, default=None,
+            help='Variants to benchmark (default: every variant in the manifest)'
+        )
+        parser.add_argument(
+            '--backend', type=str, default=getattr(settings, 'AI_MODEL_BACKEND', '') or 'onnxruntime',
+            help='Inference backend (default: AI_MODEL_BACKEND, or onnxruntime)'
+        )
+        parser.add_argument(
+            '--model-dir', type=str, default=str(settings.AI_MODEL_PATH),
+            help='Directory with the model files and manifest.json (default: AI_MODEL_PATH)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=16,
+            help='Images per inference call (default: 16)'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=getattr(settings, 'AI_INTRA_OP_THREADS', 0),
+            help='Intra-op threads (default: AI_INTRA_OP_THREADS, 0 = runtime default)'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Timed runs per variant; the best run is reported (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer.')
+
+        try:
+            variants = model_variants(options['model_dir'], getattr(settings, 'AI_MODEL_FILE', 'road_defects.onnx'))
+        except ValueError as e:
+            raise CommandError(str(e))
+        if 'fp32' not in variants:
+            raise CommandError(f'The manifest in {options["model_dir"]} has no fp32 variant to compare against.')
+
+        precisions = options['precisions'] or [p for p in PRECISIONS if p in variants]
+        missing = [p for p in precisions if p not in variants]
+        if missing:
+            raise CommandError(f'No {", ".join(missing)} variant in {options["model_dir"]}')
+        for precision in precisions:
+            if not variants[precision].exists():
+                raise CommandError(f'The {precision} model file {variants[precision]} does not exist')
+        # fp32 is the reference and always runs first
+        precisions = ['fp32'] + [p for p in precisions if p != 'fp32']
+
+        paths, labels = self._collect_samples(Path(options['images']))
+        self.stdout.write(
+            f'Benchmarking {len(paths)} images ({sum(label is not None for label in labels)} labeled), '
+            f'batch size {options["batch_size"]}, best of {options["repeat"]} runs\n'
+        )
+        self.stdout.write(
+            f'{"precision":<10}{"size MiB":>10}{"ms/batch":>10}{"images/s":>10}'
+            f'{"agreement":>11}{"conf diff":>11}{"accuracy":>10}'
+        )
+
+        reference = None
+        for precision in precisions:
+            backend = load_backend(
+                options['backend'], variants[precision], intra_op_threads=options['threads']
+            )
+            batch = self._preprocess(backend, paths)
+            elapsed, detections = self._run(backend, batch, options['batch_size'], options['repeat'])
+
+            predicted = [detection['defect_type'] for detection in detections]
+            confidence = np.array([detection['confidence'] for detection in detections])
+            if reference is None:
+                reference = (predicted, confidence)
+
+            agreement = np.mean([a == b for a, b in zip(predicted, reference[0])])
+            confidence_diff = np.abs(confidence - reference[1]).mean()
+            labeled = [(p, label) for p, label in zip(predicted, labels) if label is not None]
+            accuracy = f'{np.mean([p == label for p, label in labeled]):>10.1%}' if labeled else f'{"-":>10}'
+
+            batches = -(-len(paths) // options['batch_size'])
+            self.stdout.write(
+                f'{precision:<10}{variants[precision].stat().st_size / 2 ** 20:>10.2f}'
+                f'{elapsed * 1000 / batches:>10.2f}{len(paths) / elapsed:>10.1f}'
+                f'{agreement:>11.1%}{confidence_diff:>11.4f}{accuracy}'
+            )
+
+    def _collect_samples(self, source):
+        """Return (paths, labels); labels are None for images outside a defect type directory"""
+        if not source.is_dir():
+            raise CommandError(f'{source} is not a directory')
+
+        paths, labels = [], []
+        for path in sorted(source.rglob('*')):
+            if path.suffix.lower() not in IMAGE_SUFFIXES:
+                continue
+            paths.append(path)
+            label = path.parent.name if path.parent != source else None
+            labels.append(label if label in DEFAULT_LABELS else None)
+
+        if not paths:
+            raise CommandError(f'No .jpg/.png images found in {source}')
+        return paths, labels
+
+    def _preprocess(self, backend, paths):
+        """Decode every sample once into the backend's input tensor"""
+        pipeline = PreprocessPipeline((backend.input_representation,), size=backend.input_size)
+        # The pipeline reuses its buffers; keep an independent copy
+        return pipeline.run_batch(paths)[backend.input_representation].copy()
+
+    def _run(self, backend, batch, batch_size, repeat):
+        """Run inference over `batch` in chunks; return the best wall time and the last detections"""
+        backend.predict(batch[:batch_size])
+        best = float('inf')
+        for _ in range(max(repeat, 1)):
+            detections = []
+            start = time.perf_counter()
+            for offset in range(0, len(batch), batch_size):
+                detections.extend(backend.predict(batch[offset:offset + batch_size]))
+            best = min(best, time.perf_counter() - start)
+        return best, detections
@@ -0,0 +1,89 @@
+"""
+Report how the detector cascade split analyses between its stages.
+
+Reads analysis_metadata['cascade'] of stored results (see
+RoadDefectDetector._analyze_cascade) and shows the escalation rate, the
+latency of each stage and the Gemini requests, latency and cost the local
+screen saved compared with sending every image to Gemini. Remote latency
+is the mean of the escalations Gemini answered; pass --remote-latency-ms
+when there are none to measure.
+
+Usage:
+    python manage.py cascade_report
+    python manage.py cascade_report --days 7 --cost-per-request 0.0004
+"""
+
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from analysis.models import AnalysisResult
+
+
+class Command(BaseCommand):
+    help = 'Show the cascade escalation rate and the Gemini latency and cost it saved'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Only include results analyzed in the last N days (default: all)'
+        )
+        parser.add_argument(
+            '--cost-per-request', type=float, default=getattr(settings, 'GEMINI_COST_PER_REQUEST', 0.0),
+            help='Price of one Gemini request (default: GEMINI_COST_PER_REQUEST)'
+        )
+        parser.add_argument(
+            '--remote-latency-ms', type=float, default=None,
+            help='Gemini latency per image to assume instead of the measured mean'
+        )
+
+    def handle(self, *args, **options):
+        results = AnalysisResult.objects.filter(analysis_metadata__has_key='cascade')
+        if options['days'] is not None:
+            if options['days'] < 1:
+                raise CommandError('--days must be a positive integer.')
+            results = results.filter(analyzed_at__gte=timezone.now() - timedelta(days=options['days']))
+
+        decisions = list(results.values_list('analysis_metadata__cascade', flat=True))
+        if not decisions:
+            self.stdout.write('No cascade results found.')
+            return
+
+        total = len(decisions)
+        escalated = [d for d in decisions if d.get('escalated')]
+        remote = [d for d in escalated if d.get('stage') == 'remote']
+        avoided = total - len(escalated)
+
+        screen_ms = np.mean([d.get('screen_ms', 0) for d in decisions])
+        remote_ms = options['remote_latency_ms']
+        if remote_ms is None and remote:
+            remote_ms = np.mean([d['remote_ms'] for d in remote])
+        cascade_ms = screen_ms + np.sum([d.get('remote_ms', 0) for d in escalated]) / total
+
+        self.stdout.write(f'Cascade results: {total}')
+        self.stdout.write(f'  decided by the local screen  {avoided:>8} {avoided / total:>8.1%}')
+        self.stdout.write(f'  escalated to Gemini          {len(escalated):>8} {len(escalated) / total:>8.1%}')
+        self.stdout.write(f'    decided by Gemini          {len(remote):>8}')
+        self.stdout.write(f'    fell back to local         {len(escalated) - len(remote):>8}')
+
+        self.stdout.write('\nLatency per image (ms)')
+        self.stdout.write(f'  local screen                 {screen_ms:>8.1f}')
+        self.stdout.write(f'  cascade (screen + escalated) {cascade_ms:>8.1f}')
+        if remote_ms is None:
+            self.stdout.write('  Gemini only                       n/a  (pass --remote-latency-ms)')
+        else:
+            saved = remote_ms - cascade_ms
+            self.stdout.write(f'  Gemini only                  {remote_ms:>8.1f}')
+            self.stdout.write(f'  saved                        {saved:>8.1f} {saved / remote_ms if remote_ms else 0:>8.1%}')
+
+        self.stdout.write('\nGemini requests')
+        self.stdout.write(f'  made                         {len(escalated):>8}')
+        self.stdout.write(f'  avoided                      {avoided:>8}')
+        if options['cost_per_request']:
+            self.stdout.write(f'  cost                         {len(escalated) * options["cost_per_request"]:>8.4f}')
+            self.stdout.write(f'  cost saved                   {avoided * options["cost_per_request"]:>8.4f}')
+        else:
+            self.stdout.write('  cost saved                        n/a  (pass --cost-per-request)')
@@ -0,0 +1,97 @@
+"""
+Run a pool of analysis worker processes with the detector preloaded.
+
+The detector is loaded once in this process, then Celery's prefork pool
+forks the workers, so no child pays model load on its first task. Each
+worker pins OpenCV/BLAS to --threads threads; the default of one thread
+per process with one process per core saturates the machine without
+oversubscription. Workers consume the normal task queue, so they can
+replace or run next to a plain `celery worker`.
+
+Usage:
+    python manage.py run_analysis_workers
+    python manage.py run_analysis_workers --concurrency 8 --threads 1 --stats-interval 30
+"""
+
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.workers import install_worker_hooks, limit_threads, preload_detector
+
+
+class Command(BaseCommand):
+    help = 'Start prefork Celery analysis workers with the detector preloaded and thread counts pinned'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=getattr(settings, 'ANALYSIS_WORKER_CONCURRENCY', 0) or None,
+            help='Worker processes (default: ANALYSIS_WORKER_CONCURRENCY, or cores / threads)'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=getattr(settings, 'ANALYSIS_WORKER_THREADS', 1),
+            help='OpenCV/BLAS threads per worker process (default: ANALYSIS_WORKER_THREADS, 1)'
+        )
+        parser.add_argument(
+            '--queues', type=str, default='',
+            help='Comma-separated queues to consume (default: the Celery default queue)'
+        )
+        parser.add_argument(
+            '--max-tasks-per-child', type=int, default=0,
+            help='Recycle a worker after this many tasks (default: never)'
+        )
+        parser.add_argument(
+            '--stats-interval', type=int, default=60,
+            help='Seconds between per-worker throughput log lines (default: 60)'
+        )
+        parser.add_argument(
+            '--loglevel', type=str, default='INFO',
+            help='Celery log level (default: INFO)'
+        )
+
+    def handle(self, *args, **options):
+        if getattr(settings, 'TASK_EXECUTION_MODE', 'sync') != 'async':
+            raise CommandError(
+                "TASK_EXECUTION_MODE is 'sync', so analysis runs inline and never reaches a queue. "
+                "Set TASK_EXECUTION_MODE=async to use dedicated workers."
+            )
+
+        for option in ('concurrency', 'threads', 'stats_interval'):
+            if options[option] is not None and options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} must be at least 1")
+        if options['max_tasks_per_child'] < 0:
+            raise CommandError('--max-tasks-per-child must not be negative')
+
+        threads = options['threads']
+        concurrency = options['concurrency'] or max((os.cpu_count() or 1) // threads, 1)
+
+        # Inherited by the forked workers; they apply it again after fork
+        limit_threads(threads)
+
+        self.stdout.write('Preloading detector...')
+        model_name, model_version = preload_detector().active_model()
+        self.stdout.write(
+            f'Loaded {model_name} v{model_version}; starting {concurrency} workers x {threads} threads'
+        )
+
+        install_worker_hooks(threads, options['stats_interval'])
+
+        from roadhealth.celery import app
+
+        argv = [
+            'worker',
+            '--pool=prefork',
+            f'--concurrency={concurrency}',
+            f'--loglevel={options["loglevel"]}',
+            # One task at a time per process, handed to whichever child is free
+            '--prefetch-multiplier=1',
+            '-O', 'fair',
+        ]
+        if options['queues']:
+            argv += ['--queues', options['queues']]
+        if options['max_tasks_per_child']:
+            argv.append(f'--max-tasks-per-child={options["max_tasks_per_child"]}')
+
+        app.worker_main(argv)
@@ -57,6 +57,20 @@ class AnalysisResult(models.Model):
     def __str__(self):
         return f"Analysis: {self.defect_type} - {self.condition_label} ({self.image_record.id})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored classification so dashboard rollups can apply deltas
+        instance._rollup_loaded = instance.rollup_key()
+        return instance
+    
+    def rollup_key(self):
+        """Return the (image_record_id, defect_type, condition_label, severity_score) this result contributes to rollups"""
+        fields = ('image_record_id', 'defect_type', 'condition_label', 'severity_score')
+        if any(field not in self.__dict__ for field in fields):
+            return None
+        return tuple(self.__dict__[field] for field in fields)
+    
     def save(self, *args, **kwargs):
         # Auto-generate maintenance suggestion if not provided
         if not self.maintenance_suggestion:
@@ -65,7 +79,7 @@ class AnalysisResult(models.Model):
         # Update image record status
         if self.image_record.status != 'analyzed':
             self.image_record.status = 'analyzed'
-            self.image_record.save()
+            self.image_record.save(update_fields=['status', 'updated_date'])
         
         super().save(*args, **kwargs)
     
@@ -0,0 +1,224 @@
+"""
+Image preprocessing pipeline for the detectors.
+
+A pipeline is configured with the representations a detector consumes and
+produces only those, straight from the decoded frame:
+
+    'gray'      uint8 (N, H, W) grayscale at the model input size
+    'tensor'    float32 (N, H, W, 3) RGB scaled to 0-1 at the model input size
+    'original'  the BGR frames, e.g. for annotation; full resolution unless
+                original_min_size allows a reduced decode
+
+Each file is decoded once, at the smallest resolution that still serves
+every requested output; callers that already hold a frame from decode()
+can pass it in instead. The image header gives the frame size, and the
+JPEG decoder then scales by 1/2, 1/4 or 1/8 in the DCT domain
+(IMREAD_REDUCED_*), so a 12 MP photo feeding a 224x224 model never
+materialises at full size. Frames that are only needed in grayscale are
+decoded as grayscale, and colour frames are resized before any colour
+conversion. Model-sized output arrays are kept per thread and reused
+across calls: they stay valid only until the next call on the same
+pipeline from the same thread.
+"""
+
+import logging
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+REPRESENTATIONS = ('original', 'gray', 'tensor')
+
+DEFAULT_INPUT_SIZE = (224, 224)
+
+REDUCTION_FACTORS = (8, 4, 2)
+
+# imread flags by (reduction factor, colour)
+IMREAD_FLAGS = {
+    (1, True): cv2.IMREAD_COLOR,
+    (2, True): cv2.IMREAD_REDUCED_COLOR_2,
+    (4, True): cv2.IMREAD_REDUCED_COLOR_4,
+    (8, True): cv2.IMREAD_REDUCED_COLOR_8,
+    (1, False): cv2.IMREAD_GRAYSCALE,
+    (2, False): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    (4, False): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    (8, False): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+def read_image_size(image_path):
+    """Return (width, height) from the image header, or None if it cannot be read"""
+    try:
+        with Image.open(image_path) as img:
+            return img.size
+    except Exception as e:
+        logger.debug(f"Could not read image header of {image_path}: {str(e)}")
+        return None
+
+
+def reduction_factor(image_size, required):
+    """
+    Largest decode reduction factor that keeps an image at least `required`.
+
+    Sizes are compared short side to short side and long side to long side,
+    so EXIF rotation applied by the decoder does not matter.
+
+    Args:
+        image_size: (width, height) of the stored image
+        required: (width, height) the decoded frame must still cover
+
+    Returns:
+        1, 2, 4 or 8
+    """
+    short, long = sorted(image_size)
+    need_short, need_long = sorted(required)
+    for factor in REDUCTION_FACTORS:
+        # libjpeg rounds scaled dimensions up
+        if -(-short // factor) >= need_short and -(-long // factor) >= need_long:
+            return factor
+    return 1
+
+
+class PreprocessPipeline:
+    """
+    Decode image files into the representations a detector needs.
+
+    Args:
+        outputs: Iterable of representation names from REPRESENTATIONS
+        size: (width, height) of the model input
+        original_min_size: Long side the 'original' output needs; it is
+            decoded at the largest reduction that keeps at least this many
+            pixels. None decodes it at full resolution.
+    """
+
+    def __init__(self, outputs=('gray',), size=DEFAULT_INPUT_SIZE, original_min_size=None):
+        outputs = tuple(dict.fromkeys(outputs))
+        unknown = set(outputs) - set(REPRESENTATIONS)
+        if not outputs or unknown:
+            raise ValueError(
+                f"Pipeline outputs must be a non-empty subset of {REPRESENTATIONS}, got {outputs}"
+            )
+        self.outputs = outputs
+        self.size = tuple(size)
+        self.original_min_size = original_min_size
+        self._local = threading.local()
+
+    def __repr__(self):
+        return (
+            f"PreprocessPipeline(outputs={self.outputs}, size={self.size}, "
+            f"original_min_size={self.original_min_size})"
+        )
+
+    @property
+    def decodes_color(self):
+        """True if frames must be decoded in colour rather than as grayscale"""
+        return 'original' in self.outputs or 'tensor' in self.outputs
+
+    def _buffer(self, name, count, shape, dtype):
+        """Return a reusable (count, *shape) array, growing the thread's buffer if needed"""
+        buffers = self._local.__dict__.setdefault('buffers', {})
+        buffer = buffers.get(name)
+        if buffer is None or len(buffer) < count or buffer.shape[1:] != shape:
+            buffer = np.empty((count,) + shape, dtype=dtype)
+            buffers[name] = buffer
+        return buffer[:count]
+
+    def required_size(self):
+        """(width, height) a decoded frame must cover, or None if it must be full resolution"""
+        required = (0, 0)
+        if 'gray' in self.outputs or 'tensor' in self.outputs:
+            required = tuple(sorted(self.size))
+        if 'original' in self.outputs:
+            if not self.original_min_size:
+                return None
+            required = (required[0], max(required[1], self.original_min_size))
+        return required
+
+    def decode(self, image_path):
+        """
+        Read one image file in colour (BGR) or grayscale, as this pipeline needs.
+
+        The frame is decoded at the largest reduction that still covers every
+        output; images whose header cannot be read are decoded in full.
+        """
+        factor = 1
+        required = self.required_size()
+        if required is not None:
+            image_size = read_image_size(image_path)
+            if image_size is not None:
+                factor = reduction_factor(image_size, required)
+
+        img = cv2.imread(str(image_path), IMREAD_FLAGS[factor, self.decodes_color])
+        if img is None:
+            raise ValueError(f"Could not read image: {image_path}")
+        return img
+
+    def run(self, image_path, decoded=None):
+        """
+        Preprocess one image.
+
+        Args:
+            image_path: Image file path
+            decoded: Frame already returned by decode() for this image, so
+                the file is not decoded again
+
+        Returns:
+            Dictionary with one entry per configured output; 'gray' is (H, W),
+            'tensor' is (H, W, 3) and 'original' is the decoded BGR frame
+        """
+        frames = self.run_batch([image_path], [decoded])
+        return {name: value[0] for name, value in frames.items()}
+
+    def run_batch(self, image_paths, decoded=None):
+        """
+        Preprocess several images into stacked arrays.
+
+        Args:
+            image_paths: Sequence of image file paths
+            decoded: Optional sequence parallel to image_paths of frames
+                already returned by decode(); None entries are decoded here
+
+        Returns:
+            Dictionary with one entry per configured output; 'gray' and
+            'tensor' are stacked arrays backed by reused buffers, 'original'
+            is a list of decoded BGR frames
+        """
+        count = len(image_paths)
+        width, height = self.size
+        wants = set(self.outputs)
+
+        originals = []
+        gray = self._buffer('gray', count, (height, width), np.uint8) if 'gray' in wants else None
+        small = self._buffer('small', count, (height, width, 3), np.uint8) if self.decodes_color else None
+
+        decoded = decoded or [None] * count
+        for i, (image_path, img) in enumerate(zip(image_paths, decoded)):
+            if img is None:
+                img = self.decode(image_path)
+            if 'original' in wants:
+                originals.append(img)
+
+            if small is None:
+                cv2.resize(img, self.size, dst=gray[i])
+                continue
+
+            # Colour conversions run on the model-sized frame, never the full one
+            cv2.resize(img, self.size, dst=small[i])
+            if gray is not None:
+                cv2.cvtColor(small[i], cv2.COLOR_BGR2GRAY, dst=gray[i])
+
+        frames = {}
+        if 'original' in wants:
+            frames['original'] = originals
+        if gray is not None:
+            frames['gray'] = gray
+        if 'tensor' in wants:
+            for i in range(count):
+                cv2.cvtColor(small[i], cv2.COLOR_BGR2RGB, dst=small[i])
+            tensor = self._buffer('tensor', count, (height, width, 3), np.float32)
+            np.multiply(small, np.float32(1 / 255), out=tensor, casting='unsafe')
+            frames['tensor'] = tensor
+        return frames
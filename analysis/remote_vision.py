@@ -0,0 +1,357 @@
+"""
+Remote vision client for the Gemini generateContent REST API.
+
+One client per process keeps a pooled requests.Session, so connections
+and TLS sessions are reused across images. Several images are analyzed
+concurrently on a thread pool, every request first takes a token from a
+shared token bucket so the configured requests-per-minute quota is never
+exceeded, and throttled or failed requests are retried with exponential
+backoff and jitter (honouring Retry-After). Images are downscaled and
+re-encoded as JPEG before upload, so the payload is small and the declared
+mime type always matches the bytes.
+
+Each request, retries included, must finish within a latency budget, and
+goes through the backend's circuit breaker (see analysis.circuit_breaker):
+while the breaker is open calls fail at once with CircuitOpenError, so the
+detector can go straight to the local model. Only the HTTP exchange is
+guarded; an image that cannot be decoded or encoded fails before the
+breaker and is not counted against Gemini.
+"""
+
+import base64
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from core.thumbnails import render_derivative
+
+from .circuit_breaker import get_circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = 'https://generativelanguage.googleapis.com/v1beta'
+
+# HTTP statuses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class RemoteVisionError(Exception):
+    """A remote vision request failed after all retries"""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Args:
+        rate: Tokens added per second
+        capacity: Largest burst; defaults to one second's worth of tokens
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def prepare_image(image_path, max_size, quality=85, frame=None):
+    """
+    Downscale an image to fit within max_size x max_size and return JPEG bytes.
+
+    A frame the caller already decoded (BGR or grayscale, as from OpenCV)
+    is encoded directly instead of decoding image_path again.
+    """
+    if frame is None:
+        with open(image_path, 'rb') as source:
+            return render_derivative(source, (max_size, max_size), quality)
+
+    height, width = frame.shape[:2]
+    scale = max_size / max(height, width)
+    if scale < 1:
+        frame = cv2.resize(
+            frame, (max(round(width * scale), 1), max(round(height * scale), 1)), interpolation=cv2.INTER_AREA
+        )
+    ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"Could not encode image: {image_path}")
+    return encoded.tobytes()
+
+
+def parse_json_reply(text):
+    """Parse a JSON object from model output, tolerating a Markdown code fence"""
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.strip('`')
+        if text.lower().startswith('json'):
+            text = text[4:]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class RemoteVisionClient:
+    """
+    Client for a Gemini vision model.
+
+    Args:
+        api_key: API key sent in the x-goog-api-key header
+        model: Model id, e.g. 'gemini-1.5-flash'
+        base_url: API root; point it at a stub server in tests
+        max_concurrency: Requests in flight at once
+        requests_per_minute: Rate limit shared by all threads using this client
+        max_retries: Retries after the first attempt
+        backoff: Base delay in seconds; attempt n waits up to backoff * 2**n
+        timeout: Seconds per HTTP request
+        image_max_size: Long side images are downscaled to before upload
+        latency_budget: Seconds one analysis may take, retries included (None = no budget)
+        breaker: CircuitBreaker guarding analyze(), or None
+    """
+
+    def __init__(self, api_key, model='gemini-1.5-flash', base_url=DEFAULT_BASE_URL, max_concurrency=4,
+                 requests_per_minute=60, max_retries=4, backoff=1.0, timeout=60, image_max_size=1024,
+                 latency_budget=None, breaker=None):
+        self.api_key = api_key
+        self.model = model
+        self.url = f"{base_url.rstrip('/')}/models/{model}:generateContent"
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.image_max_size = image_max_size
+        self.latency_budget = latency_budget
+        self.breaker = breaker
+
+        # Burst of at most one request per concurrent slot, refilled at the quota rate
+        self.bucket = TokenBucket(requests_per_minute / 60, capacity=self.max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'x-goog-api-key': api_key, 'Content-Type': 'application/json'})
+
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix='remote-vision'
+                )
+            return self._executor
+
+    def close(self):
+        """Shut down the thread pool and close pooled connections"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        self.session.close()
+
+    def build_payload(self, image_path, prompt, frame=None):
+        image = prepare_image(image_path, self.image_max_size, frame=frame)
+        return {
+            'contents': [{
+                'parts': [
+                    {'text': prompt},
+                    {'inline_data': {'mime_type': 'image/jpeg', 'data': base64.b64encode(image).decode('ascii')}},
+                ],
+            }],
+            'generationConfig': {'response_mime_type': 'application/json'},
+        }
+
+    def _delay(self, attempt, response=None):
+        """Seconds to wait before retry `attempt` (0-based), honouring Retry-After"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return max(float(retry_after), 0)
+                except ValueError:
+                    pass
+        # Full jitter keeps concurrent retries from synchronising
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def post(self, payload, deadline=None):
+        """
+        POST a generateContent request with rate limiting and retries.
+
+        Args:
+            payload: Request body
+            deadline: time.monotonic() value by which the request must be done
+
+        Returns:
+            Decoded JSON response
+
+        Raises:
+            RemoteVisionError: If the request still fails after max_retries
+                retries, or the deadline passes
+        """
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            timeout = self.timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    raise RemoteVisionError(f"{self.model} request exceeded its latency budget")
+
+            response = None
+            try:
+                response = self.session.post(self.url, json=payload, timeout=timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+            except (requests.HTTPError, ValueError) as e:
+                raise RemoteVisionError(f"{self.model} request failed: {str(e)}") from e
+
+            if attempt == self.max_retries:
+                break
+            delay = self._delay(attempt, response)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise RemoteVisionError(f"{self.model} request exceeded its latency budget ({error})")
+            logger.warning(f"{self.model} request failed ({error}), retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+
+        raise RemoteVisionError(f"{self.model} request failed after {self.max_retries + 1} attempts: {error}")
+
+    def analyze(self, image_path, prompt, frame=None):
+        """
+        Send one image with a prompt and parse the JSON object in the reply.
+
+        Args:
+            image_path: Image file path
+            prompt: Prompt sent with the image
+            frame: The image already decoded by the caller (see prepare_image)
+
+        Returns:
+            Dictionary parsed from the model's reply, or None if the reply
+            is not a JSON object
+
+        Raises:
+            RemoteVisionError: If the request failed
+            CircuitOpenError: If the circuit breaker rejected the call
+            OSError, ValueError: If the image cannot be read or encoded (not
+                counted by the circuit breaker)
+        """
+        if self.breaker is not None:
+            # Skip encoding the image when the call would be rejected anyway
+            self.breaker.check()
+        payload = self.build_payload(image_path, prompt, frame)
+        if self.breaker is not None:
+            response = self.breaker.call(self._post_within_budget, payload)
+        else:
+            response = self._post_within_budget(payload)
+        try:
+            text = ''.join(
+                part.get('text', '') for part in response['candidates'][0]['content']['parts']
+            )
+        except (KeyError, IndexError, TypeError):
+            logger.warning(f"{self.model} returned no candidates for {image_path}")
+            return None
+        return parse_json_reply(text)
+
+    def _post_within_budget(self, payload):
+        deadline = time.monotonic() + self.latency_budget if self.latency_budget else None
+        return self.post(payload, deadline)
+
+    def analyze_many(self, image_paths, prompt, return_exceptions=False, frames=None):
+        """
+        Analyze several images concurrently.
+
+        Args:
+            image_paths: Sequence of image file paths
+            prompt: Prompt sent with every image
+            return_exceptions: Return the exception of a failed image in its
+                place instead of raising it
+            frames: Optional sequence parallel to image_paths of images the
+                caller already decoded
+
+        Returns:
+            List of analyze() results in the order of image_paths
+
+        Raises:
+            Exception: The first failure, unless return_exceptions is set
+        """
+        frames = frames or [None] * len(image_paths)
+        futures = [
+            self.executor.submit(self.analyze, image_path, prompt, frame)
+            for image_path, frame in zip(image_paths, frames)
+        ]
+        if not return_exceptions:
+            return [future.result() for future in futures]
+        return [future.exception() or future.result() for future in futures]
+
+
+_client = None
+_client_config = None
+_client_lock = threading.Lock()
+
+
+def get_remote_vision_client():
+    """Return the process-wide client for the current settings, or None without an API key"""
+    global _client, _client_config
+
+    config = (
+        getattr(settings, 'GEMINI_API_KEY', ''),
+        getattr(settings, 'GEMINI_MODEL', 'gemini-1.5-flash'),
+        getattr(settings, 'GEMINI_API_BASE_URL', DEFAULT_BASE_URL),
+        getattr(settings, 'GEMINI_MAX_CONCURRENCY', 4),
+        getattr(settings, 'GEMINI_REQUESTS_PER_MINUTE', 60),
+        getattr(settings, 'GEMINI_MAX_RETRIES', 4),
+        getattr(settings, 'GEMINI_RETRY_BACKOFF', 1.0),
+        getattr(settings, 'GEMINI_TIMEOUT', 60),
+        getattr(settings, 'GEMINI_IMAGE_MAX_SIZE', 1024),
+    )
+    if not config[0]:
+        return None
+
+    options = dict(getattr(settings, 'GEMINI_CIRCUIT_BREAKER', {}))
+    latency_budget = options.get('LATENCY_BUDGET') or None
+    breaker = get_circuit_breaker(
+        'gemini',
+        latency_budget=latency_budget,
+        error_rate=options.get('ERROR_RATE', 0.5),
+        min_calls=options.get('MIN_CALLS', 5),
+        window=options.get('WINDOW', 20),
+        reset_timeout=options.get('RESET_TIMEOUT', 30),
+        half_open_probes=options.get('HALF_OPEN_PROBES', 1),
+        failure_types=(RemoteVisionError, requests.RequestException),
+    )
+
+    with _client_lock:
+        if _client is None or _client_config != config or _client.breaker is not breaker:
+            if _client is not None:
+                _client.close()
+            _client = RemoteVisionClient(*config, latency_budget=latency_budget, breaker=breaker)
+            _client_config = config
+        return _client
@@ -0,0 +1,300 @@
+"""
+Content-hash cache for AI analysis results.
+
+Results are keyed on (SHA-256 of the image bytes, model_name, model_version),
+so re-uploads of the same photo and re-analysis with an unchanged model reuse
+the stored result, including the annotated image, without touching the detector.
+
+The storage backend is selected with settings.AI_RESULT_CACHE['BACKEND']:
+- 'lru':    in-process LRU dictionary (default)
+- 'disk':   one JSON file per entry under settings.AI_RESULT_CACHE['LOCATION']
+- 'django': any cache configured in settings.CACHES
+- 'none':   caching disabled
+
+Hits, misses and stores are counted per process and, so that the counts
+of Celery workers (where analysis runs) are visible to the web process,
+also in the Django cache named by settings.AI_RESULT_CACHE['CACHE_ALIAS'].
+Those shared counters only cover every process when that cache is shared,
+e.g. Redis (REDIS_CACHE_URL); with the default LocMemCache they are per
+process too.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCacheBackend:
+    """In-process LRU cache with entry-count and TTL eviction"""
+
+    name = 'lru'
+
+    def __init__(self, max_entries=1024, ttl=None, **kwargs):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCacheBackend:
+    """
+    Local-disk cache storing one JSON file per entry.
+
+    Shared by every process on the host. Access time is tracked through the
+    file mtime, so eviction drops the least recently used entries.
+    """
+
+    name = 'disk'
+
+    def __init__(self, location, max_entries=1024, ttl=None, **kwargs):
+        self.location = Path(location)
+        self.location.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def _path(self, key):
+        return self.location / f"{key}.json"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if self.ttl and time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            value = json.loads(path.read_text())
+            path.touch()
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(value))
+        tmp_path.replace(path)
+        self._evict()
+
+    def delete(self, key):
+        self._path(key).unlink(missing_ok=True)
+
+    def clear(self):
+        for path in self.location.glob('*.json'):
+            path.unlink(missing_ok=True)
+
+    def _evict(self):
+        entries = list(self.location.glob('*.json'))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda p: p.stat().st_mtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            path.unlink(missing_ok=True)
+
+    def __len__(self):
+        return sum(1 for _ in self.location.glob('*.json'))
+
+
+class DjangoCacheBackend:
+    """
+    Cache backed by Django's cache framework.
+
+    Size limits are governed by the configured cache (e.g. OPTIONS.MAX_ENTRIES
+    for LocMemCache, maxmemory for Redis); the TTL is passed as the timeout.
+    """
+
+    name = 'django'
+
+    def __init__(self, cache_alias='default', ttl=None, **kwargs):
+        from django.core.cache import caches
+        self.cache = caches[cache_alias]
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.cache.get(f"ai_result:{key}")
+
+    def set(self, key, value):
+        self.cache.set(f"ai_result:{key}", value, timeout=self.ttl)
+
+    def delete(self, key):
+        self.cache.delete(f"ai_result:{key}")
+
+    def clear(self):
+        # Never flush a shared cache; entries expire through their TTL
+        pass
+
+    def __len__(self):
+        return 0
+
+
+STATS_KEY = 'ai_result_cache_stats:{}'
+
+BACKENDS = {
+    'lru': LRUCacheBackend,
+    'disk': DiskCacheBackend,
+    'django': DjangoCacheBackend,
+}
+
+
+class ResultCache:
+    """Analysis result cache with hit/miss counters"""
+
+    def __init__(self, backend, stats_alias='default'):
+        from django.core.cache import caches
+        self.backend = backend
+        self.stats_cache = caches[stats_alias]
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hash_file(image_path):
+        """Return the SHA-256 hex digest of an image file's bytes"""
+        with open(image_path, 'rb') as f:
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+
+    @staticmethod
+    def make_key(content_hash, model_name, model_version):
+        """Build the cache key for an image hash and model identity"""
+        identity = f"{content_hash}:{model_name}:{model_version}"
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a stored result.
+
+        Entries whose annotated image has been removed from disk are treated
+        as misses, since a hit must be usable without re-running annotation.
+        """
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Result cache lookup failed: {str(e)}")
+            value = None
+
+        annotated_path = value.get('annotated_image_path') if value else None
+        if annotated_path and not Path(annotated_path).exists():
+            self.backend.delete(key)
+            value = None
+
+        self._count('misses' if value is None else 'hits')
+        # Callers add to the nested metadata; never hand out the stored objects
+        return copy.deepcopy(value) if value is not None else None
+
+    def set(self, key, results):
+        """Store a result dictionary"""
+        try:
+            # The LRU backend keeps the object itself, so store a copy
+            self.backend.set(key, copy.deepcopy(results))
+        except Exception as e:
+            logger.warning(f"Result cache store failed: {str(e)}")
+            return
+        self._count('stores')
+
+    def _count(self, counter):
+        """Increment a counter in this process and in the shared stats cache"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        try:
+            key = STATS_KEY.format(counter)
+            self.stats_cache.add(key, 0, timeout=None)
+            self.stats_cache.incr(key)
+        except Exception as e:
+            logger.debug(f"Result cache stats update failed: {str(e)}")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """
+        Return counters for monitoring.
+
+        hits, misses and stores are the shared counters (all processes using
+        the stats cache); 'process' holds this process's own counts, and
+        'shared' says whether the stats cache is shared between processes.
+        """
+        from django.core.cache.backends.dummy import DummyCache
+        from django.core.cache.backends.locmem import LocMemCache
+
+        counters = ('hits', 'misses', 'stores')
+        try:
+            stored = self.stats_cache.get_many([STATS_KEY.format(counter) for counter in counters])
+            totals = {counter: stored.get(STATS_KEY.format(counter), 0) for counter in counters}
+        except Exception as e:
+            logger.warning(f"Result cache stats lookup failed: {str(e)}")
+            totals = {counter: getattr(self, counter) for counter in counters}
+
+        lookups = totals['hits'] + totals['misses']
+        return {
+            'backend': self.backend.name,
+            'entries': len(self.backend),
+            **totals,
+            'hit_rate': round(totals['hits'] / lookups, 4) if lookups else 0.0,
+            'shared': not isinstance(self.stats_cache, (LocMemCache, DummyCache)),
+            'process': {counter: getattr(self, counter) for counter in counters},
+        }
+
+
+# Singleton instance
+_result_cache = None
+_result_cache_initialized = False
+
+
+def get_result_cache():
+    """Get or create the result cache configured in settings, or None if disabled"""
+    global _result_cache, _result_cache_initialized
+    if not _result_cache_initialized:
+        options = dict(getattr(settings, 'AI_RESULT_CACHE', {}))
+        backend_name = options.pop('BACKEND', 'lru') or 'none'
+
+        if backend_name in BACKENDS:
+            backend = BACKENDS[backend_name](
+                max_entries=options.get('MAX_ENTRIES', 1024),
+                ttl=options.get('TTL') or None,
+                location=options.get('LOCATION', Path(settings.BASE_DIR) / 'cache' / 'analysis_results'),
+                cache_alias=options.get('CACHE_ALIAS', 'default'),
+            )
+            _result_cache = ResultCache(backend, stats_alias=options.get('CACHE_ALIAS', 'default'))
+        elif backend_name != 'none':
+            logger.warning(f"Unknown AI_RESULT_CACHE backend '{backend_name}', result caching disabled")
+
+        _result_cache_initialized = True
+    return _result_cache
@@ -5,22 +5,181 @@ Celery tasks for asynchronous image analysis
 from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
+from kombu.exceptions import OperationalError
 from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def enqueue_task(task, *args):
+    """
+    Queue a task, running it inline if the broker is unreachable.
+    
+    With TASK_EXECUTION_MODE = 'sync' Celery runs tasks eagerly, inline in
+    the caller. In 'async' mode the task goes to the broker; if the broker is
+    unreachable the task runs inline rather than leaving images pending.
+    """
+    try:
+        return task.delay(*args)
+    except OperationalError as e:
+        logger.warning(f"Task broker unavailable ({str(e)}), running {task.name} inline")
+        return task.apply(args=args)
+
+
+def enqueue_analysis(image_record_id, link_duplicates=True):
+    """
+    Queue analysis of an ImageRecord.
+    
+    Args:
+        image_record_id: ID of the ImageRecord to analyze
+        link_duplicates: Reuse the analysis of a near-duplicate frame if
+            there is one; pass False to force the detector to run
+    """
+    return enqueue_task(analyze_image_task, image_record_id, link_duplicates)
+
+
+def enqueue_analysis_batch(image_record_ids):
+    """
+    Queue analysis of several ImageRecords as one detector batch.
+    
+    Args:
+        image_record_ids: List of ImageRecord IDs to analyze together
+    """
+    return enqueue_task(analyze_image_batch_task, list(image_record_ids))
+
+
+def save_analysis_results(image_record, results):
+    """
+    Store detector results for an image and send alerts if needed.
+    
+    Args:
+        image_record: ImageRecord that was analyzed
+        results: Result dictionary from RoadDefectDetector.analyze_image
+        
+    Returns:
+        The saved AnalysisResult
+    """
+    from .models import AnalysisResult
+    
+    # Save analysis results (replacing any previous result on re-analysis)
+    analysis, _ = AnalysisResult.objects.update_or_create(
+        image_record=image_record,
+        defaults={
+            'defect_type': results['defect_type'],
+            'severity_score': results['severity_score'],
+            'condition_label': results['condition_label'],
+            'ai_confidence': results['ai_confidence'],
+            'model_name': results['model_name'],
+            'model_version': results['model_version'],
+            'analysis_metadata': results.get('analysis_metadata', {}),
+            'maintenance_suggestion': results.get('maintenance_suggestion', ''),
+        },
+    )
+    
+    # Save annotated image if available
+    if results.get('annotated_image_path'):
+        from django.core.files import File
+        with open(results['annotated_image_path'], 'rb') as f:
+            analysis.annotated_image.save(
+                Path(results['annotated_image_path']).name,
+                File(f),
+                save=True
+            )
+    
+    logger.info(f"Analysis complete for image {image_record.id}: {results['defect_type']} - {results['condition_label']}")
+    
+    # Send email notification for critical conditions
+    if results['condition_label'] == 'critical':
+        enqueue_task(send_critical_alert, image_record.id)
+    
+    return analysis
+
+
+def link_duplicate(image_record, source, distance):
+    """
+    Give a near-duplicate frame a copy of another frame's analysis.
+    
+    The image links to the frame that was actually analyzed (following
+    source's own link), and no critical alert is sent again.
+    
+    Args:
+        image_record: ImageRecord to store the result for
+        source: Analyzed ImageRecord it is a near-duplicate of
+        distance: Hamming distance between their perceptual hashes
+        
+    Returns:
+        The saved AnalysisResult
+    """
+    from .models import AnalysisResult
+    
+    analysis = source.analysis
+    original_id = source.duplicate_of_id or source.id
+    
+    image_record.duplicate_of_id = original_id
+    image_record.save(update_fields=['duplicate_of', 'updated_date'])
+    
+    metadata = dict(analysis.analysis_metadata)
+    metadata['duplicate'] = {'of': original_id, 'hamming_distance': distance}
+    result, _ = AnalysisResult.objects.update_or_create(
+        image_record=image_record,
+        defaults={
+            'defect_type': analysis.defect_type,
+            'severity_score': analysis.severity_score,
+            'condition_label': analysis.condition_label,
+            'ai_confidence': analysis.ai_confidence,
+            'model_name': analysis.model_name,
+            'model_version': analysis.model_version,
+            'analysis_metadata': metadata,
+            'maintenance_suggestion': analysis.maintenance_suggestion,
+            # Shares the original's annotated file
+            'annotated_image': analysis.annotated_image.name or None,
+        },
+    )
+    
+    logger.info(
+        f"Image {image_record.id} is a near-duplicate of image {original_id} (distance {distance}), "
+        f"reusing its analysis"
+    )
+    return result
+
+
+def hash_image(image_record):
+    """
+    Store an image's perceptual hash if it has none.
+    
+    The hash comes from a reduced (draft) decode of the file, so the
+    near-duplicate and result cache lookups never need the full frame;
+    the detector decodes that only for the images it actually analyzes.
+    
+    Args:
+        image_record: ImageRecord about to be analyzed
+    """
+    from core import perceptual_hash
+    
+    if image_record.phash:
+        return
+    value = perceptual_hash.file_dhash(image_record.image.path)
+    if value is None:
+        # Left to the detector, which reports the unreadable file
+        logger.warning(f"Could not hash image {image_record.id}")
+        return
+    image_record.set_phash(value)
+    image_record.save(update_fields=['phash', *perceptual_hash.CHUNK_FIELDS, 'updated_date'])
+
+
 @shared_task
-def analyze_image_task(image_record_id):
+def analyze_image_task(image_record_id, link_duplicates=True):
     """
     Asynchronous task to analyze an uploaded image.
     
     Args:
         image_record_id: ID of the ImageRecord to analyze
+        link_duplicates: Reuse the analysis of a near-duplicate frame (see
+            core.dedup) instead of running the detector
     """
+    from core.dedup import dedup_enabled, find_duplicate
     from core.models import ImageRecord
-    from .models import AnalysisResult
     from .ai_model import get_detector
     
     try:
@@ -29,45 +188,31 @@ def analyze_image_task(image_record_id):
         
         # Update status to processing
         image_record.status = 'processing'
-        image_record.save()
-        
-        logger.info(f"Starting analysis for image {image_record_id}")
+        image_record.save(update_fields=['status', 'updated_date'])
         
         # Get AI detector
         detector = get_detector()
+        hash_image(image_record)
+        
+        duplicate = find_duplicate(image_record) if link_duplicates and dedup_enabled() else None
+        if duplicate is not None:
+            link_duplicate(image_record, *duplicate)
+            return {
+                'status': 'duplicate',
+                'image_id': image_record_id,
+                'duplicate_of': image_record.duplicate_of_id,
+            }
+        if image_record.duplicate_of_id is not None:
+            image_record.duplicate_of = None
+            image_record.save(update_fields=['duplicate_of', 'updated_date'])
+        
+        logger.info(f"Starting analysis for image {image_record_id}")
         
         # Analyze image
         image_path = image_record.image.path
         results = detector.analyze_image(image_path)
         
-        # Save analysis results
-        analysis = AnalysisResult.objects.create(
-            image_record=image_record,
-            defect_type=results['defect_type'],
-            severity_score=results['severity_score'],
-            condition_label=results['condition_label'],
-            ai_confidence=results['ai_confidence'],
-            model_name=results['model_name'],
-            model_version=results['model_version'],
-            analysis_metadata=results.get('analysis_metadata', {}),
-            maintenance_suggestion=results.get('maintenance_suggestion', ''),
-        )
-        
-        # Save annotated image if available
-        if results.get('annotated_image_path'):
-            from django.core.files import File
-            with open(results['annotated_image_path'], 'rb') as f:
-                analysis.annotated_image.save(
-                    Path(results['annotated_image_path']).name,
-                    File(f),
-                    save=True
-                )
-        
-        logger.info(f"Analysis complete for image {image_record_id}: {results['defect_type']} - {results['condition_label']}")
-        
-        # Send email notification for critical conditions
-        if results['condition_label'] == 'critical':
-            send_critical_alert.delay(image_record_id)
+        save_analysis_results(image_record, results)
         
         return {
             'status': 'success',
@@ -86,13 +231,100 @@ def analyze_image_task(image_record_id):
         try:
             image_record = ImageRecord.objects.get(id=image_record_id)
             image_record.status = 'failed'
-            image_record.save()
+            image_record.save(update_fields=['status', 'updated_date'])
         except:
             pass
         
         return {'status': 'error', 'message': str(e)}
 
 
+@shared_task
+def analyze_image_batch_task(image_record_ids):
+    """
+    Asynchronous task to analyze a chunk of uploaded images in one detector batch.
+    
+    If the batch fails as a whole (for example one file cannot be decoded),
+    the images are analyzed one by one so only the bad file is marked failed.
+    
+    Near-duplicates of already analyzed frames, and of earlier frames in
+    the same batch, reuse those frames' analysis (see core.dedup); only the
+    rest go through the detector.
+    
+    Args:
+        image_record_ids: List of ImageRecord IDs to analyze
+    """
+    from core.dedup import dedup_enabled, find_duplicate, group_duplicates
+    from core.models import ImageRecord
+    from .ai_model import get_detector
+    
+    image_records = list(ImageRecord.objects.filter(id__in=image_record_ids).order_by('upload_date', 'id'))
+    if not image_records:
+        return {'status': 'error', 'message': 'Images not found'}
+    
+    for image_record in image_records:
+        image_record.status = 'processing'
+        image_record.save(update_fields=['status', 'updated_date'])
+    
+    detector = get_detector()
+    for image_record in image_records:
+        hash_image(image_record)
+    
+    pending = image_records
+    batch_duplicates = {}
+    if dedup_enabled():
+        pending = []
+        for image_record in image_records:
+            duplicate = find_duplicate(image_record)
+            if duplicate is not None:
+                link_duplicate(image_record, *duplicate)
+            else:
+                pending.append(image_record)
+        batch_duplicates = group_duplicates(pending)
+        pending = [image_record for image_record in pending if image_record.id not in batch_duplicates]
+    
+    logger.info(
+        f"Starting batch analysis for {len(pending)} images "
+        f"({len(image_records) - len(pending)} near-duplicates reuse an analysis)"
+    )
+    
+    try:
+        # Decodes only the images the result cache does not already cover
+        results = detector.analyze_batch([image_record.image.path for image_record in pending])
+    except Exception as e:
+        logger.warning(f"Batch analysis failed ({str(e)}), analyzing {len(pending)} images individually")
+        # One by one, later near-duplicates find the earlier frames' results
+        remaining = pending + [image_record for image_record in image_records if image_record.id in batch_duplicates]
+        return {
+            'status': 'partial',
+            'results': [analyze_image_task(image_record.id) for image_record in remaining],
+        }
+    
+    for image_record, image_results in zip(pending, results):
+        try:
+            save_analysis_results(image_record, image_results)
+        except Exception as e:
+            logger.error(f"Error saving analysis for image {image_record.id}: {str(e)}")
+            image_record.status = 'failed'
+            image_record.save(update_fields=['status', 'updated_date'])
+    
+    from .models import AnalysisResult
+    
+    for image_record in image_records:
+        if image_record.id not in batch_duplicates:
+            continue
+        source, distance = batch_duplicates[image_record.id]
+        try:
+            link_duplicate(image_record, source, distance)
+        except AnalysisResult.DoesNotExist:
+            # The frame it duplicates failed; analyze this one itself
+            analyze_image_task(image_record.id, link_duplicates=False)
+    
+    return {
+        'status': 'success',
+        'image_ids': [image_record.id for image_record in image_records],
+    }
+
+
 @shared_task
 def send_critical_alert(image_record_id):
     """
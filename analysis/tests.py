@@ -1,4 +1,1270 @@
 # Django test module
-from django.test import TestCase
+import base64
+import io
+import json
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core import mail
+from django.test import SimpleTestCase, TestCase, override_settings
+from kombu.exceptions import OperationalError
+from PIL import Image
+
+from accounts.models import User
+
+from core.tests import ImageFixturesTestCase
+
+from . import backends, circuit_breaker, workers
+from .ai_model import RoadDefectDetector
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .localization import localize, tile_densities
+from .models import AnalysisResult
+from .preprocessing import PreprocessPipeline, reduction_factor
+from .remote_vision import RemoteVisionClient, RemoteVisionError, TokenBucket
+from .result_cache import STATS_KEY, LRUCacheBackend, ResultCache
+from .tasks import analyze_image_task, enqueue_analysis, enqueue_task, save_analysis_results, send_critical_alert
+from .workers import ThroughputMonitor
+
+
+def write_frame(path, width=640, height=480, seed=0):
+    """Write a textured synthetic road frame with a dark crack-like stroke"""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(60, 140, size=(height, width, 3), dtype=np.uint8)
+    cv2.line(frame, (0, 0), (width - 1, height - 1), (20, 20, 20), 5)
+    cv2.imwrite(str(path), frame)
+    return path
+
+
+class PreprocessPipelineTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        self.paths = [write_frame(self.workdir / f'frame_{i}.jpg', seed=i) for i in range(3)]
+
+    def test_outputs_only_requested_representations(self):
+        frames = PreprocessPipeline(('gray',)).run_batch(self.paths)
+        self.assertEqual(set(frames), {'gray'})
+        self.assertEqual(frames['gray'].shape, (3, 224, 224))
+        self.assertEqual(frames['gray'].dtype, np.uint8)
+
+        frames = PreprocessPipeline(('tensor', 'original')).run(self.paths[0])
+        self.assertEqual(set(frames), {'tensor', 'original'})
+        self.assertEqual(frames['tensor'].shape, (224, 224, 3))
+        self.assertEqual(frames['tensor'].dtype, np.float32)
+        self.assertLessEqual(frames['tensor'].max(), 1.0)
+        self.assertEqual(frames['original'].shape, (480, 640, 3))
+
+    def test_gray_matches_float_round_trip(self):
+        original, tensor = RoadDefectDetector().preprocess_image(self.paths[0])
+        legacy = RoadDefectDetector.as_gray(tensor).astype(int)
+        gray = PreprocessPipeline(('gray', 'original')).run(self.paths[0])['gray'].astype(int)
+        self.assertLessEqual(np.abs(gray - legacy).max(), 2)
+
+    def test_buffers_are_reused(self):
+        pipeline = PreprocessPipeline(('gray',))
+        first = pipeline.run_batch(self.paths)['gray']
+        second = pipeline.run_batch(self.paths[:2])['gray']
+        self.assertTrue(np.shares_memory(first, second))
+
+    def test_rejects_unknown_representation(self):
+        with self.assertRaises(ValueError):
+            PreprocessPipeline(('rgb',))
+
+    def test_unreadable_image(self):
+        path = self.workdir / 'broken.jpg'
+        path.write_bytes(b'not an image')
+        with self.assertRaises(ValueError):
+            PreprocessPipeline().run(path)
+
+    def test_detector_accepts_gray_and_float_input(self):
+        detector = RoadDefectDetector()
+        with override_settings(MEDIA_ROOT=str(self.workdir / 'media')):
+            results = detector.analyze_batch(self.paths, use_cache=False)
+            single = detector.analyze_image(self.paths[0], use_cache=False)
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(single['defect_type'], results[0]['defect_type'])
+        self.assertAlmostEqual(
+            single['analysis_metadata']['edge_density'],
+            results[0]['analysis_metadata']['edge_density']
+        )
+
+        _, tensor = detector.preprocess_image(self.paths[0])
+        from_float = detector.detect_defects(tensor)['metadata']['edge_density']
+        self.assertAlmostEqual(from_float, single['analysis_metadata']['edge_density'], delta=0.02)
+
+
+class BatchAnalysisTestCase(SimpleTestCase):
+    """analyze_batch parity with analyze_image, and the benchmark_detector command"""
+
+    FIELDS = ('defect_type', 'severity_score', 'condition_label', 'ai_confidence', 'model_name', 'model_version')
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=str(self.workdir / 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+        self.paths = [write_frame(self.workdir / f'frame_{i}.jpg', seed=i) for i in range(4)]
+        self.detector = RoadDefectDetector()
+
+    def test_batch_matches_single_image_analysis(self):
+        batch = self.detector.analyze_batch(self.paths, use_cache=False)
+
+        self.assertEqual(len(batch), len(self.paths))
+        for path, result in zip(self.paths, batch):
+            single = self.detector.analyze_image(path, use_cache=False)
+            with self.subTest(path=path.name):
+                self.assertEqual({f: result[f] for f in self.FIELDS}, {f: single[f] for f in self.FIELDS})
+                self.assertAlmostEqual(
+                    result['analysis_metadata']['edge_density'], single['analysis_metadata']['edge_density']
+                )
+                self.assertTrue(Path(result['annotated_image_path']).exists())
+
+    def test_unreadable_member_fails_the_batch(self):
+        broken = self.workdir / 'broken.jpg'
+        broken.write_bytes(b'not an image')
+
+        # The analysis task then retries the images one by one
+        with self.assertRaises(ValueError):
+            self.detector.analyze_batch([self.paths[0], broken, self.paths[1]], use_cache=False)
+        with self.assertRaises(ValueError):
+            self.detector.analyze_image(broken, use_cache=False)
+        self.assertEqual(
+            self.detector.analyze_image(self.paths[1], use_cache=False)['defect_type'],
+            self.detector.analyze_batch([self.paths[1]], use_cache=False)[0]['defect_type'],
+        )
+
+    def test_empty_batch(self):
+        with mock.patch('analysis.ai_model.get_result_cache') as get_result_cache:
+            self.assertEqual(self.detector.analyze_batch([]), [])
+        get_result_cache.assert_not_called()
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+
+        call_command(
+            'benchmark_detector', '--batch-sizes', '2', '1', '--width', '96', '--height', '64', '--repeat', '1',
+            stdout=out,
+        )
+
+        rows = [line.split() for line in out.getvalue().splitlines() if line.startswith('analyze_')]
+        self.assertEqual(
+            [(row[0], row[-3]) for row in rows],
+            [('analyze_image', '1'), ('analyze_batch', '1'), ('analyze_image', '2'), ('analyze_batch', '2')],
+        )
+        self.assertTrue(all(float(row[-1]) > 0 for row in rows))
+
+    def test_benchmark_command_uses_image_directory(self):
+        out = io.StringIO()
+        call_command('benchmark_detector', '--batch-sizes', '3', '--images', str(self.workdir), '--repeat', '1', stdout=out)
+        self.assertIn('Benchmarking on 3 images', out.getvalue())
+
+        with self.assertRaisesMessage(CommandError, 'No .jpg/.png images found'):
+            call_command('benchmark_detector', '--images', str(self.workdir / 'media'), stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, 'Batch sizes must be positive'):
+            call_command('benchmark_detector', '--batch-sizes', '0', stdout=io.StringIO())
+
+
+class ResultCacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        cache.delete_many([STATS_KEY.format(counter) for counter in ('hits', 'misses', 'stores')])
+
+    def test_hits_and_misses(self):
+        results = ResultCache(LRUCacheBackend())
+
+        self.assertIsNone(results.get('a'))
+        results.set('a', {'defect_type': 'crack'})
+        self.assertEqual(results.get('a'), {'defect_type': 'crack'})
+
+        stats = results.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stores']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['process'], {'hits': 1, 'misses': 1, 'stores': 1})
+        self.assertFalse(stats['shared'])
+
+    def test_counters_are_shared_through_the_stats_cache(self):
+        web, worker = ResultCache(LRUCacheBackend()), ResultCache(LRUCacheBackend())
+        worker.set('a', {})
+        worker.get('a')
+
+        stats = web.stats()
+        self.assertEqual((stats['hits'], stats['stores']), (1, 1))
+        self.assertEqual(stats['process'], {'hits': 0, 'misses': 0, 'stores': 0})
+
+    def test_lru_eviction(self):
+        backend = LRUCacheBackend(max_entries=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+
+        self.assertEqual(backend.get('a'), 1)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('c'), 3)
+        self.assertEqual(len(backend), 2)
+
+    def test_ttl(self):
+        backend = LRUCacheBackend(ttl=60)
+        with mock.patch('analysis.result_cache.time.time', return_value=1000):
+            backend.set('a', 1)
+        with mock.patch('analysis.result_cache.time.time', return_value=1059):
+            self.assertEqual(backend.get('a'), 1)
+        with mock.patch('analysis.result_cache.time.time', return_value=1061):
+            self.assertIsNone(backend.get('a'))
+        self.assertEqual(len(backend), 0)
+
+    def test_values_are_copied(self):
+        results = ResultCache(LRUCacheBackend())
+        stored = {'analysis_metadata': {'boxes': []}}
+        results.set('a', stored)
+        stored['analysis_metadata']['boxes'].append('changed before the hit')
+
+        hit = results.get('a')
+        hit['analysis_metadata']['duplicate'] = {'of': 1}
+        self.assertEqual(results.get('a'), {'analysis_metadata': {'boxes': []}})
+
+    def test_missing_annotated_image_is_a_miss(self):
+        results = ResultCache(LRUCacheBackend())
+        results.set('a', {'annotated_image_path': str(self.workdir / 'gone.jpg')})
+        self.assertIsNone(results.get('a'))
+
+    def test_hit_gets_its_own_annotated_image(self):
+        first = write_frame(self.workdir / 'first.jpg')
+        second = self.workdir / 'second.jpg'
+        shutil.copyfile(first, second)
+
+        results = ResultCache(LRUCacheBackend())
+        detector = RoadDefectDetector()
+        with override_settings(MEDIA_ROOT=str(self.workdir / 'media')), \
+                mock.patch('analysis.ai_model.get_result_cache', return_value=results), \
+                mock.patch.object(detector, '_analyze_uncached', wraps=detector._analyze_uncached) as analyze:
+            original = detector.analyze_image(first)
+            reused = detector.analyze_image(second)
+
+        self.assertEqual(analyze.call_count, 1)
+        self.assertEqual(reused['defect_type'], original['defect_type'])
+        self.assertTrue(Path(reused['annotated_image_path']).name.startswith('second_'))
+        self.assertNotEqual(reused['annotated_image_path'], original['annotated_image_path'])
+        self.assertEqual(
+            Path(reused['annotated_image_path']).read_bytes(),
+            Path(original['annotated_image_path']).read_bytes(),
+        )
+
+
+    def test_same_stem_upload_does_not_replace_a_cached_annotation(self):
+        (self.workdir / 'day1').mkdir()
+        (self.workdir / 'day2').mkdir()
+        first = write_frame(self.workdir / 'day1' / 'IMG_0001.jpg', seed=1)
+        other = write_frame(self.workdir / 'day2' / 'IMG_0001.jpg', seed=2)
+        repeat = self.workdir / 'repeat.jpg'
+        shutil.copyfile(first, repeat)
+
+        results = ResultCache(LRUCacheBackend())
+        detector = RoadDefectDetector()
+        with override_settings(MEDIA_ROOT=str(self.workdir / 'media')), \
+                mock.patch('analysis.ai_model.get_result_cache', return_value=results):
+            original = detector.analyze_image(first)
+            expected = Path(original['annotated_image_path']).read_bytes()
+            overwriting = detector.analyze_image(other)
+            reused = detector.analyze_image(repeat)
+
+        self.assertNotEqual(overwriting['annotated_image_path'], original['annotated_image_path'])
+        self.assertEqual(Path(original['annotated_image_path']).read_bytes(), expected)
+        self.assertEqual(Path(reused['annotated_image_path']).read_bytes(), expected)
+        self.assertNotEqual(expected, Path(overwriting['annotated_image_path']).read_bytes())
+
+
+class ReducedDecodeTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        self.path = write_frame(self.workdir / 'photo.jpg', width=4000, height=3000)
+
+    def test_reduction_factor(self):
+        self.assertEqual(reduction_factor((4000, 3000), (224, 224)), 8)
+        self.assertEqual(reduction_factor((1000, 800), (224, 224)), 2)
+        self.assertEqual(reduction_factor((300, 300), (224, 224)), 1)
+        self.assertEqual(reduction_factor((4000, 3000), (224, 1600)), 2)
+        # Orientation does not matter
+        self.assertEqual(reduction_factor((3000, 4000), (224, 1600)), 2)
+
+    def test_model_input_uses_smallest_decode(self):
+        self.assertEqual(PreprocessPipeline(('gray',)).decode(self.path).shape, (375, 500))
+
+    def test_original_decoded_for_annotation_size(self):
+        pipeline = PreprocessPipeline(('gray', 'original'), original_min_size=1600)
+        frames = pipeline.run(self.path)
+        self.assertEqual(frames['original'].shape, (1500, 2000, 3))
+        self.assertEqual(frames['gray'].shape, (224, 224))
+
+        full = PreprocessPipeline(('gray', 'original')).run(self.path)
+        self.assertEqual(full['original'].shape, (3000, 4000, 3))
+
+
+def golden_frame(seed, strokes, texture):
+    """Seeded 224x224 grayscale road frame: smooth shading, grain and dark strokes"""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(80, 140, size=(28, 28), dtype=np.uint8)
+    frame = cv2.resize(coarse, (224, 224), interpolation=cv2.INTER_CUBIC)
+    if texture:
+        frame = cv2.add(frame, rng.integers(0, texture, size=frame.shape, dtype=np.uint8))
+    for _ in range(strokes):
+        pt1 = tuple(int(v) for v in rng.integers(0, 224, size=2))
+        pt2 = tuple(int(v) for v in rng.integers(0, 224, size=2))
+        cv2.line(frame, pt1, pt2, 20, 2)
+    return frame
+
+
+# (seed, strokes, texture) -> (defect type, edge density, confidence)
+GOLDEN_DETECTIONS = [
+    ((0, 0, 0), ('no_defect', 0.0, 0.95)),
+    ((1, 3, 0), ('no_defect', 0.0159, 0.9444)),
+    ((2, 8, 0), ('edge_crack', 0.0503, 0.5935)),
+    ((3, 0, 40), ('crack', 0.3182, 0.95)),
+    ((4, 12, 20), ('rough_surface', 0.1113, 0.7173)),
+    ((5, 20, 0), ('edge_crack', 0.0886, 0.713)),
+    ((6, 30, 10), ('rough_surface', 0.1215, 0.8163)),
+    ((7, 5, 60), ('crack', 0.3628, 0.95)),
+]
+
+
+class DetectorConfidenceTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.detector = RoadDefectDetector()
+        self.frames = np.stack([golden_frame(*args) for args, _ in GOLDEN_DETECTIONS])
+
+    def test_golden_detections(self):
+        for (args, expected), detection in zip(GOLDEN_DETECTIONS, self.detector.detect_defects_batch(self.frames)):
+            defect_type, edge_density, confidence = expected
+            with self.subTest(frame=args):
+                self.assertEqual(detection['defect_type'], defect_type)
+                self.assertAlmostEqual(detection['metadata']['edge_density'], edge_density, places=3)
+                self.assertAlmostEqual(detection['confidence'], confidence, places=2)
+
+    def test_deterministic(self):
+        first = self.detector.detect_defects_batch(self.frames)
+        self.assertEqual(first, self.detector.detect_defects_batch(self.frames.copy()))
+        self.assertEqual(first, RoadDefectDetector().detect_defects_batch(self.frames))
+        self.assertEqual(first, [self.detector.detect_defects(frame) for frame in self.frames])
+
+    def test_confidence_falls_near_class_bounds(self):
+        low, high = RoadDefectDetector.CONFIDENCE_RANGE
+        for detection in self.detector.detect_defects_batch(self.frames):
+            self.assertGreaterEqual(detection['confidence'], low)
+            self.assertLessEqual(detection['confidence'], high)
+
+        # Edge density 0.0503 sits on the 0.05 bound; 0.0 is far from any bound
+        detections = self.detector.detect_defects_batch(self.frames[[0, 2]])
+        self.assertLess(detections[1]['confidence'], detections[0]['confidence'])
+        self.assertLess(detections[1]['metadata']['threshold_margin'], 0.05)
+
+    def test_analysis_is_reproducible(self):
+        workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, workdir, ignore_errors=True)
+        path = workdir / 'golden.png'
+        cv2.imwrite(str(path), golden_frame(4, 12, 20))
+
+        with override_settings(MEDIA_ROOT=str(workdir / 'media')):
+            first = self.detector.analyze_image(path, use_cache=False)
+            second = self.detector.analyze_image(path, use_cache=False)
+        self.assertEqual(first, second)
+
+
+class LocalizationTestCase(SimpleTestCase):
+
+    def frame(self, width=2016, height=1512):
+        rng = np.random.default_rng(0)
+        coarse = rng.integers(80, 140, size=(height // 8, width // 8), dtype=np.uint8)
+        frame = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+        return cv2.add(frame, rng.integers(0, 12, size=frame.shape, dtype=np.uint8))
+
+    def test_tile_densities_match_direct_sums(self):
+        edges = (np.random.default_rng(1).random((100, 150)) > 0.8).astype(np.uint8)
+        densities, ys, xs = tile_densities(edges, 40, 20)
+        self.assertEqual(list(ys), [0, 20, 40, 60])
+        self.assertEqual(list(xs), [0, 20, 40, 60, 80, 100, 110])
+        for r, y in enumerate(ys):
+            for c, x in enumerate(xs):
+                self.assertAlmostEqual(densities[r, c], edges[y:y + 40, x:x + 40].mean())
+
+    def test_boxes_cover_cracks(self):
+        frame = self.frame()
+        cv2.line(frame, (300, 300), (700, 650), 20, 4)
+        cv2.line(frame, (1500, 1000), (1900, 1100), 20, 4)
+
+        boxes = localize(frame)
+        self.assertEqual(len(boxes), 2)
+        for box, (x, y) in zip(sorted(boxes, key=lambda b: b['x']), [(500, 475), (1700, 1050)]):
+            self.assertLessEqual(box['x'] * 2016, x)
+            self.assertGreaterEqual((box['x'] + box['width']) * 2016, x)
+            self.assertLessEqual(box['y'] * 1512, y)
+            self.assertGreaterEqual((box['y'] + box['height']) * 1512, y)
+
+    def test_uniform_frame_has_no_boxes(self):
+        self.assertEqual(localize(self.frame()), [])
+
+    def test_boxes_stored_and_drawn(self):
+        workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, workdir, ignore_errors=True)
+        frame = self.frame()
+        cv2.line(frame, (300, 300), (700, 650), 20, 4)
+        path = workdir / 'crack.png'
+        cv2.imwrite(str(path), frame)
+
+        with override_settings(MEDIA_ROOT=str(workdir / 'media')):
+            result = RoadDefectDetector().analyze_image(path, use_cache=False)
+            self.assertEqual(len(result['analysis_metadata']['boxes']), 1)
+
+            annotated = cv2.imread(result['annotated_image_path'])
+            box = result['analysis_metadata']['boxes'][0]
+            x0 = int(box['x'] * annotated.shape[1])
+            y0 = int(box['y'] * annotated.shape[0])
+            blue, green, red = (int(v) for v in annotated[y0 + 1, x0 + 1])
+            self.assertGreater(red, 200)
+            self.assertLess(max(blue, green), 50)
+
+        with override_settings(MEDIA_ROOT=str(workdir / 'media'), AI_TILED_LOCALIZATION=False):
+            result = RoadDefectDetector().analyze_image(path, use_cache=False)
+        self.assertNotIn('boxes', result['analysis_metadata'])
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte, value = value & 0x7F, value >> 7
+        out.append(byte | 0x80 if value else byte)
+        if not value:
+            return bytes(out)
+
+
+def _int_field(number, value):
+    return _varint(number << 3) + _varint(value)
+
+
+def _bytes_field(number, value):
+    if isinstance(value, str):
+        value = value.encode()
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+# ONNX TensorProto data types
+ONNX_DATA_TYPES = {np.dtype(np.float32): 1, np.dtype(np.int8): 3, np.dtype(np.float16): 10}
+
+
+def _tensor(name, array):
+    array = np.asarray(array)
+    dims = b''.join(_int_field(1, dim) for dim in array.shape)
+    data_type = _int_field(2, ONNX_DATA_TYPES[array.dtype])
+    return dims + data_type + _bytes_field(8, name) + _bytes_field(9, array.tobytes())
+
+
+def _value_info(name, dims):
+    shape = b''.join(
+        _bytes_field(1, _bytes_field(2, dim) if isinstance(dim, str) else _int_field(1, dim))
+        for dim in dims
+    )
+    tensor_type = _int_field(1, 1) + _bytes_field(2, shape)
+    return _bytes_field(1, name) + _bytes_field(2, _bytes_field(1, tensor_type))
+
+
+def _node(op_type, inputs, outputs, **int_attributes):
+    node = b''.join(_bytes_field(1, name) for name in inputs)
+    node += b''.join(_bytes_field(2, name) for name in outputs)
+    node += _bytes_field(4, op_type)
+    for name, value in int_attributes.items():
+        node += _bytes_field(5, _bytes_field(1, name) + _int_field(20, 2) + _int_field(3, value))
+    return node
+
+
+# Mean colour -> linear layer -> softmax: bright frames are 'no_defect', dark ones 'crack'
+TINY_MODEL_LABELS = ('no_defect', 'crack', 'pothole')
+TINY_MODEL_WEIGHTS = np.array([[6, -3, -3], [6, -3, -3], [6, -3, -3]], dtype=np.float32)
+TINY_MODEL_BIAS = np.array([-4, 2, 0], dtype=np.float32)
+
+
+def write_tiny_onnx_model(path, precision='fp32'):
+    """
+    Write a tiny ONNX classifier (opset 13) for offline backend tests.
+
+    The protobuf is encoded by hand so the tests need no onnx package:
+    image (N, 3, 32, 32) -> GlobalAveragePool -> Flatten -> Gemm -> Softmax
+    -> probabilities (N, 3), with model_name, model_version and labels in
+    the model metadata. The 'fp16' variant stores the weights as float16
+    and casts them up; the 'int8' variant stores them quantized and
+    dequantizes them in the graph.
+    """
+    weights = TINY_MODEL_WEIGHTS.astype(np.float32)
+    bias = TINY_MODEL_BIAS.astype(np.float32)
+    if precision == 'fp32':
+        initializers = [_tensor('weights', weights), _tensor('bias', bias)]
+        weight_nodes = []
+    elif precision == 'fp16':
+        initializers = [_tensor('weights_fp16', weights.astype(np.float16)), _tensor('bias', bias)]
+        weight_nodes = [_node('Cast', ['weights_fp16'], ['weights'], to=1)]
+    else:
+        scale = np.abs(weights).max() / 127
+        initializers = [
+            _tensor('weights_int8', np.round(weights / scale).astype(np.int8)),
+            _tensor('weights_scale', np.float32(scale)),
+            _tensor('weights_zero_point', np.int8(0)),
+            _tensor('bias', bias),
+        ]
+        weight_nodes = [
+            _node('DequantizeLinear', ['weights_int8', 'weights_scale', 'weights_zero_point'], ['weights'])
+        ]
+
+    nodes = weight_nodes + [
+        _node('GlobalAveragePool', ['image'], ['pooled']),
+        _node('Flatten', ['pooled'], ['features'], axis=1),
+        _node('Gemm', ['features', 'weights', 'bias'], ['logits']),
+        _node('Softmax', ['logits'], ['probabilities'], axis=1),
+    ]
+    graph = b''.join([
+        *(_bytes_field(1, node) for node in nodes),
+        _bytes_field(2, 'tiny_road_classifier'),
+        *(_bytes_field(5, initializer) for initializer in initializers),
+        _bytes_field(11, _value_info('image', ['batch', 3, 32, 32])),
+        _bytes_field(12, _value_info('probabilities', ['batch', len(TINY_MODEL_LABELS)])),
+    ])
+    metadata = {
+        'model_name': 'TinyRoadClassifier',
+        'model_version': '0.1',
+        'labels': ','.join(TINY_MODEL_LABELS),
+    }
+    model = b''.join([
+        _int_field(1, 7),  # IR version
+        _bytes_field(8, _bytes_field(1, '') + _int_field(2, 13)),  # opset 13
+        _bytes_field(2, 'roadhealth-tests'),
+        _int_field(5, 3),
+        _bytes_field(7, graph),
+        *(_bytes_field(14, _bytes_field(1, key) + _bytes_field(2, value)) for key, value in metadata.items()),
+    ])
+    Path(path).write_bytes(model)
+    return path
+
+
+def tiny_model_probabilities(batch):
+    """Reference output of the tiny model for an (N, H, W, 3) batch"""
+    logits = batch.mean(axis=(1, 2)) @ TINY_MODEL_WEIGHTS + TINY_MODEL_BIAS
+    return backends.softmax(logits.astype(np.float64))
+
+
+class BackendRegistryTestCase(SimpleTestCase):
+
+    def test_onnxruntime_registered(self):
+        self.assertIs(backends.get_backend('onnxruntime'), backends.OnnxRuntimeBackend)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            backends.get_backend('tensorflow')
+
+    def test_falls_back_to_simple_detector(self):
+        with override_settings(AI_MODEL_BACKEND='onnxruntime', AI_MODEL_PATH='/nonexistent'):
+            detector = RoadDefectDetector()
+            detector.load_model()
+        self.assertIsNone(detector.backend)
+        self.assertEqual(detector.active_model(), ('SimpleDetector', RoadDefectDetector.SIMPLE_MODEL_VERSION))
+
+
+@unittest.skipUnless(backends._HAS_ONNXRUNTIME, 'onnxruntime is not installed')
+class OnnxRuntimeBackendTestCase(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.workdir = Path(tempfile.mkdtemp())
+        write_tiny_onnx_model(cls.workdir / 'tiny.onnx')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_reads_model_metadata(self):
+        backend = backends.load_backend('onnxruntime', self.workdir / 'tiny.onnx', intra_op_threads=1)
+        self.assertEqual(backend.model_name, 'TinyRoadClassifier')
+        self.assertEqual(backend.model_version, '0.1')
+        self.assertEqual(backend.labels, TINY_MODEL_LABELS)
+        self.assertEqual(backend.input_size, (32, 32))
+        self.assertTrue(backend.channels_first)
+
+    def test_batched_inference(self):
+        backend = backends.load_backend('onnxruntime', self.workdir / 'tiny.onnx', intra_op_threads=1)
+        batch = np.random.default_rng(0).random((5, 32, 32, 3), dtype=np.float32)
+        batch[0] = 0
+        batch[1] = 1
+
+        detections = backend.predict(batch)
+        expected = tiny_model_probabilities(batch)
+        self.assertEqual(len(detections), 5)
+        self.assertEqual(detections[0]['defect_type'], 'crack')
+        self.assertEqual(detections[1]['defect_type'], 'no_defect')
+        for detection, probabilities in zip(detections, expected):
+            self.assertAlmostEqual(detection['confidence'], probabilities.max(), places=5)
+            self.assertAlmostEqual(detection['severity_score'], (1 - probabilities[0]) * 100, places=3)
+
+    def test_detector_uses_backend(self):
+        path = write_frame(self.workdir / 'dark.jpg', width=320, height=240)
+        with override_settings(
+            AI_MODEL_BACKEND='onnxruntime',
+            AI_MODEL_PATH=str(self.workdir),
+            AI_MODEL_FILE='tiny.onnx',
+            MEDIA_ROOT=str(self.workdir / 'media'),
+        ):
+            detector = RoadDefectDetector()
+            detector.load_model(intra_op_threads=1)
+            self.assertEqual(detector.active_model(), ('TinyRoadClassifier', '0.1'))
+            self.assertEqual(detector.input_representation, 'tensor')
+
+            results = detector.analyze_batch([path, path], use_cache=False)
+            single = detector.analyze_image(path, use_cache=False)
+
+        self.assertEqual(results[0]['model_name'], 'TinyRoadClassifier')
+        self.assertEqual(results[0]['defect_type'], single['defect_type'])
+        self.assertAlmostEqual(results[0]['ai_confidence'], single['ai_confidence'], places=6)
+        self.assertIn('class_scores', single['analysis_metadata'])
+
+
+@unittest.skipUnless(backends._HAS_ONNXRUNTIME, 'onnxruntime is not installed')
+class ModelVariantTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+        for precision in backends.PRECISIONS:
+            write_tiny_onnx_model(self.workdir / f'tiny.{precision}.onnx', precision)
+        (self.workdir / 'manifest.json').write_text(json.dumps({
+            'variants': {
+                'fp32': {'file': 'tiny.fp32.onnx'},
+                'fp16': 'tiny.fp16.onnx',
+                'int8': {'file': 'tiny.int8.onnx'},
+            }
+        }))
+
+    def test_resolve_variants(self):
+        path, precision = backends.resolve_model_file(self.workdir, 'int8', 'unused.onnx')
+        self.assertEqual((path.name, precision), ('tiny.int8.onnx', 'int8'))
+
+        (self.workdir / 'manifest.json').write_text(json.dumps({'variants': {'fp32': 'tiny.fp32.onnx'}}))
+        path, precision = backends.resolve_model_file(self.workdir, 'fp16', 'unused.onnx')
+        self.assertEqual((path.name, precision), ('tiny.fp32.onnx', 'fp32'))
+
+        (self.workdir / 'manifest.json').unlink()
+        path, precision = backends.resolve_model_file(self.workdir, 'fp32', 'tiny.fp32.onnx')
+        self.assertEqual((path.name, precision), ('tiny.fp32.onnx', 'fp32'))
+
+        with self.assertRaises(ValueError):
+            backends.resolve_model_file(self.workdir, 'int4', 'tiny.fp32.onnx')
+
+    def test_reduced_precision_variants_agree(self):
+        batch = np.random.default_rng(3).random((8, 32, 32, 3), dtype=np.float32)
+        expected = tiny_model_probabilities(batch)
+        for precision in ('fp16', 'int8'):
+            backend = backends.load_backend('onnxruntime', self.workdir / f'tiny.{precision}.onnx', intra_op_threads=1)
+            with self.subTest(precision=precision):
+                for detection, probabilities in zip(backend.predict(batch), expected):
+                    self.assertEqual(detection['defect_type'], TINY_MODEL_LABELS[probabilities.argmax()])
+                    self.assertAlmostEqual(detection['confidence'], probabilities.max(), delta=0.02)
+
+    def test_detector_loads_configured_precision(self):
+        with override_settings(AI_MODEL_BACKEND='onnxruntime', AI_MODEL_PATH=str(self.workdir), AI_MODEL_PRECISION='int8'):
+            detector = RoadDefectDetector()
+            detector.load_model(intra_op_threads=1)
+        self.assertEqual(detector.backend.model_path.name, 'tiny.int8.onnx')
+        self.assertEqual(detector.active_model(), ('TinyRoadClassifier', '0.1-int8'))
+
+    def test_benchmark_command(self):
+        samples = self.workdir / 'samples'
+        for label, value in (('crack', 0), ('no_defect', 255)):
+            (samples / label).mkdir(parents=True)
+            for i in range(3):
+                cv2.imwrite(str(samples / label / f'{i}.png'), np.full((40, 40, 3), value, dtype=np.uint8))
+        write_frame(samples / 'unlabeled.jpg', width=64, height=48)
+
+        out = io.StringIO()
+        call_command(
+            'benchmark_model_variants', images=str(samples), model_dir=str(self.workdir),
+            batch_size=4, repeat=1, threads=1, stdout=out
+        )
+        rows = {line.split()[0]: line.split() for line in out.getvalue().splitlines()[2:]}
+        self.assertEqual(set(rows), {'fp32', 'fp16', 'int8'})
+        for row in rows.values():
+            self.assertEqual(row[4], '100.0%')
+            self.assertEqual(row[6], '100.0%')
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_model_variants', images=str(samples), model_dir=str(samples), stdout=out)
+
+
+class GeminiStubHandler(BaseHTTPRequestHandler):
+    """Answers generateContent requests the way the Gemini REST API does"""
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.requests.append((self.path, dict(self.headers), json.loads(self.rfile.read(
+                int(self.headers['Content-Length'])
+            ))))
+            failing = server.failures > 0
+            server.failures -= failing
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+
+        if failing:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        body = json.dumps({
+            'candidates': [{'content': {'parts': [{'text': server.reply}], 'role': 'model'}}],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RemoteVisionTestCase(SimpleTestCase):
+
+    REPLY = {
+        'defect_type': 'pothole',
+        'severity_score': 72,
+        'condition_label': 'poor',
+        'ai_confidence': 0.8,
+        'maintenance_suggestion': 'Patch the pothole.',
+    }
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.workdir, ignore_errors=True)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), GeminiStubHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.in_flight = self.server.max_in_flight = 0
+        self.server.failures = 0
+        self.server.delay = 0
+        self.server.reply = '```json\n' + json.dumps(self.REPLY) + '\n```'
+        # Clients that gave up on a slow reply are expected
+        self.server.handle_error = lambda request, client_address: None
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}/v1beta'
+        self.addCleanup(circuit_breaker._breakers.pop, 'gemini', None)
+
+    def vision_client(self, **options):
+        options = {'requests_per_minute': 6000, 'backoff': 0.01, 'image_max_size': 256, **options}
+        client = RemoteVisionClient('test-key', base_url=self.base_url, **options)
+        self.addCleanup(client.close)
+        return client
+
+    def test_analyze_downscales_and_parses_reply(self):
+        path = self.workdir / 'road.png'
+        write_frame(path, width=1024, height=512)
+
+        self.assertEqual(self.vision_client().analyze(path, 'Describe the road'), self.REPLY)
+
+        url, headers, payload = self.server.requests[0]
+        self.assertEqual(url, '/v1beta/models/gemini-1.5-flash:generateContent')
+        self.assertEqual(headers['x-goog-api-key'], 'test-key')
+        text, image = payload['contents'][0]['parts']
+        self.assertEqual(text, {'text': 'Describe the road'})
+        self.assertEqual(image['inline_data']['mime_type'], 'image/jpeg')
+        upload = cv2.imdecode(
+            np.frombuffer(base64.b64decode(image['inline_data']['data']), np.uint8), cv2.IMREAD_COLOR
+        )
+        self.assertEqual(upload.shape[:2], (128, 256))
+
+    def test_invalid_reply(self):
+        path = self.workdir / 'road.jpg'
+        write_frame(path)
+        self.server.reply = 'The road looks fine.'
+        self.assertIsNone(self.vision_client().analyze(path, 'Describe the road'))
+
+    def test_retries_unavailable(self):
+        path = self.workdir / 'road.jpg'
+        write_frame(path)
+        self.server.failures = 2
+        self.assertEqual(self.vision_client().analyze(path, 'Describe the road'), self.REPLY)
+        self.assertEqual(len(self.server.requests), 3)
+
+        self.server.failures = 5
+        with self.assertRaises(RemoteVisionError):
+            self.vision_client(max_retries=1).analyze(path, 'Describe the road')
+
+    def test_concurrency_is_bounded(self):
+        paths = []
+        for i in range(8):
+            paths.append(self.workdir / f'road{i}.jpg')
+            write_frame(paths[-1], seed=i)
+        self.server.delay = 0.1
+
+        replies = self.vision_client(max_concurrency=3).analyze_many(paths, 'Describe the road')
+        self.assertEqual(replies, [self.REPLY] * 8)
+        self.assertGreater(self.server.max_in_flight, 1)
+        self.assertLessEqual(self.server.max_in_flight, 3)
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=50, capacity=2)
+        start = time.monotonic()
+        for _ in range(7):
+            bucket.acquire()
+        # Two tokens are available at once, the other five take 1/50 s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_detector_uses_gemini(self):
+        paths = [self.workdir / 'road0.jpg', self.workdir / 'road1.jpg']
+        for i, path in enumerate(paths):
+            write_frame(path, seed=i)
+
+        with override_settings(
+            GEMINI_API_KEY='test-key', GEMINI_API_BASE_URL=self.base_url, GEMINI_RETRY_BACKOFF=0.01,
+            MEDIA_ROOT=str(self.workdir / 'media')
+        ):
+            detector = RoadDefectDetector()
+            result = detector.analyze_image(paths[0], use_cache=False)
+            self.assertEqual(result['defect_type'], 'pothole')
+            self.assertEqual(result['model_name'], RoadDefectDetector.GEMINI_MODEL_NAME)
+            self.assertEqual(result['maintenance_suggestion'], 'Patch the pothole.')
+            self.assertTrue(Path(result['annotated_image_path']).exists())
+
+            # Images without a usable reply are analyzed by the local model
+            self.server.reply = 'not json'
+            results = detector.analyze_batch(paths, use_cache=False)
+        self.assertEqual([r['model_name'] for r in results], [detector.model_name] * 2)
+
+    def test_gemini_path_decodes_once(self):
+        path = write_frame(self.workdir / 'road.jpg', width=1024, height=512)
+
+        with override_settings(
+            GEMINI_API_KEY='test-key', GEMINI_API_BASE_URL=self.base_url, GEMINI_IMAGE_MAX_SIZE=256,
+            MEDIA_ROOT=str(self.workdir / 'media')
+        ), mock.patch('cv2.imread', wraps=cv2.imread) as imread, \
+                mock.patch('PIL.Image._getdecoder', wraps=Image._getdecoder) as pil_decoder:
+            result = RoadDefectDetector().analyze_image(path, use_cache=False)
+
+        self.assertEqual(result['model_name'], RoadDefectDetector.GEMINI_MODEL_NAME)
+        # The frame decoded for annotation is also the one uploaded
+        self.assertEqual(imread.call_count, 1)
+        self.assertEqual(pil_decoder.call_count, 0)
+        image = self.server.requests[0][2]['contents'][0]['parts'][1]
+        upload = cv2.imdecode(
+            np.frombuffer(base64.b64decode(image['inline_data']['data']), np.uint8), cv2.IMREAD_COLOR
+        )
+        self.assertEqual(upload.shape[:2], (128, 256))
+
+
+    def test_unavailable_endpoint_falls_back_and_trips(self):
+        paths = []
+        for i in range(4):
+            paths.append(self.workdir / f'road{i}.jpg')
+            write_frame(paths[-1], seed=i)
+        self.server.failures = 100
+
+        with override_settings(
+            GEMINI_API_KEY='test-key', GEMINI_API_BASE_URL=self.base_url, GEMINI_MAX_RETRIES=0,
+            GEMINI_CIRCUIT_BREAKER={'MIN_CALLS': 2, 'WINDOW': 2, 'RESET_TIMEOUT': 60},
+            MEDIA_ROOT=str(self.workdir / 'media')
+        ):
+            detector = RoadDefectDetector()
+            results = [detector.analyze_image(path, use_cache=False) for path in paths[:2]]
+            self.assertEqual(len(self.server.requests), 2)
+
+            # Open: no more requests reach the endpoint
+            results += detector.analyze_batch(paths[2:], use_cache=False)
+            self.assertEqual(len(self.server.requests), 2)
+            stats = [b for b in circuit_breaker.circuit_breaker_stats() if b['name'] == 'gemini']
+
+        self.assertEqual([r['model_name'] for r in results], [detector.model_name] * 4)
+        self.assertEqual(
+            [(b['name'], b['state'], b['trips'], b['rejected']) for b in stats], [('gemini', 'open', 1, 2)]
+        )
+
+    def test_unreadable_image_is_not_a_gemini_failure(self):
+        path = self.workdir / 'corrupt.jpg'
+        path.write_bytes(b'not an image')
+        good = write_frame(self.workdir / 'road.jpg')
+        breaker = CircuitBreaker('gemini-test', min_calls=1, window=1, reset_timeout=0.05)
+        client = self.vision_client(max_retries=0, breaker=breaker)
+
+        for _ in range(3):
+            with self.assertRaises(OSError):
+                client.analyze(path, 'Describe the road')
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+        self.assertEqual(breaker.stats()['failures'], 0)
+        self.assertEqual(self.server.requests, [])
+
+        # A bad upload during the half-open probe neither re-opens nor uses up the probe
+        self.server.failures = 1
+        with self.assertRaises(RemoteVisionError):
+            client.analyze(good, 'Describe the road')
+        time.sleep(0.06)
+        with self.assertRaises(OSError):
+            client.analyze(path, 'Describe the road')
+        self.assertEqual(client.analyze(good, 'Describe the road'), self.REPLY)
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+
+    def test_latency_budget(self):
+        path = self.workdir / 'road.jpg'
+        write_frame(path)
+        self.server.delay = 0.5
+        start = time.monotonic()
+        with self.assertRaises(RemoteVisionError):
+            self.vision_client(latency_budget=0.1).analyze(path, 'Describe the road')
+        self.assertLess(time.monotonic() - start, 0.4)
+
+    def test_cascade_escalates_only_uncertain_frames(self):
+        # Local severity scores: 0 (no_defect), about 10 (edge_crack), about 95 (crack)
+        paths = []
+        for seed, strokes, texture in ((0, 0, 0), (2, 8, 0), (3, 0, 40)):
+            paths.append(self.workdir / f'road{seed}.png')
+            cv2.imwrite(str(paths[-1]), golden_frame(seed, strokes, texture))
+
+        with override_settings(
+            GEMINI_API_KEY='test-key', GEMINI_API_BASE_URL=self.base_url, AI_CASCADE_ENABLED=True,
+            AI_CASCADE_BAND_LOW=3, AI_CASCADE_BAND_HIGH=75, MEDIA_ROOT=str(self.workdir / 'media')
+        ):
+            detector = RoadDefectDetector()
+            results = detector.analyze_batch(paths, use_cache=False)
+            self.assertEqual(len(self.server.requests), 1)
+            single = detector.analyze_image(paths[1], use_cache=False)
+
+            self.server.failures = 100
+            fallback = detector.analyze_image(paths[1], use_cache=False)
+
+        self.assertEqual([r['defect_type'] for r in results], ['no_defect', 'pothole', 'crack'])
+        cascade = [r['analysis_metadata']['cascade'] for r in results]
+        self.assertEqual([c['stage'] for c in cascade], ['screen', 'remote', 'screen'])
+        self.assertEqual([c['escalated'] for c in cascade], [False, True, False])
+        self.assertEqual(cascade[1]['screen_defect_type'], 'edge_crack')
+        self.assertIn('remote_ms', cascade[1])
+        self.assertEqual(single['analysis_metadata']['cascade']['stage'], 'remote')
+
+        self.assertEqual(fallback['defect_type'], 'edge_crack')
+        self.assertEqual(fallback['analysis_metadata']['cascade']['stage'], 'screen')
+        self.assertTrue(fallback['analysis_metadata']['cascade']['fallback'])
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+
+    def unavailable(self):
+        raise RemoteVisionError('unavailable')
+
+    def test_opens_at_error_rate(self):
+        breaker = CircuitBreaker('test', error_rate=0.5, min_calls=4, window=4, reset_timeout=60)
+        breaker.call(lambda: 'ok')
+        with self.assertRaises(RemoteVisionError):
+            breaker.call(self.unavailable)
+        breaker.call(lambda: 'ok')
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+
+        with self.assertRaises(RemoteVisionError):
+            breaker.call(self.unavailable)
+        self.assertEqual(breaker.state, circuit_breaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: 'ok')
+
+        stats = breaker.stats()
+        self.assertEqual((stats['trips'], stats['failures'], stats['rejected']), (1, 2, 1))
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = CircuitBreaker('test', latency_budget=0.01, min_calls=2, window=2)
+        for _ in range(2):
+            self.assertEqual(breaker.call(lambda: time.sleep(0.02) or 'ok'), 'ok')
+        self.assertEqual(breaker.state, circuit_breaker.OPEN)
+        self.assertEqual(breaker.stats()['slow_calls'], 2)
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker('test', min_calls=1, window=1, reset_timeout=0.05)
+        with self.assertRaises(RemoteVisionError):
+            breaker.call(self.unavailable)
+        time.sleep(0.06)
+
+        # One probe goes through; a failed probe opens the breaker again
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual((breaker.state, breaker.trips), (circuit_breaker.OPEN, 2))
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+
+
+    def test_only_failure_types_count(self):
+        breaker = CircuitBreaker(
+            'test', min_calls=1, window=1, reset_timeout=0.05, failure_types=(RemoteVisionError,)
+        )
+        with self.assertRaises(KeyError):
+            breaker.call(lambda: {}['missing'])
+        self.assertEqual((breaker.state, breaker.stats()['failures']), (circuit_breaker.CLOSED, 0))
+
+        with self.assertRaises(RemoteVisionError):
+            breaker.call(self.unavailable)
+        time.sleep(0.06)
+
+        # An uncounted error gives the half-open probe back
+        with self.assertRaises(KeyError):
+            breaker.call(lambda: {}['missing'])
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(breaker.state, circuit_breaker.CLOSED)
+
+    def test_check_fails_fast_without_claiming_a_probe(self):
+        breaker = CircuitBreaker('test', min_calls=1, window=1, reset_timeout=0.05)
+        breaker.check()
+        with self.assertRaises(RemoteVisionError):
+            breaker.call(self.unavailable)
+
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        time.sleep(0.06)
+        breaker.check()
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(breaker.stats()['rejected'], 1)
+
+
+class CircuitBreakerEndpointTestCase(TestCase):
+
+    url = '/api/analysis/results/circuit_breakers/'
+
+    def test_admin_only(self):
+        breaker = circuit_breaker.get_circuit_breaker('endpoint-test', min_calls=1, window=1)
+        self.addCleanup(circuit_breaker._breakers.pop, 'endpoint-test', None)
+        breaker.record_failure()
+
+        engineer = User.objects.create_user(
+            username='engineer', email='engineer@example.com', password='pass', role='engineer'
+        )
+        self.client.force_login(engineer)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass', role='admin')
+        self.client.force_login(admin)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        stats = {b['name']: b for b in response.json()}
+        self.assertEqual((stats['endpoint-test']['state'], stats['endpoint-test']['trips']), ('open', 1))
+
+
+class CascadeReportTestCase(ImageFixturesTestCase):
+    """The fixtures' results have no cascade metadata and are left out of the report"""
+
+    def create_result(self, **cascade):
+        result = self.create_analyzed(self.user, 'no_defect', 'good', 0)
+        result.analysis_metadata = {'cascade': {'screen_ms': 5.0, **cascade}}
+        result.save()
+
+    def test_report(self):
+        for _ in range(6):
+            self.create_result(stage='screen', escalated=False, fallback=False)
+        self.create_result(stage='remote', escalated=True, fallback=False, remote_ms=800.0)
+        self.create_result(stage='remote', escalated=True, fallback=False, remote_ms=1200.0)
+        self.create_result(stage='screen', escalated=True, fallback=True, remote_ms=0.0)
+
+        out = io.StringIO()
+        call_command('cascade_report', cost_per_request=0.01, stdout=out)
+        rows = {}
+        for line in out.getvalue().splitlines():
+            label, *values = re.split(r'\s{2,}', line.strip())
+            rows[label] = ' '.join(values)
+
+        self.assertEqual(rows['decided by the local screen'], '6 66.7%')
+        self.assertEqual(rows['escalated to Gemini'], '3 33.3%')
+        self.assertEqual(rows['fell back to local'], '1')
+        # 5 ms screen + (800 + 1200 + 0) / 9 ms escalations vs 1000 ms for Gemini only
+        self.assertEqual(rows['cascade (screen + escalated)'], '227.2')
+        self.assertEqual(rows['saved'], '772.8 77.3%')
+        self.assertEqual(rows['cost saved'], '0.0600')
+
+
+class TaskQueueTestCase(ImageFixturesTestCase):
+    """Inline, queued and broker-down execution of analysis tasks"""
+
+    CRITICAL = {
+        'defect_type': 'pothole',
+        'severity_score': 90,
+        'condition_label': 'critical',
+        'ai_confidence': 0.9,
+        'model_name': 'SimpleDetector',
+        'model_version': '1.2',
+    }
+
+    def test_sync_mode_runs_inline(self):
+        image = self.create_image(self.user)
+
+        enqueue_analysis(image.id)
+
+        image.refresh_from_db()
+        self.assertEqual(image.status, 'analyzed')
+
+    def test_async_mode_leaves_task_to_worker(self):
+        image = self.create_image(self.user)
+
+        with mock.patch.object(analyze_image_task, 'delay') as delay:
+            enqueue_analysis(image.id)
+
+        delay.assert_called_once_with(image.id, True)
+        image.refresh_from_db()
+        self.assertEqual(image.status, 'pending')
+
+    def test_broker_down_runs_inline(self):
+        image = self.create_image(self.user)
+
+        with mock.patch.object(analyze_image_task, 'delay', side_effect=OperationalError('broker down')):
+            result = enqueue_task(analyze_image_task, image.id)
+
+        self.assertEqual(result.get()['status'], 'success')
+        image.refresh_from_db()
+        self.assertEqual(image.status, 'analyzed')
+
+    @override_settings(EMAIL_HOST_USER='alerts@example.com')
+    def test_critical_alert_survives_broker_outage(self):
+        image = self.create_image(self.user)
+
+        with mock.patch.object(send_critical_alert, 'delay', side_effect=OperationalError('broker down')):
+            save_analysis_results(image, self.CRITICAL)
+
+        image.refresh_from_db()
+        self.assertEqual(image.status, 'analyzed')
+        self.assertEqual(image.analysis.condition_label, 'critical')
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class ThroughputMonitorTestCase(SimpleTestCase):
+    """Per-worker task, image and busy-time accounting"""
+
+    def setUp(self):
+        self.clock = mock.patch('analysis.workers.time.monotonic', return_value=100.0)
+        self.monotonic = self.clock.start()
+        self.addCleanup(self.clock.stop)
+        self.monitor = ThroughputMonitor(interval=60)
+
+    def run_task(self, task_id, name, args, start, end):
+        self.monotonic.return_value = start
+        self.monitor.task_started_at(task_id)
+        self.monotonic.return_value = end
+        self.monitor.task_finished(task_id, name, args)
+
+    def test_rates_and_utilization(self):
+        self.run_task('a', 'analysis.tasks.analyze_image_task', (1,), 100.0, 102.0)
+        self.run_task('b', 'analysis.tasks.analyze_image_batch_task', ([1, 2, 3],), 104.0, 108.0)
+
+        stats = self.monitor.summary(now=110.0)
+
+        self.assertEqual((stats['tasks'], stats['images']), (2, 4))
+        self.assertAlmostEqual(stats['images_per_second'], 0.4)
+        self.assertAlmostEqual(stats['recent_images_per_second'], 0.4)
+        self.assertAlmostEqual(stats['utilization'], 0.6)
+        self.assertEqual(stats['in_flight'], 0)
+
+    def test_started_tasks_are_in_flight_until_finished(self):
+        self.monitor.task_started_at('a')
+        self.monitor.task_started_at('b')
+        self.assertEqual(self.monitor.summary()['in_flight'], 2)
+
+        self.monotonic.return_value = 101.0
+        self.monitor.task_finished('a', 'analysis.tasks.analyze_image_task', (1,))
+
+        self.assertEqual(self.monitor.summary()['in_flight'], 1)
+
+    def test_other_tasks_count_no_images(self):
+        self.run_task('a', 'reports.tasks.generate_report_bundle_task', (1,), 100.0, 105.0)
+        # A finish without a recorded start adds no busy time
+        self.monitor.task_finished('b', 'analysis.tasks.analyze_batch_task', ())
+
+        stats = self.monitor.summary(now=110.0)
+        self.assertEqual((stats['tasks'], stats['images']), (2, 0))
+        self.assertAlmostEqual(stats['utilization'], 0.5)
+
+    def test_window_is_logged_and_reset_after_interval(self):
+        self.run_task('a', 'analysis.tasks.analyze_image_batch_task', ([1, 2],), 110.0, 130.0)
+
+        with self.assertLogs('analysis.workers', 'INFO') as logs:
+            self.run_task('b', 'analysis.tasks.analyze_image_batch_task', ([1, 2, 3, 4],), 150.0, 160.0)
+
+        self.assertIn('2 tasks, 6 images, 0.10 images/s recent', logs.output[0])
+        self.assertIn('50% busy, 0 in flight', logs.output[0])
+        stats = self.monitor.summary(now=170.0)
+        self.assertEqual(stats['images'], 6)
+        self.assertAlmostEqual(stats['recent_images_per_second'], 0.0)
+        self.assertAlmostEqual(stats['images_per_second'], 6 / 70)
+
+    def test_reset_clears_counters(self):
+        self.run_task('a', 'analysis.tasks.analyze_image_task', (1,), 100.0, 101.0)
+        self.monitor.task_started_at('b')
+
+        self.monotonic.return_value = 200.0
+        self.monitor.reset()
+
+        stats = self.monitor.summary(now=210.0)
+        self.assertEqual((stats['tasks'], stats['images'], stats['in_flight']), (0, 0, 0))
+        self.assertEqual(stats['utilization'], 0.0)
+
+
+@override_settings(TASK_EXECUTION_MODE='async')
+class RunAnalysisWorkersCommandTestCase(SimpleTestCase):
+    """Argument validation and the Celery worker invocation of run_analysis_workers"""
+
+    def call(self, *args):
+        return call_command('run_analysis_workers', *args, stdout=io.StringIO())
+
+    @override_settings(TASK_EXECUTION_MODE='sync')
+    def test_requires_async_mode(self):
+        with self.assertRaisesMessage(CommandError, 'TASK_EXECUTION_MODE'):
+            self.call()
+
+    def test_rejects_non_positive_values(self):
+        for args, message in (
+            (('--concurrency', '0'), '--concurrency must be at least 1'),
+            (('--threads', '-1'), '--threads must be at least 1'),
+            (('--stats-interval', '0'), '--stats-interval must be at least 1'),
+            (('--max-tasks-per-child', '-5'), '--max-tasks-per-child must not be negative'),
+        ):
+            with self.subTest(args=args), self.assertRaisesMessage(CommandError, message):
+                self.call(*args)
+
+    @mock.patch('roadhealth.celery.app.worker_main')
+    @mock.patch('analysis.management.commands.run_analysis_workers.install_worker_hooks')
+    @mock.patch('analysis.management.commands.run_analysis_workers.preload_detector')
+    @mock.patch('analysis.management.commands.run_analysis_workers.limit_threads')
+    def test_starts_prefork_workers(self, limit_threads, preload_detector, install_worker_hooks, worker_main):
+        preload_detector.return_value.active_model.return_value = ('ResNet', '2.0')
+
+        with mock.patch('analysis.management.commands.run_analysis_workers.os.cpu_count', return_value=8):
+            self.call('--threads', '2', '--queues', 'analysis', '--max-tasks-per-child', '100', '--stats-interval', '30')
+
+        limit_threads.assert_called_once_with(2)
+        install_worker_hooks.assert_called_once_with(2, 30)
+        argv = worker_main.call_args[0][0]
+        self.assertIn('--concurrency=4', argv)
+        self.assertIn('--pool=prefork', argv)
+        self.assertEqual(argv[argv.index('--queues') + 1], 'analysis')
+        self.assertIn('--max-tasks-per-child=100', argv)
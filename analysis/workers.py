@@ -0,0 +1,163 @@
+"""
+Dedicated analysis worker processes.
+
+Used by the run_analysis_workers management command. The parent process
+loads the detector once and Celery's prefork pool forks the workers from
+it, so every child starts with the model already in (copy-on-write)
+memory; model backends that are not fork safe (ONNX Runtime) are loaded
+again in each child instead. Each child limits OpenCV, BLAS and the
+model runtime to a fixed number of threads so N processes x T threads
+matches the cores available instead of oversubscribing them, and logs its
+own throughput.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import cv2
+from celery import signals
+
+logger = logging.getLogger(__name__)
+
+# Environment variables read by the common BLAS / OpenMP runtimes at load time
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+)
+
+# Images processed per task, by task name
+TASK_IMAGE_COUNTS = {
+    'analysis.tasks.analyze_image_task': lambda args: 1,
+    'analysis.tasks.analyze_image_batch_task': lambda args: len(args[0]) if args else 0,
+}
+
+
+def limit_threads(threads):
+    """
+    Limit OpenCV, OpenMP and BLAS thread pools in this process.
+
+    The environment variables cover libraries loaded after this call (and
+    child processes); OpenCV is configured directly, and already loaded
+    BLAS libraries are limited through threadpoolctl when it is installed.
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    cv2.setNumThreads(threads)
+
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(limits=threads)
+
+
+def preload_detector():
+    """Load the detector and run one warm-up frame so forked workers start ready"""
+    from .ai_model import get_detector
+
+    detector = get_detector()
+    detector.warm_up()
+    return detector
+
+
+class ThroughputMonitor:
+    """Per-process task and image counters, logged every `interval` seconds"""
+
+    def __init__(self, interval=60):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.window_started = self.started
+        self.tasks = 0
+        self.images = 0
+        self.busy = 0.0
+        self.window_images = 0
+        self.task_started = {}
+
+    def task_started_at(self, task_id):
+        with self.lock:
+            self.task_started[task_id] = time.monotonic()
+
+    def task_finished(self, task_id, task_name, args):
+        now = time.monotonic()
+        count = TASK_IMAGE_COUNTS.get(task_name, lambda args: 0)(args)
+        with self.lock:
+            started = self.task_started.pop(task_id, now)
+            self.tasks += 1
+            self.images += count
+            self.window_images += count
+            self.busy += now - started
+
+            if now - self.window_started >= self.interval:
+                self.log(now)
+                self.window_started = now
+                self.window_images = 0
+
+    def summary(self, now=None):
+        """Return this worker's totals, rates and number of started but unfinished tasks"""
+        now = now or time.monotonic()
+        elapsed = max(now - self.started, 1e-9)
+        return {
+            'pid': os.getpid(),
+            'tasks': self.tasks,
+            'images': self.images,
+            'images_per_second': self.images / elapsed,
+            'recent_images_per_second': self.window_images / max(now - self.window_started, 1e-9),
+            'utilization': self.busy / elapsed,
+            'in_flight': len(self.task_started),
+        }
+
+    def log(self, now=None):
+        stats = self.summary(now)
+        logger.info(
+            f"Analysis worker {stats['pid']}: {stats['tasks']} tasks, {stats['images']} images, "
+            f"{stats['recent_images_per_second']:.2f} images/s recent, "
+            f"{stats['images_per_second']:.2f} images/s overall, {stats['utilization']:.0%} busy, "
+            f"{stats['in_flight']} in flight"
+        )
+
+
+def install_worker_hooks(threads, stats_interval):
+    """
+    Connect the Celery signal handlers used by dedicated analysis workers.
+
+    Must be called in the parent before the pool forks; the handlers then
+    run in every child.
+    """
+    monitor = ThroughputMonitor(stats_interval)
+
+    def on_process_init(**kwargs):
+        limit_threads(threads)
+        monitor.reset()
+
+        from .ai_model import get_detector
+
+        detector = get_detector()
+        if detector.backend is not None and not detector.backend.fork_safe:
+            # Runtimes with their own thread pools must be loaded after fork
+            detector.load_model(intra_op_threads=threads)
+            detector.warm_up()
+
+    def on_prerun(task_id=None, **kwargs):
+        monitor.task_started_at(task_id)
+
+    def on_postrun(task_id=None, task=None, args=None, **kwargs):
+        monitor.task_finished(task_id, task.name if task else '', args or ())
+
+    def on_process_shutdown(**kwargs):
+        monitor.log()
+
+    signals.worker_process_init.connect(on_process_init, weak=False)
+    signals.task_prerun.connect(on_prerun, weak=False)
+    signals.task_postrun.connect(on_postrun, weak=False)
+    signals.worker_process_shutdown.connect(on_process_shutdown, weak=False)
+    return monitor
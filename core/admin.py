@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ImageRecord
+from .models import BulkUploadJob, DashboardRollup, ImageRecord
 
 
 @admin.register(ImageRecord)
@@ -7,7 +7,10 @@ class ImageRecordAdmin(admin.ModelAdmin):
     list_display = ('title', 'user', 'status', 'upload_date', 'has_location', 'file_size_display')
     list_filter = ('status', 'upload_date', 'user')
     search_fields = ('title', 'description', 'user__email', 'location_name')
-    readonly_fields = ('upload_date', 'updated_date', 'file_size', 'image_width', 'image_height')
+    readonly_fields = (
+        'upload_date', 'updated_date', 'file_size', 'image_width', 'image_height', 'orientation',
+        'captured_at', 'phash', 'duplicate_of'
+    )
     list_per_page = 20
     
     fieldsets = (
@@ -19,7 +22,10 @@ class ImageRecordAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Metadata', {
-            'fields': ('upload_date', 'updated_date', 'file_size', 'image_width', 'image_height'),
+            'fields': (
+                'upload_date', 'updated_date', 'file_size', 'image_width', 'image_height', 'orientation',
+                'captured_at', 'phash', 'duplicate_of'
+            ),
             'classes': ('collapse',)
         }),
     )
@@ -35,3 +41,31 @@ class ImageRecordAdmin(admin.ModelAdmin):
             return f"{size_mb:.2f} MB"
         return "N/A"
     file_size_display.short_description = 'File Size'
+
+
+@admin.register(BulkUploadJob)
+class BulkUploadJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'accepted_files', 'total_files', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('user__email',)
+    readonly_fields = ('created_at', 'updated_at')
+    list_per_page = 20
+
+
+@admin.register(DashboardRollup)
+class DashboardRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'dimension', 'key', 'count', 'total', 'updated_at')
+    list_filter = ('dimension',)
+    search_fields = ('user__email', 'key')
+    readonly_fields = ('updated_at',)
+    list_per_page = 50
+    
+    # Rows are maintained by signals; rebuild them with `manage.py rebuild_dashboard_rollup`
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -4,7 +4,9 @@ from . import api_views
 
 router = DefaultRouter()
 router.register(r'images', api_views.ImageRecordViewSet, basename='image')
+router.register(r'upload-jobs', api_views.BulkUploadJobViewSet, basename='upload-job')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('map/tiles/<int:z>/<int:x>/<int:y>/', api_views.map_tile, name='map_tile'),
 ]
@@ -1,11 +1,18 @@
+from django.conf import settings
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
-from django.db.models import Count, Avg, Q
-from .models import ImageRecord
-from .serializers import ImageRecordSerializer, ImageUploadSerializer
-from analysis.models import AnalysisResult
+from .models import BulkUploadJob, ImageRecord
+from .serializers import (
+    BulkUploadJobSerializer,
+    BulkUploadSerializer,
+    ImageRecordSerializer,
+    ImageUploadSerializer,
+)
+from .rollup import get_rollup_statistics
 
 
 class ImageRecordViewSet(viewsets.ModelViewSet):
@@ -16,46 +23,59 @@ class ImageRecordViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_admin:
-            return ImageRecord.objects.all().select_related('user').prefetch_related('analysis')
-        return ImageRecord.objects.filter(user=user).prefetch_related('analysis')
+            queryset = ImageRecord.objects.all().select_related('user').prefetch_related('analysis')
+        else:
+            queryset = ImageRecord.objects.filter(user=user).prefetch_related('analysis')
+        
+        if self.action == 'list':
+            queryset = self.filter_location(queryset)
+        return queryset
+    
+    def filter_location(self, queryset):
+        """
+        Apply optional spatial filters from the query string:
+        ?bbox=min_lng,min_lat,max_lng,max_lat or ?near=lat,lng&radius_km=5
+        """
+        params = self.request.query_params
+        try:
+            if params.get('bbox'):
+                min_lng, min_lat, max_lng, max_lat = [float(v) for v in params['bbox'].split(',')]
+                queryset = queryset.within_bbox(min_lat, min_lng, max_lat, max_lng)
+            if params.get('near'):
+                lat, lng = [float(v) for v in params['near'].split(',')]
+                radius_km = float(params.get('radius_km', 1))
+                queryset = queryset.within_radius(lat, lng, radius_km).order_by('distance_km')
+        except ValueError:
+            raise ValidationError({'detail': 'Use bbox=min_lng,min_lat,max_lng,max_lat or near=lat,lng&radius_km=N'})
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'create':
             return ImageUploadSerializer
+        if self.action == 'bulk_upload':
+            return BulkUploadSerializer
         return ImageRecordSerializer
     
+    def perform_create(self, serializer):
+        image = serializer.save()
+        
+        # Queue AI analysis (runs inline when TASK_EXECUTION_MODE is 'sync')
+        from analysis.tasks import enqueue_analysis
+        enqueue_analysis(image.id)
+    
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get dashboard statistics"""
         user = request.user
-        queryset = self.get_queryset()
-        
-        total_images = queryset.count()
-        analyzed_images = queryset.filter(status='analyzed').count()
-        pending_images = queryset.filter(status='pending').count()
-        
-        # Defect statistics
-        defect_stats = AnalysisResult.objects.filter(
-            image_record__in=queryset
-        ).values('defect_type').annotate(count=Count('id'))
-        
-        # Severity distribution
-        severity_stats = AnalysisResult.objects.filter(
-            image_record__in=queryset
-        ).values('condition_label').annotate(count=Count('id'))
-        
-        # Average severity
-        avg_severity = AnalysisResult.objects.filter(
-            image_record__in=queryset
-        ).aggregate(avg=Avg('severity_score'))['avg'] or 0
+        stats = get_rollup_statistics(None if user.is_admin else user)
         
         return Response({
-            'total_images': total_images,
-            'analyzed_images': analyzed_images,
-            'pending_images': pending_images,
-            'defect_stats': list(defect_stats),
-            'severity_stats': list(severity_stats),
-            'avg_severity': round(avg_severity, 2),
+            'total_images': stats['total_images'],
+            'analyzed_images': stats['analyzed_images'],
+            'pending_images': stats['pending_images'],
+            'defect_stats': stats['defect_stats'],
+            'severity_stats': stats['severity_stats'],
+            'avg_severity': stats['avg_severity'],
         })
     
     @action(detail=True, methods=['post'])
@@ -63,11 +83,69 @@ class ImageRecordViewSet(viewsets.ModelViewSet):
         """Trigger re-analysis of an image"""
         image = self.get_object()
         
-        # Trigger analysis task
-        from analysis.tasks import analyze_image_task
-        analyze_image_task.delay(image.id)
+        # Trigger analysis task; an explicit re-analysis always runs the detector
+        from analysis.tasks import enqueue_analysis
+        enqueue_analysis(image.id, link_duplicates=False)
         
         return Response({
             'message': 'Image queued for re-analysis',
             'status': 'processing'
         })
+    
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def bulk_upload(self, request):
+        """Upload a ZIP archive and/or many image files in one request"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        from .bulk_upload import ingest_bulk_upload
+        defaults = {
+            field: data[field]
+            for field in ('description', 'latitude', 'longitude', 'location_name')
+            if data.get(field) not in (None, '')
+        }
+        job = ingest_bulk_upload(
+            request.user,
+            files=data.get('images', []),
+            archive=data.get('archive'),
+            defaults=defaults,
+        )
+        
+        return Response(BulkUploadJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class BulkUploadJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """API ViewSet for polling bulk upload jobs"""
+    serializer_class = BulkUploadJobSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_admin:
+            return BulkUploadJob.objects.all()
+        return BulkUploadJob.objects.filter(user=user)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def map_tile(request, z, x, y):
+    """GeoJSON map data for one z/x/y tile: grid clusters at low zoom, points at high zoom"""
+    from .map_tiles import get_tile
+    
+    user = request.user
+    images = ImageRecord.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    if user.is_admin:
+        scope = 'all'
+    else:
+        images = images.filter(user=user)
+        scope = f'user{user.id}'
+    
+    try:
+        tile = get_tile(images, scope, z, x, y)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    response = Response(tile)
+    response['Cache-Control'] = f"private, max-age={getattr(settings, 'MAP_TILE_CACHE_TIMEOUT', 300)}"
+    return response
@@ -0,0 +1,202 @@
+"""
+Bulk image ingestion for ZIP archives and multi-file uploads.
+
+Files are streamed one at a time from the upload (or archive member) into
+storage, ImageRecord rows are created with bulk_create in chunks, and each
+chunk is queued for analysis as soon as it is written.
+"""
+
+import logging
+import shutil
+import tempfile
+import zipfile
+import zlib
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files import File
+
+from . import image_metadata
+from .map_tiles import bump_map_version
+from .models import BulkUploadJob, ImageRecord
+from .rollup import record_created_images
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def _check_member_name(name):
+    """Return an error message if a file name is not an acceptable image, else None"""
+    if PurePosixPath(name).suffix.lower() not in ALLOWED_EXTENSIONS:
+        return 'Only JPEG and PNG images are allowed.'
+    return None
+
+
+def _extract_member(zf, info):
+    """
+    Decompress one archive member into a spooled temporary file.
+
+    The whole member is read (and its CRC checked) before anything reaches
+    storage, so a member that is corrupt halfway through leaves no partial
+    file behind. Members above BULK_UPLOAD_SPOOL_SIZE bytes spill to disk.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=getattr(settings, 'BULK_UPLOAD_SPOOL_SIZE', 1024 * 1024))
+    try:
+        with zf.open(info) as member:
+            shutil.copyfileobj(member, spooled)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
+
+
+def iter_archive_members(archive):
+    """
+    Yield (name, size, file object or error) for each file in a ZIP archive.
+
+    Members are decompressed one at a time (see _extract_member), so the
+    archive is never expanded in memory; a corrupt member is reported as
+    that member's error and the rest of the archive is still ingested.
+    """
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+
+            name = PurePosixPath(info.filename).name
+            # Skip macOS resource forks and hidden files
+            if not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                continue
+
+            error = _check_member_name(name)
+            if error is None and info.file_size > settings.MAX_UPLOAD_SIZE:
+                error = 'Image file size should not exceed 10MB.'
+
+            if error:
+                yield name, info.file_size, error
+                continue
+
+            try:
+                member = _extract_member(zf, info)
+            except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                logger.warning(f"Corrupt archive member {info.filename}: {str(e)}")
+                yield name, info.file_size, 'File is corrupt in the archive.'
+                continue
+            with member:
+                yield name, info.file_size, member
+
+
+def iter_uploaded_files(files):
+    """Yield (name, size, file object or error) for each file in a multipart upload"""
+    for uploaded in files:
+        error = _check_member_name(uploaded.name)
+        if error is None and uploaded.content_type not in settings.ALLOWED_IMAGE_TYPES:
+            error = 'Only JPEG and PNG images are allowed.'
+        if error is None and uploaded.size > settings.MAX_UPLOAD_SIZE:
+            error = 'Image file size should not exceed 10MB.'
+
+        yield uploaded.name, uploaded.size, error or uploaded
+
+
+def ingest_bulk_upload(user, files=(), archive=None, defaults=None):
+    """
+    Store uploaded images, create ImageRecords and queue them for analysis.
+
+    Args:
+        user: Owner of the new images
+        files: Iterable of UploadedFile objects
+        archive: Optional UploadedFile containing a ZIP archive
+        defaults: Optional dict of ImageRecord fields applied to every image
+            (description, latitude, longitude, location_name)
+
+    Returns:
+        The BulkUploadJob tracking the ingestion
+    """
+    from analysis.tasks import enqueue_analysis_batch
+
+    defaults = defaults or {}
+    chunk_size = getattr(settings, 'BULK_UPLOAD_CHUNK_SIZE', 32)
+    max_files = getattr(settings, 'BULK_UPLOAD_MAX_FILES', 5000)
+
+    image_field = ImageRecord._meta.get_field('image')
+    job = BulkUploadJob.objects.create(user=user)
+
+    sources = [iter_uploaded_files(files)]
+    if archive is not None:
+        sources.append(iter_archive_members(archive))
+
+    pending = []
+    rejected = []
+    total = 0
+    accepted = 0
+
+    def flush():
+        nonlocal accepted
+        if not pending:
+            return
+        created = ImageRecord.objects.bulk_create(pending)
+        record_created_images(created)
+        # bulk_create sends no post_save, so invalidate cached map tiles here
+        regions = {record.geohash for record in created if record.geohash}
+        if regions:
+            bump_map_version(*regions)
+        accepted += len(created)
+        enqueue_analysis_batch([record.id for record in created])
+        pending.clear()
+
+    try:
+        for source in sources:
+            for name, size, content in source:
+                total += 1
+                if total > max_files:
+                    rejected.append({'name': name, 'error': f'Upload limit of {max_files} files exceeded.'})
+                    continue
+                if isinstance(content, str):
+                    rejected.append({'name': name, 'error': content})
+                    continue
+
+                django_file = File(content, name=name)
+                # Known up front; avoids seeking through compressed archive members
+                django_file.size = size
+                stored_name = image_field.storage.save(
+                    image_field.generate_filename(None, name),
+                    django_file,
+                    max_length=image_field.max_length,
+                )
+
+                record = ImageRecord(
+                    user=user,
+                    image=stored_name,
+                    title=PurePosixPath(name).stem[:200],
+                    status='pending',
+                    file_size=size,
+                    upload_job=job,
+                    **defaults,
+                )
+                # bulk_create skips save(), so read the header metadata and
+                # set the spatial index key here (EXIF GPS may fill the location)
+                with image_field.storage.open(stored_name) as stored:
+                    record.apply_image_metadata(image_metadata.read_image_metadata(stored))
+                record.geohash = record.compute_geohash()
+                pending.append(record)
+                if len(pending) >= chunk_size:
+                    flush()
+
+        flush()
+        job.status = 'received'
+
+    except zipfile.BadZipFile:
+        logger.warning(f"Bulk upload {job.id}: archive is not a valid ZIP file")
+        flush()
+        job.status = 'failed'
+        job.error_message = 'Archive is not a valid ZIP file.'
+
+    job.total_files = total
+    job.accepted_files = accepted
+    job.rejected_files = rejected
+    job.save()
+
+    logger.info(f"Bulk upload {job.id}: {accepted} of {total} files accepted")
+    return job
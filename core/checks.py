@@ -0,0 +1,29 @@
+"""
+System checks for deployment settings the core app relies on.
+"""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Warn when Celery workers run separately but the default cache is per process"""
+    if getattr(settings, 'TASK_EXECUTION_MODE', 'sync') == 'sync':
+        return []
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            'The default cache is local to each process, so map tile invalidations made by '
+            'Celery workers never reach the web processes.',
+            hint='Set REDIS_CACHE_URL so web processes and workers share one cache.',
+            id='core.W001',
+        )
+    ]
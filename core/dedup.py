@@ -0,0 +1,117 @@
+"""
+Near-duplicate frame lookup.
+
+A new frame is a near-duplicate of another frame of the same user when
+their perceptual hashes (core.perceptual_hash) are at most
+DEDUP_MAX_DISTANCE bits apart, they were uploaded within DEDUP_WINDOW
+seconds of each other and, if geotagged, lie within DEDUP_RADIUS_M metres.
+Frames without a location only match frames without one. Analysis reuses
+the result of the frame a near-duplicate links to instead of running the
+detector again (see analysis.tasks).
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+
+from . import geo, perceptual_hash
+from .models import ImageRecord
+
+
+def dedup_enabled():
+    """Return True if analysis should reuse the results of near-duplicate frames"""
+    return getattr(settings, 'DEDUP_ENABLED', True)
+
+
+def _limits():
+    """Return (max Hamming distance, time window, radius in km)"""
+    return (
+        getattr(settings, 'DEDUP_MAX_DISTANCE', 6),
+        timedelta(seconds=getattr(settings, 'DEDUP_WINDOW', 600)),
+        getattr(settings, 'DEDUP_RADIUS_M', 25) / 1000,
+    )
+
+
+def is_near_duplicate(record, other):
+    """
+    Return the Hamming distance between two records' hashes if they are near-duplicates, else None.
+
+    Both records need a perceptual hash and an upload date.
+    """
+    max_distance, window, radius_km = _limits()
+    if not record.phash or not other.phash or record.user_id != other.user_id:
+        return None
+    if abs(record.upload_date - other.upload_date) > window:
+        return None
+    if record.has_location != other.has_location:
+        return None
+    if record.has_location and geo.distance_km(
+        record.latitude, record.longitude, other.latitude, other.longitude
+    ) > radius_km:
+        return None
+
+    distance = perceptual_hash.hamming(int(record.phash, 16), int(other.phash, 16))
+    return distance if distance <= max_distance else None
+
+
+def find_duplicate(record):
+    """
+    Find the analyzed frame a new frame is a near-duplicate of.
+
+    Candidates come from the indexed hash chunk columns, narrowed to the
+    user, the time window and, for geotagged frames, the radius around the
+    frame; the closest hash wins, then the closest upload time.
+
+    Returns:
+        Tuple of (ImageRecord with an analysis, Hamming distance), or None
+    """
+    if not record.phash:
+        return None
+    max_distance, window, radius_km = _limits()
+
+    candidates = ImageRecord.objects.phash_candidates(int(record.phash, 16), max_distance).filter(
+        user_id=record.user_id,
+        status='analyzed',
+        analysis__isnull=False,
+        upload_date__range=(record.upload_date - window, record.upload_date + window),
+    ).exclude(pk=record.pk)
+    if record.has_location:
+        candidates = candidates.within_radius(record.latitude, record.longitude, radius_km)
+    else:
+        candidates = candidates.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+
+    best = None
+    for candidate in candidates:
+        distance = is_near_duplicate(record, candidate)
+        if distance is None:
+            continue
+        rank = (distance, abs(record.upload_date - candidate.upload_date))
+        if best is None or rank < best[0]:
+            best = (rank, candidate, distance)
+    return best[1:] if best else None
+
+
+def group_duplicates(records):
+    """
+    Find near-duplicates among frames that are analyzed together.
+
+    Args:
+        records: ImageRecords in upload order
+
+    Returns:
+        Dictionary mapping the id of each near-duplicate to (the earlier
+        record of `records` it duplicates, Hamming distance); records
+        missing from it need their own analysis
+    """
+    leaders = []
+    duplicates = {}
+    for record in records:
+        for leader in leaders:
+            distance = is_near_duplicate(record, leader)
+            if distance is not None:
+                duplicates[record.id] = (leader, distance)
+                break
+        else:
+            leaders.append(record)
+    return duplicates
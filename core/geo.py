@@ -0,0 +1,123 @@
+"""
+Geohash encoding and bounding-box covers for spatial lookups.
+
+ImageRecord stores the geohash of its coordinates in an indexed column.
+A bounding box is turned into a small set of geohash prefixes covering it;
+filtering on those prefixes lets the database prune with a B-tree index
+(plain PostgreSQL or SQLite, no PostGIS) before the exact coordinate check.
+"""
+
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _bits(precision):
+    """Return the (latitude, longitude) bit counts of a geohash of this length"""
+    total = 5 * precision
+    return total // 2, total - total // 2
+
+
+def _cell_index(value, low, high, bits):
+    index = int((value - low) / (high - low) * (1 << bits))
+    return min(max(index, 0), (1 << bits) - 1)
+
+
+def encode_cell(lat_index, lng_index, precision):
+    """Encode integer cell indices at the given precision as a geohash"""
+    lat_bits, lng_bits = _bits(precision)
+    chars = []
+    value = 0
+    for bit in range(5 * precision):
+        # Bits alternate longitude, latitude, longitude, ... from the most significant
+        if bit % 2 == 0:
+            lng_bits -= 1
+            value = (value << 1) | ((lng_index >> lng_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((lat_index >> lat_bits) & 1)
+        if bit % 5 == 4:
+            chars.append(BASE32[value])
+            value = 0
+    return ''.join(chars)
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    Return the geohash of a coordinate.
+
+    Args:
+        latitude: Latitude in degrees (-90..90)
+        longitude: Longitude in degrees (-180..180)
+        precision: Number of geohash characters
+
+    Returns:
+        Geohash string
+    """
+    lat_bits, lng_bits = _bits(precision)
+    return encode_cell(
+        _cell_index(float(latitude), -90.0, 90.0, lat_bits),
+        _cell_index(float(longitude), -180.0, 180.0, lng_bits),
+        precision,
+    )
+
+
+def cover(min_lat, min_lng, max_lat, max_lng, max_cells=32):
+    """
+    Return geohash prefixes whose cells together cover a bounding box.
+
+    Uses the longest prefix length for which the box spans at most
+    `max_cells` cells, so the cover is as tight as the budget allows.
+    Boxes crossing the antimeridian are not supported (min_lng <= max_lng).
+
+    Returns:
+        Sorted list of geohash prefixes
+    """
+    if min_lat > max_lat or min_lng > max_lng:
+        raise ValueError('Bounding box minimum must not exceed its maximum')
+
+    best = None
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        lat_bits, lng_bits = _bits(precision)
+        lat_range = (_cell_index(min_lat, -90.0, 90.0, lat_bits), _cell_index(max_lat, -90.0, 90.0, lat_bits))
+        lng_range = (_cell_index(min_lng, -180.0, 180.0, lng_bits), _cell_index(max_lng, -180.0, 180.0, lng_bits))
+        cells = (lat_range[1] - lat_range[0] + 1) * (lng_range[1] - lng_range[0] + 1)
+        if cells > max_cells and best is not None:
+            break
+        best = (precision, lat_range, lng_range)
+
+    precision, (lat_lo, lat_hi), (lng_lo, lng_hi) = best
+    return sorted(
+        encode_cell(lat_index, lng_index, precision)
+        for lat_index in range(lat_lo, lat_hi + 1)
+        for lng_index in range(lng_lo, lng_hi + 1)
+    )
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """Return the (min_lat, min_lng, max_lat, max_lng) box enclosing a circle"""
+    latitude = float(latitude)
+    longitude = float(longitude)
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    # Longitude degrees shrink towards the poles; fall back to the full range there
+    cos_lat = math.cos(math.radians(min(abs(latitude) + dlat, 90.0)))
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)) if cos_lat > 1e-9 else 180.0
+    return (
+        max(latitude - dlat, -90.0),
+        max(longitude - dlng, -180.0),
+        min(latitude + dlat, 90.0),
+        min(longitude + dlng, 180.0),
+    )
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle (haversine) distance between two coordinates in kilometres"""
+    lat1, lng1, lat2, lng2 = (math.radians(float(v)) for v in (lat1, lng1, lat2, lng2))
+    half_chord = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(half_chord, 1.0)))
@@ -0,0 +1,140 @@
+"""
+Image metadata read from the file header.
+
+Dimensions come from the image header and orientation, GPS position and
+capture time from the EXIF block, which PIL parses when it opens a file.
+No pixel data is decoded here: analysis hashes a reduced decode for
+duplicate lookup and fully decodes only images it runs the detector on
+(see analysis.tasks).
+"""
+
+import logging
+from datetime import datetime
+from decimal import Decimal
+
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# EXIF tags and IFDs
+ORIENTATION = 0x0112
+DATETIME = 0x0132
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+DATETIME_ORIGINAL = 0x9003
+DATETIME_DIGITIZED = 0x9004
+OFFSET_TIME_ORIGINAL = 0x9011
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+
+EXIF_DATETIME_FORMAT = '%Y:%m:%d %H:%M:%S'
+
+
+def read_image_metadata(source):
+    """
+    Read dimensions, EXIF orientation, GPS position and capture time from an image header.
+
+    Args:
+        source: Path or readable binary file object
+
+    Returns:
+        Dictionary with width, height, orientation, latitude, longitude and
+        captured_at (None where the image does not record them), or None if
+        the file is not a readable image
+    """
+    try:
+        with Image.open(source) as img:
+            width, height = img.size
+            # info['exif'] is filled while parsing the header; img.getexif()
+            # would decode a PNG whose EXIF chunk follows the pixel data
+            raw = img.info.get('exif')
+    except (OSError, UnidentifiedImageError, ValueError) as e:
+        logger.debug(f"Could not read image header: {str(e)}")
+        return None
+
+    metadata = {
+        'width': width,
+        'height': height,
+        'orientation': None,
+        'latitude': None,
+        'longitude': None,
+        'captured_at': None,
+    }
+    if not raw:
+        return metadata
+
+    exif = Image.Exif()
+    try:
+        exif.load(raw)
+    except Exception as e:
+        logger.debug(f"Could not parse EXIF block: {str(e)}")
+        return metadata
+
+    orientation = exif.get(ORIENTATION)
+    if isinstance(orientation, int) and 1 <= orientation <= 8:
+        metadata['orientation'] = orientation
+
+    position = read_gps(exif.get_ifd(GPS_IFD))
+    if position is not None:
+        metadata['latitude'], metadata['longitude'] = position
+
+    metadata['captured_at'] = read_capture_time(exif)
+    return metadata
+
+
+def _degrees(value, ref, negative_ref):
+    degrees, minutes, seconds = (float(part) for part in value)
+    result = degrees + minutes / 60 + seconds / 3600
+    if isinstance(ref, bytes):
+        ref = ref.decode('ascii', 'ignore')
+    return -result if str(ref).strip().upper() == negative_ref else result
+
+
+def read_gps(gps):
+    """
+    Convert an EXIF GPS IFD to a position.
+
+    Returns:
+        Tuple of (latitude, longitude) as Decimals with 6 places, or None
+        if the IFD has no valid position
+    """
+    try:
+        latitude = _degrees(gps[GPS_LATITUDE], gps.get(GPS_LATITUDE_REF, 'N'), 'S')
+        longitude = _degrees(gps[GPS_LONGITUDE], gps.get(GPS_LONGITUDE_REF, 'E'), 'W')
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return None
+    # Rationals with a zero denominator read as NaN, which fails both checks
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return Decimal(f'{latitude:.6f}'), Decimal(f'{longitude:.6f}')
+
+
+def read_capture_time(exif):
+    """
+    Return the time an image was taken from its EXIF block, or None.
+
+    Uses DateTimeOriginal with its UTC offset when recorded; times without
+    an offset are taken to be in the current time zone.
+    """
+    details = exif.get_ifd(EXIF_IFD)
+    for value in (details.get(DATETIME_ORIGINAL), details.get(DATETIME_DIGITIZED), exif.get(DATETIME)):
+        if not isinstance(value, str):
+            continue
+        text = value.strip('\x00 ')
+        try:
+            captured_at = datetime.strptime(text, EXIF_DATETIME_FORMAT)
+        except ValueError:
+            continue
+
+        offset = details.get(OFFSET_TIME_ORIGINAL) if value == details.get(DATETIME_ORIGINAL) else None
+        if isinstance(offset, str):
+            offset = offset.strip('\x00 ')
+            try:
+                return datetime.strptime(f"{text} {offset}", f"{EXIF_DATETIME_FORMAT} %z")
+            except ValueError:
+                pass
+        return timezone.make_aware(captured_at)
+    return None
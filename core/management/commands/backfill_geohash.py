@@ -0,0 +1,70 @@
+"""
+Populate ImageRecord.geohash for rows written without it.
+
+Rows saved through ImageRecord.save() already carry a geohash; this covers
+data loaded with raw SQL, fixtures or queryset.update() on coordinates.
+Map tiles are found through the geohash column, so the cached tiles of
+every region whose rows changed are invalidated as well.
+
+Usage:
+    python manage.py backfill_geohash            # only rows with a missing geohash
+    python manage.py backfill_geohash --all      # recompute every geotagged row
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.map_tiles import bump_map_version
+from core.models import ImageRecord
+
+
+class Command(BaseCommand):
+    help = 'Compute the indexed geohash column of geotagged ImageRecords'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recompute every geotagged row, not just rows with an empty geohash'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Rows read and updated per batch (default: 2000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        records = ImageRecord.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        if not options['all']:
+            records = records.filter(geohash='')
+        # Rows that lost their location keep a stale geohash otherwise
+        unlocated = ImageRecord.objects.filter(
+            Q(latitude__isnull=True) | Q(longitude__isnull=True)
+        ).exclude(geohash='')
+        stale = set(unlocated.values_list('geohash', flat=True))
+        cleared = unlocated.update(geohash='')
+        if stale:
+            bump_map_version(*stale)
+
+        updated = 0
+        batch = []
+        for record in records.only('id', 'latitude', 'longitude', 'geohash').order_by().iterator(chunk_size=batch_size):
+            geohash = record.compute_geohash()
+            if geohash == record.geohash:
+                continue
+            batch.append((record, record.geohash))
+            record.geohash = geohash
+            if len(batch) >= batch_size:
+                updated += self._flush(batch)
+        updated += self._flush(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} geohashes, cleared {cleared}'))
+
+    def _flush(self, batch):
+        """Write a batch of (record, previous geohash) pairs and invalidate their map regions"""
+        count = len(batch)
+        if batch:
+            ImageRecord.objects.bulk_update([record for record, _ in batch], ['geohash'])
+            bump_map_version(*{record.geohash for record, _ in batch}, *{old for _, old in batch if old})
+            batch.clear()
+        return count
@@ -0,0 +1,66 @@
+"""
+Populate the perceptual hash of ImageRecords stored without one.
+
+Analysis stores the hash of every image it decodes; this covers rows
+created before near-duplicate detection existed, images not analyzed yet
+and data loaded by other means. Each image is decoded at reduced size.
+
+Usage:
+    python manage.py backfill_phash            # only rows without a hash
+    python manage.py backfill_phash --all      # recompute every row
+"""
+
+from django.core.management.base import BaseCommand
+
+from core import perceptual_hash
+from core.models import ImageRecord
+
+
+class Command(BaseCommand):
+    help = 'Compute the perceptual hash used for near-duplicate lookup of ImageRecords'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recompute every row, not just rows without a hash'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Rows updated per batch (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        records = ImageRecord.objects.exclude(image='')
+        if not options['all']:
+            records = records.filter(phash='')
+
+        fields = ['phash', *perceptual_hash.CHUNK_FIELDS]
+        updated = 0
+        unreadable = 0
+        batch = []
+        for record in records.only('id', 'image', *fields).order_by().iterator(chunk_size=batch_size):
+            try:
+                with record.image.open('rb') as source:
+                    value = perceptual_hash.file_dhash(source)
+            except OSError:
+                value = None
+            if value is None:
+                unreadable += 1
+                continue
+
+            record.set_phash(value)
+            batch.append(record)
+            if len(batch) >= batch_size:
+                updated += self._flush(batch, fields)
+        updated += self._flush(batch, fields)
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} perceptual hashes, {unreadable} images unreadable'))
+
+    def _flush(self, batch, fields):
+        count = len(batch)
+        if batch:
+            ImageRecord.objects.bulk_update(batch, fields)
+            batch.clear()
+        return count
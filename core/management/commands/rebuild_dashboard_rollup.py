@@ -0,0 +1,47 @@
+"""
+Rebuild the dashboard rollup table from scratch and verify it.
+
+Usage:
+    python manage.py rebuild_dashboard_rollup            # rebuild, then verify
+    python manage.py rebuild_dashboard_rollup --verify-only
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.rollup import compute_rollup_rows, rebuild_rollups, stored_rollup_rows
+
+
+class Command(BaseCommand):
+    help = 'Rebuild DashboardRollup counters from ImageRecord/AnalysisResult and verify consistency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Only compare the stored rollups with freshly computed values; exit non-zero on mismatch'
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            written = rebuild_rollups()
+            self.stdout.write(f'Rebuilt {written} rollup rows')
+
+        mismatches = self._verify()
+        if mismatches:
+            for (user_id, dimension, key), expected, stored in mismatches:
+                scope = f'user {user_id}' if user_id is not None else 'global'
+                self.stderr.write(f'{scope} {dimension}:{key or "-"} expected {expected}, stored {stored}')
+            raise CommandError(f'{len(mismatches)} rollup rows are inconsistent')
+
+        self.stdout.write(self.style.SUCCESS('Dashboard rollups are consistent'))
+
+    def _verify(self):
+        expected = {key: value for key, value in compute_rollup_rows().items() if value[0] or value[1]}
+        stored = stored_rollup_rows()
+
+        mismatches = []
+        for row_key in sorted(set(expected) | set(stored), key=str):
+            expected_count, expected_total = expected.get(row_key, (0, 0.0))
+            stored_count, stored_total = stored.get(row_key, (0, 0.0))
+            if expected_count != stored_count or abs(expected_total - stored_total) > 1e-6 * max(1.0, abs(expected_total)):
+                mismatches.append((row_key, (expected_count, expected_total), (stored_count, stored_total)))
+        return mismatches
@@ -0,0 +1,229 @@
+"""
+Tiled GeoJSON map data with server-side clustering.
+
+The map requests data per slippy-map tile (z/x/y, Web Mercator). Below
+settings.MAP_CLUSTER_MAX_ZOOM each tile is split into a
+MAP_CLUSTER_GRID x MAP_CLUSTER_GRID grid and the database returns one row
+per occupied cell with its image count, centroid and worst condition. At
+higher zoom levels individual points are returned. Tiles are cached per
+(region, region version, user scope, z, x, y), where the region is the
+geohash cell containing the tile; a change to an image bumps only the
+versions of the regions containing it (see bump_map_version). Tiles whose
+region is shorter than settings.MAP_TILE_MIN_VERSION_PRECISION span a
+large part of the world and would be invalidated by nearly every change,
+so they are not versioned and expire after MAP_TILE_COARSE_TIMEOUT instead.
+"""
+
+import math
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Case, Count, FloatField, IntegerField, Max, When
+from django.db.models.functions import Cast, Floor
+
+from . import geo
+
+# Worst-condition ranking used to pick a cluster's colour
+CONDITION_RANK = {'good': 1, 'moderate': 2, 'poor': 3, 'critical': 4}
+RANK_CONDITION = {rank: condition for condition, rank in CONDITION_RANK.items()}
+
+MAX_ZOOM = 22
+VERSION_KEY = 'map_tiles_version'
+EDGE_EPSILON = 1e-9  # degrees
+
+
+def tile_bounds(z, x, y):
+    """
+    Return the (min_lat, min_lng, max_lat, max_lng) bounds of a Web Mercator tile.
+
+    Raises:
+        ValueError: If the tile coordinates are out of range
+    """
+    n = 2 ** z
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < n and 0 <= y < n):
+        raise ValueError(f"Invalid tile {z}/{x}/{y}")
+
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def _version_key(region):
+    return f"{VERSION_KEY}:{region}"
+
+
+def _version_precisions():
+    """Return the (shortest, longest) lengths of the geohash regions that carry a version"""
+    precision = getattr(settings, 'MAP_TILE_VERSION_PRECISION', 4)
+    return min(getattr(settings, 'MAP_TILE_MIN_VERSION_PRECISION', 2), precision), precision
+
+
+def _new_version():
+    # Start from the clock so a counter evicted from the cache never repeats an old value
+    return time.time_ns() // 1000
+
+
+def tile_region(z, x, y):
+    """
+    Return the geohash prefix whose cell contains a whole tile.
+
+    The prefix is at most settings.MAP_TILE_VERSION_PRECISION characters;
+    tiles spanning several cells get a shorter prefix ('' for the world).
+
+    Raises:
+        ValueError: If the tile coordinates are out of range
+    """
+    min_lat, min_lng, max_lat, max_lng = tile_bounds(z, x, y)
+    precision = getattr(settings, 'MAP_TILE_VERSION_PRECISION', 4)
+    # Tiles are half-open, so the north-east corner itself belongs to the next tile
+    south_west = geo.encode(min_lat, min_lng, precision)
+    north_east = geo.encode(max_lat - EDGE_EPSILON, max_lng - EDGE_EPSILON, precision)
+    return os.path.commonprefix([south_west, north_east])
+
+
+def get_map_version(region=''):
+    """Return the current data version of a geohash region, used in tile cache keys"""
+    return cache.get_or_set(_version_key(region), _new_version, timeout=None)
+
+
+def bump_map_version(*geohashes):
+    """
+    Invalidate the cached tiles that show any of the given positions.
+
+    Every prefix of each geohash from settings.MAP_TILE_MIN_VERSION_PRECISION
+    up to MAP_TILE_VERSION_PRECISION characters gets a new version, so
+    exactly the versioned tiles whose region contains one of the positions
+    are rebuilt. The versions live in the default cache,
+    which must be shared (Redis) for bumps made by Celery workers to reach
+    the web processes.
+
+    Args:
+        geohashes: Geohashes of the old and new positions of changed images
+    """
+    shortest, precision = _version_precisions()
+    regions = {geohash[:length] for geohash in geohashes if geohash for length in range(shortest, precision + 1)}
+    for region in regions:
+        try:
+            cache.incr(_version_key(region))
+        except ValueError:
+            cache.set(_version_key(region), _new_version(), timeout=None)
+
+
+def _worst_condition_rank():
+    return Max(Case(
+        *[When(analysis__condition_label=condition, then=rank) for condition, rank in CONDITION_RANK.items()],
+        default=0,
+        output_field=IntegerField(),
+    ))
+
+
+def cluster_features(images, bounds):
+    """Return one GeoJSON feature per occupied grid cell of a tile"""
+    min_lat, min_lng, max_lat, max_lng = bounds
+    grid = getattr(settings, 'MAP_CLUSTER_GRID', 8)
+    cell_lat = (max_lat - min_lat) / grid
+    cell_lng = (max_lng - min_lng) / grid
+
+    cells = images.annotate(
+        cell_x=Floor((Cast('longitude', FloatField()) - min_lng) / cell_lng),
+        cell_y=Floor((Cast('latitude', FloatField()) - min_lat) / cell_lat),
+    ).values('cell_x', 'cell_y').annotate(
+        count=Count('id'),
+        lat=Avg('latitude', output_field=FloatField()),
+        lng=Avg('longitude', output_field=FloatField()),
+        worst=_worst_condition_rank(),
+    ).order_by()
+
+    return [
+        {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(cell['lng'], 6), round(cell['lat'], 6)]},
+            'properties': {
+                'cluster': True,
+                'count': cell['count'],
+                'severity': RANK_CONDITION.get(cell['worst']),
+            },
+        }
+        for cell in cells
+    ]
+
+
+def point_features(images, limit):
+    """Return one GeoJSON feature per image, up to `limit`; the flag says if more were dropped"""
+    rows = list(images.values(
+        'id', 'latitude', 'longitude', 'title', 'status', 'location_name',
+        'analysis__condition_label', 'analysis__defect_type',
+    ).order_by('-upload_date')[:limit + 1])
+
+    features = [
+        {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [float(row['longitude']), float(row['latitude'])]},
+            'properties': {
+                'cluster': False,
+                'id': row['id'],
+                'title': row['title'] or 'Road Image',
+                'status': row['status'],
+                'location': row['location_name'],
+                'severity': row['analysis__condition_label'],
+                'defect_type': row['analysis__defect_type'],
+            },
+        }
+        for row in rows[:limit]
+    ]
+    return features, len(rows) > limit
+
+
+def build_tile(images, z, x, y):
+    """
+    Build the GeoJSON FeatureCollection for one tile.
+
+    Args:
+        images: ImageRecord queryset already restricted to what the user may see
+        z, x, y: Tile coordinates
+
+    Returns:
+        GeoJSON FeatureCollection dictionary
+    """
+    bounds = tile_bounds(z, x, y)
+    min_lat, min_lng, max_lat, max_lng = bounds
+    # Geohash-pruned box, made half-open so a point on a shared edge belongs to exactly one tile
+    images = images.within_bbox(min_lat, min_lng, max_lat, max_lng).filter(
+        latitude__lt=max_lat, longitude__lt=max_lng,
+    )
+
+    truncated = False
+    if z < getattr(settings, 'MAP_CLUSTER_MAX_ZOOM', 15):
+        features = cluster_features(images, bounds)
+    else:
+        features, truncated = point_features(images, getattr(settings, 'MAP_TILE_MAX_POINTS', 2000))
+
+    return {
+        'type': 'FeatureCollection',
+        'tile': {'z': z, 'x': x, 'y': y},
+        'bbox': [min_lng, min_lat, max_lng, max_lat],
+        'clustered': z < getattr(settings, 'MAP_CLUSTER_MAX_ZOOM', 15),
+        'truncated': truncated,
+        'features': features,
+    }
+
+
+def get_tile(images, scope, z, x, y):
+    """Return a tile from the cache, building and caching it on a miss"""
+    region = tile_region(z, x, y)
+    timeout = getattr(settings, 'MAP_TILE_CACHE_TIMEOUT', 300)
+    if len(region) >= _version_precisions()[0]:
+        version = get_map_version(region)
+    else:
+        # Coarse tiles are never bumped; a short lifetime bounds how stale they get
+        version = 'coarse'
+        timeout = min(timeout, getattr(settings, 'MAP_TILE_COARSE_TIMEOUT', 60))
+    key = f"map_tile:{region}:{version}:{scope}:{z}:{x}:{y}"
+    tile = cache.get(key)
+    if tile is None:
+        tile = build_tile(images, z, x, y)
+        cache.set(key, tile, timeout=timeout)
+    return tile
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+
+
+def populate_rollups(apps, schema_editor):
+    """Build the initial rollup rows from existing images and analysis results"""
+    ImageRecord = apps.get_model('core', 'ImageRecord')
+    AnalysisResult = apps.get_model('analysis', 'AnalysisResult')
+    DashboardRollup = apps.get_model('core', 'DashboardRollup')
+    Count = models.Count
+    Sum = models.Sum
+
+    rows = defaultdict(lambda: [0, 0.0])
+
+    def add(user_id, dimension, key, count, total=0.0):
+        for scope in (user_id, None):
+            row = rows[(scope, dimension, key)]
+            row[0] += count
+            row[1] += total
+
+    for entry in ImageRecord.objects.order_by().values('user_id', 'status').annotate(n=Count('id')):
+        add(entry['user_id'], 'status', entry['status'], entry['n'])
+
+    results = AnalysisResult.objects.order_by().values('image_record__user_id')
+    for dimension in ('defect_type', 'condition_label'):
+        for entry in results.values('image_record__user_id', dimension).annotate(n=Count('id')):
+            add(entry['image_record__user_id'], dimension, entry[dimension], entry['n'])
+    for entry in results.annotate(n=Count('id'), total=Sum('severity_score')):
+        add(entry['image_record__user_id'], 'severity', '', entry['n'], entry['total'] or 0.0)
+
+    DashboardRollup.objects.bulk_create(
+        DashboardRollup(user_id=user_id, dimension=dimension, key=key, count=count, total=total)
+        for (user_id, dimension, key), (count, total) in rows.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0002_bulkuploadjob_imagerecord_upload_job'),
+        ('analysis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('status', 'Image Status'), ('defect_type', 'Defect Type'), ('condition_label', 'Condition'), ('severity', 'Severity Score')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=50)),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Dashboard Rollup',
+                'verbose_name_plural': 'Dashboard Rollups',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dashboardrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user', 'dimension', 'key'), name='unique_user_dashboard_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='dashboardrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('dimension', 'key'), name='unique_global_dashboard_rollup'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
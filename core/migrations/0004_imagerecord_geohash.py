@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:13
+
+from django.db import migrations, models
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=12):
+    """Frozen copy of core.geo.encode, so later changes there cannot alter this migration"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    value = 0
+    for bit in range(5 * precision):
+        # Bits alternate longitude, latitude, longitude, ... from the most significant
+        interval, coordinate = (lng_range, float(longitude)) if bit % 2 == 0 else (lat_range, float(latitude))
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = (value << 1) | 1
+            interval[0] = middle
+        else:
+            value <<= 1
+            interval[1] = middle
+        if bit % 5 == 4:
+            chars.append(BASE32[value])
+            value = 0
+    return ''.join(chars)
+
+
+def populate_geohashes(apps, schema_editor):
+    """Compute geohashes for existing geotagged images"""
+    ImageRecord = apps.get_model('core', 'ImageRecord')
+
+    batch = []
+    located = ImageRecord.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for record in located.only('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        record.geohash = encode_geohash(record.latitude, record.longitude)
+        batch.append(record)
+        if len(batch) >= 2000:
+            ImageRecord.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        ImageRecord.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_dashboardrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagerecord',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(populate_geohashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_imagerecord_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagerecord',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='core.imagerecord'),
+        ),
+        migrations.AddField(
+            model_name='imagerecord',
+            name='phash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='imagerecord',
+            name='phash_0',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagerecord',
+            name='phash_1',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagerecord',
+            name='phash_2',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagerecord',
+            name='phash_3',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='imagerecord',
+            index=models.Index(fields=['user', 'phash_0'], name='core_imager_user_id_5cc4fb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagerecord',
+            index=models.Index(fields=['user', 'phash_1'], name='core_imager_user_id_3e38b0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagerecord',
+            index=models.Index(fields=['user', 'phash_2'], name='core_imager_user_id_9ec191_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagerecord',
+            index=models.Index(fields=['user', 'phash_3'], name='core_imager_user_id_23a48d_idx'),
+        ),
+    ]
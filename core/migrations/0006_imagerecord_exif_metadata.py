@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_imagerecord_phash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagerecord',
+            name='captured_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagerecord',
+            name='orientation',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,7 +1,92 @@
+import math
+
 from django.db import models
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
 
+from . import geo, image_metadata, perceptual_hash
+
+
+class BulkUploadJob(models.Model):
+    """Model for tracking bulk (ZIP or multi-file) image ingestion"""
+    
+    STATUS_CHOICES = [
+        ('receiving', 'Receiving Files'),
+        ('received', 'Files Received'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='receiving')
+    total_files = models.IntegerField(default=0)
+    accepted_files = models.IntegerField(default=0)
+    rejected_files = models.JSONField(default=list, blank=True)  # [{'name': ..., 'error': ...}]
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Bulk Upload Job'
+        verbose_name_plural = 'Bulk Upload Jobs'
+    
+    def __str__(self):
+        return f"Bulk upload #{self.id} - {self.user.email} - {self.accepted_files}/{self.total_files} files"
+
+
+class ImageRecordQuerySet(models.QuerySet):
+    """Spatial lookups backed by the indexed geohash column"""
+    
+    def within_bbox(self, min_lat, min_lng, max_lat, max_lng):
+        """
+        Images inside a bounding box (edges included).
+        
+        The geohash prefixes covering the box prune rows through the index;
+        the coordinate range filter then removes the cells' overhang.
+        """
+        prefixes = geo.cover(min_lat, min_lng, max_lat, max_lng)
+        prune = models.Q()
+        for prefix in prefixes:
+            prune |= models.Q(geohash__startswith=prefix)
+        return self.filter(
+            prune,
+            latitude__gte=min_lat, latitude__lte=max_lat,
+            longitude__gte=min_lng, longitude__lte=max_lng,
+        )
+    
+    def within_radius(self, latitude, longitude, radius_km):
+        """
+        Images within `radius_km` of a point, annotated with `distance_km`.
+        
+        Candidates come from within_bbox() on the enclosing box; the exact
+        great-circle (haversine) distance is computed only for those.
+        """
+        lat1 = math.radians(float(latitude))
+        lng1 = math.radians(float(longitude))
+        lat2 = Radians(Cast('latitude', models.FloatField()))
+        lng2 = Radians(Cast('longitude', models.FloatField()))
+        
+        half_chord = (
+            Power(Sin((lat2 - lat1) / 2), 2)
+            + math.cos(lat1) * Cos(lat2) * Power(Sin((lng2 - lng1) / 2), 2)
+        )
+        distance = 2 * geo.EARTH_RADIUS_KM * ASin(Sqrt(half_chord))
+        
+        return self.within_bbox(*geo.radius_bbox(latitude, longitude, radius_km)).annotate(
+            distance_km=models.ExpressionWrapper(distance, output_field=models.FloatField())
+        ).filter(distance_km__lte=radius_km)
+    
+    def phash_candidates(self, value, max_distance):
+        """
+        Images whose perceptual hash may be within `max_distance` bits of `value`.
+        
+        Filters on the indexed hash chunk columns (see core.perceptual_hash); the
+        result is a superset, so compare the full hashes with
+        perceptual_hash.hamming().
+        """
+        return self.filter(perceptual_hash.candidate_filter(value, max_distance))
+
 
 class ImageRecord(models.Model):
     """Model for storing uploaded road images"""
@@ -26,6 +111,23 @@ class ImageRecord(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     location_name = models.CharField(max_length=255, blank=True)
+    # Spatial index key; on PostgreSQL db_index also adds a pattern-ops index for prefix lookups
+    geohash = models.CharField(max_length=geo.GEOHASH_PRECISION, blank=True, db_index=True, editable=False)
+    
+    # Perceptual hash (hex) and its 16-bit chunks, indexed for near-duplicate lookup
+    phash = models.CharField(max_length=perceptual_hash.HASH_BITS // 4, blank=True, editable=False)
+    phash_0 = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    phash_1 = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    phash_2 = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    phash_3 = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # Earlier frame whose analysis this near-duplicate reuses
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates'
+    )
     
     # Metadata
     upload_date = models.DateTimeField(auto_now_add=True)
@@ -33,6 +135,18 @@ class ImageRecord(models.Model):
     file_size = models.IntegerField(null=True, blank=True)  # in bytes
     image_width = models.IntegerField(null=True, blank=True)
     image_height = models.IntegerField(null=True, blank=True)
+    # Read from the EXIF header on upload
+    orientation = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    captured_at = models.DateTimeField(null=True, blank=True, editable=False)
+    upload_job = models.ForeignKey(
+        BulkUploadJob,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='images'
+    )
+    
+    objects = ImageRecordQuerySet.as_manager()
     
     class Meta:
         ordering = ['-upload_date']
@@ -41,6 +155,10 @@ class ImageRecord(models.Model):
         indexes = [
             models.Index(fields=['-upload_date']),
             models.Index(fields=['user', 'status']),
+            models.Index(fields=['user', 'phash_0']),
+            models.Index(fields=['user', 'phash_1']),
+            models.Index(fields=['user', 'phash_2']),
+            models.Index(fields=['user', 'phash_3']),
         ]
     
     def __str__(self):
@@ -50,14 +168,118 @@ class ImageRecord(models.Model):
     def has_location(self):
         return self.latitude is not None and self.longitude is not None
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored owner/status so dashboard rollups can apply deltas
+        instance._rollup_loaded = instance.rollup_key()
+        instance._map_loaded = instance.map_key()
+        return instance
+    
+    def rollup_key(self):
+        """Return the (user_id, status) this record contributes to dashboard rollups"""
+        if 'user_id' not in self.__dict__ or 'status' not in self.__dict__:
+            return None
+        return (self.user_id, self.status)
+    
+    def map_key(self):
+        """Return the (latitude, longitude, status, title, location_name) that cached map tiles show"""
+        fields = ('latitude', 'longitude', 'status', 'title', 'location_name')
+        if any(field not in self.__dict__ for field in fields):
+            return None
+        return tuple(self.__dict__[field] for field in fields)
+    
+    def compute_geohash(self):
+        """Return the geohash for the current coordinates ('' without a location)"""
+        if not self.has_location:
+            return ''
+        return geo.encode(self.latitude, self.longitude)
+    
+    def set_phash(self, value):
+        """Store a hash from core.perceptual_hash, or clear it with None"""
+        self.phash = perceptual_hash.to_hex(value) if value is not None else ''
+        chunks = perceptual_hash.split(value) if value is not None else [None] * len(perceptual_hash.CHUNK_FIELDS)
+        for field, chunk in zip(perceptual_hash.CHUNK_FIELDS, chunks):
+            setattr(self, field, chunk)
+    
+    def apply_image_metadata(self, metadata):
+        """
+        Copy header metadata from core.image_metadata onto the record.
+        
+        The EXIF GPS position only fills in a missing location; coordinates
+        entered by the user win.
+        """
+        if metadata is None:
+            return
+        self.image_width = metadata['width']
+        self.image_height = metadata['height']
+        self.orientation = metadata['orientation']
+        self.captured_at = metadata['captured_at']
+        if not self.has_location and metadata['latitude'] is not None:
+            self.latitude = metadata['latitude']
+            self.longitude = metadata['longitude']
+    
     def save(self, *args, **kwargs):
-        if self.image:
+        update_fields = kwargs.get('update_fields')
+        
+        # Only re-read file metadata when the image itself may have changed,
+        # not on status-only updates. Only the header is read: the pixels
+        # are decoded once, by analysis, which also computes the perceptual hash
+        if self.image and (update_fields is None or 'image' in update_fields):
             self.file_size = self.image.size
-            # Get image dimensions
-            from PIL import Image
-            try:
-                img = Image.open(self.image)
-                self.image_width, self.image_height = img.size
-            except:
-                pass
+            self.apply_image_metadata(image_metadata.read_image_metadata(self.image))
+        
+        self.geohash = self.compute_geohash()
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
         super().save(*args, **kwargs)
+
+
+class DashboardRollup(models.Model):
+    """
+    Incrementally maintained dashboard counters.
+    
+    One row per (user, dimension, key); rows with user=None hold the global
+    totals. Kept up to date by the signal handlers in core.signals and
+    rebuilt with the rebuild_dashboard_rollup management command.
+    """
+    
+    DIMENSION_CHOICES = [
+        ('status', 'Image Status'),
+        ('defect_type', 'Defect Type'),
+        ('condition_label', 'Condition'),
+        ('severity', 'Severity Score'),
+    ]
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='dashboard_rollups'
+    )
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=50, blank=True)
+    count = models.BigIntegerField(default=0)
+    total = models.FloatField(default=0)  # sum of severity scores for the 'severity' dimension
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Dashboard Rollup'
+        verbose_name_plural = 'Dashboard Rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'dimension', 'key'],
+                condition=models.Q(user__isnull=False),
+                name='unique_user_dashboard_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['dimension', 'key'],
+                condition=models.Q(user__isnull=True),
+                name='unique_global_dashboard_rollup',
+            ),
+        ]
+    
+    def __str__(self):
+        scope = self.user.email if self.user_id else 'global'
+        return f"{scope} - {self.dimension}:{self.key} = {self.count}"
@@ -0,0 +1,106 @@
+"""
+Perceptual hashing for near-duplicate frame lookup.
+
+Images are hashed with a 64-bit difference hash (dHash): the frame is
+reduced to 9x8 grayscale pixels and each bit records whether a pixel is
+brighter than its right neighbour. Near-identical frames, such as
+consecutive dash-cam frames of the same pavement, get hashes a few bits
+apart. The hash only needs a thumbnail, so JPEGs are decoded at reduced
+resolution through PIL's draft mode; it honours the EXIF orientation, as
+OpenCV's decoder does.
+
+Lookups use multi-index hashing: the hash is stored with its four 16-bit
+chunks in indexed columns (CHUNK_FIELDS). Two hashes within Hamming
+distance d differ in at most d // 4 bits in at least one chunk
+(pigeonhole), so rows with a chunk within that radius of the query's chunk
+are the only candidates; the exact distance is checked on those.
+"""
+
+from itertools import combinations
+
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+HASH_BITS = 64
+CHUNK_BITS = 16
+CHUNK_FIELDS = ('phash_0', 'phash_1', 'phash_2', 'phash_3')
+
+# dHash grid: 9 columns give 8 horizontal differences per row
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+
+def dhash(img):
+    """
+    Difference hash of a PIL image.
+
+    Call on a freshly opened image: a JPEG is then decoded at 1/2 to 1/8
+    scale instead of full resolution.
+
+    Returns:
+        Hash as an integer of HASH_BITS bits
+    """
+    img.draft('L', (HASH_WIDTH * 8, HASH_HEIGHT * 8))
+    img = ImageOps.exif_transpose(img)
+    small = img.convert('L').resize((HASH_WIDTH, HASH_HEIGHT), Image.LANCZOS)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(HASH_HEIGHT):
+        for col in range(HASH_WIDTH - 1):
+            left = pixels[row * HASH_WIDTH + col]
+            right = pixels[row * HASH_WIDTH + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def file_dhash(source):
+    """Difference hash of an image file (path or binary file object), or None if it cannot be read"""
+    try:
+        with Image.open(source) as img:
+            return dhash(img)
+    except (OSError, ValueError):
+        return None
+
+
+def to_hex(value):
+    """Fixed-width hex string of a hash, as stored in ImageRecord.phash"""
+    return format(value, f'0{HASH_BITS // 4}x')
+
+
+def split(value):
+    """Return the CHUNK_FIELDS values of a hash, most significant chunk first"""
+    mask = (1 << CHUNK_BITS) - 1
+    count = len(CHUNK_FIELDS)
+    return [(value >> (CHUNK_BITS * (count - 1 - i))) & mask for i in range(count)]
+
+
+def hamming(a, b):
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+
+def chunk_neighbours(chunk, radius):
+    """Every chunk value within `radius` bits of `chunk`"""
+    values = [chunk]
+    for distance in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), distance):
+            flipped = chunk
+            for bit in bits:
+                flipped ^= 1 << bit
+            values.append(flipped)
+    return values
+
+
+def candidate_filter(value, max_distance):
+    """
+    Q object selecting the rows whose hash may be within max_distance of value.
+
+    Matches on the indexed chunk columns only; callers still compare the
+    full hashes with hamming().
+    """
+    radius = max_distance // len(CHUNK_FIELDS)
+    condition = Q()
+    for field, chunk in zip(CHUNK_FIELDS, split(value)):
+        condition |= Q(**{f'{field}__in': chunk_neighbours(chunk, radius)})
+    return condition
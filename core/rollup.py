@@ -0,0 +1,171 @@
+"""
+Incrementally maintained dashboard rollups.
+
+Every ImageRecord contributes one count to its ('status', status) row, and
+every AnalysisResult contributes to its ('defect_type', ...) and
+('condition_label', ...) rows plus the ('severity', '') sum/count row. Each
+contribution is applied both to the owner's rows and to the global rows
+(user=None), so dashboard reads are a single indexed query regardless of
+table size.
+"""
+
+import logging
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from analysis.models import AnalysisResult
+from .models import DashboardRollup, ImageRecord
+from .statistics import breakdown
+
+logger = logging.getLogger(__name__)
+
+
+def image_contributions(user_id, status):
+    """Return the rollup rows an ImageRecord contributes to, as {(user_id, dimension, key): (count, total)}"""
+    return {(user_id, 'status', status): (1, 0.0)}
+
+
+def analysis_contributions(user_id, defect_type, condition_label, severity_score):
+    """Return the rollup rows an AnalysisResult contributes to"""
+    return {
+        (user_id, 'defect_type', defect_type): (1, 0.0),
+        (user_id, 'condition_label', condition_label): (1, 0.0),
+        (user_id, 'severity', ''): (1, float(severity_score or 0)),
+    }
+
+
+def apply_deltas(removed=None, added=None):
+    """
+    Apply the difference between two contribution sets to the rollup table.
+
+    Args:
+        removed: Contributions to subtract (the previously stored state)
+        added: Contributions to add (the new state)
+    """
+    deltas = defaultdict(lambda: [0, 0.0])
+    for sign, contributions in ((-1, removed or {}), (1, added or {})):
+        for (user_id, dimension, key), (count, total) in contributions.items():
+            # Every change counts towards the owner's rows and the global rows
+            for scope in (user_id, None):
+                delta = deltas[(scope, dimension, key)]
+                delta[0] += sign * count
+                delta[1] += sign * total
+
+    with transaction.atomic():
+        for (user_id, dimension, key), (count, total) in deltas.items():
+            if count or total:
+                _bump(user_id, dimension, key, count, total)
+
+
+def _bump(user_id, dimension, key, count, total):
+    rows = DashboardRollup.objects.filter(user_id=user_id, dimension=dimension, key=key)
+    if rows.update(count=F('count') + count, total=F('total') + total):
+        return
+    if count <= 0:
+        # Nothing to subtract from: the row was never counted or has been
+        # removed along with its owner (a deleted user's rows go first)
+        return
+    try:
+        with transaction.atomic():
+            DashboardRollup.objects.create(
+                user_id=user_id, dimension=dimension, key=key, count=count, total=total
+            )
+    except IntegrityError:
+        # Another process created the row first
+        rows.update(count=F('count') + count, total=F('total') + total)
+
+
+def record_created_images(image_records):
+    """Count ImageRecords created with bulk_create, which bypasses post_save"""
+    added = Counter((image_record.user_id, 'status', image_record.status) for image_record in image_records)
+    apply_deltas(added={row_key: (count, 0.0) for row_key, count in added.items()})
+
+
+def compute_rollup_rows():
+    """
+    Compute every rollup row from scratch.
+
+    Returns:
+        Dictionary of {(user_id, dimension, key): (count, total)}, including
+        the global rows (user_id=None)
+    """
+    rows = defaultdict(lambda: [0, 0.0])
+
+    def add(user_id, dimension, key, count, total=0.0):
+        for scope in (user_id, None):
+            row = rows[(scope, dimension, key)]
+            row[0] += count
+            row[1] += total
+
+    for entry in ImageRecord.objects.order_by().values('user_id', 'status').annotate(n=Count('id')):
+        add(entry['user_id'], 'status', entry['status'], entry['n'])
+
+    results = AnalysisResult.objects.order_by().values('image_record__user_id')
+    for dimension in ('defect_type', 'condition_label'):
+        for entry in results.values('image_record__user_id', dimension).annotate(n=Count('id')):
+            add(entry['image_record__user_id'], dimension, entry[dimension], entry['n'])
+    for entry in results.annotate(n=Count('id'), total=Sum('severity_score')):
+        add(entry['image_record__user_id'], 'severity', '', entry['n'], entry['total'] or 0.0)
+
+    return {key: (count, total) for key, (count, total) in rows.items()}
+
+
+def stored_rollup_rows():
+    """Return the rollup table as {(user_id, dimension, key): (count, total)}, skipping empty rows"""
+    return {
+        (row['user_id'], row['dimension'], row['key']): (row['count'], row['total'])
+        for row in DashboardRollup.objects.values('user_id', 'dimension', 'key', 'count', 'total')
+        if row['count'] or row['total']
+    }
+
+
+def rebuild_rollups():
+    """Replace the rollup table with freshly computed rows; returns the number of rows written"""
+    rows = compute_rollup_rows()
+    with transaction.atomic():
+        DashboardRollup.objects.all().delete()
+        DashboardRollup.objects.bulk_create(
+            DashboardRollup(user_id=user_id, dimension=dimension, key=key, count=count, total=total)
+            for (user_id, dimension, key), (count, total) in rows.items()
+        )
+    logger.info(f"Rebuilt dashboard rollups: {len(rows)} rows")
+    return len(rows)
+
+
+def get_rollup_statistics(user=None):
+    """
+    Read dashboard statistics from the rollup table in one query.
+
+    Args:
+        user: User whose statistics to return, or None for global totals
+
+    Returns:
+        Dictionary in the same shape as core.statistics.get_image_statistics
+    """
+    if user is not None:
+        rows = DashboardRollup.objects.filter(user=user)
+    else:
+        rows = DashboardRollup.objects.filter(user__isnull=True)
+    values = {(row.dimension, row.key): row for row in rows}
+
+    def count(dimension, key):
+        row = values.get((dimension, key))
+        return row.count if row else 0
+
+    stats = {'total_images': sum(row.count for (dimension, _), row in values.items() if dimension == 'status')}
+    for status, _ in ImageRecord.STATUS_CHOICES:
+        stats[f'{status}_images'] = count('status', status)
+
+    def counts(dimension):
+        return {key: row.count for (row_dimension, key), row in values.items() if row_dimension == dimension}
+
+    stats['defect_stats'] = breakdown(counts('defect_type'), AnalysisResult.DEFECT_TYPE_CHOICES, 'defect_type')
+    stats['severity_stats'] = breakdown(
+        counts('condition_label'), AnalysisResult.CONDITION_CHOICES, 'condition_label'
+    )
+
+    severity = values.get(('severity', ''))
+    stats['avg_severity'] = round(severity.total / severity.count, 2) if severity and severity.count else 0
+    return stats
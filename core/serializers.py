@@ -1,5 +1,6 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import ImageRecord
+from .models import BulkUploadJob, ImageRecord
 
 
 class ImageRecordSerializer(serializers.ModelSerializer):
@@ -13,9 +14,12 @@ class ImageRecordSerializer(serializers.ModelSerializer):
             'id', 'user', 'user_email', 'user_name', 'image', 'title', 
             'description', 'status', 'latitude', 'longitude', 'location_name',
             'upload_date', 'updated_date', 'file_size', 'image_width', 
-            'image_height', 'has_location', 'has_analysis'
+            'image_height', 'orientation', 'captured_at', 'has_location', 'has_analysis', 'duplicate_of'
+        ]
+        read_only_fields = [
+            'id', 'user', 'upload_date', 'updated_date', 'file_size', 'image_width', 'image_height',
+            'orientation', 'captured_at', 'duplicate_of'
         ]
-        read_only_fields = ['id', 'user', 'upload_date', 'updated_date', 'file_size', 'image_width', 'image_height']
     
     def get_user_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}".strip() or obj.user.username
@@ -46,3 +50,63 @@ class ImageUploadSerializer(serializers.ModelSerializer):
         # Set user from context
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
+
+
+class BulkUploadSerializer(serializers.Serializer):
+    """Input for bulk ingestion: a ZIP archive and/or a list of image files"""
+    archive = serializers.FileField(required=False)
+    images = serializers.ListField(child=serializers.FileField(), required=False, default=list)
+    description = serializers.CharField(required=False, allow_blank=True)
+    latitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False, allow_null=True)
+    longitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False, allow_null=True)
+    location_name = serializers.CharField(required=False, allow_blank=True, max_length=255)
+    
+    def validate_archive(self, value):
+        if not value.name.lower().endswith('.zip'):
+            raise serializers.ValidationError("Archive must be a .zip file.")
+        return value
+    
+    def validate(self, attrs):
+        if not attrs.get('archive') and not attrs.get('images'):
+            raise serializers.ValidationError("Provide a ZIP archive or at least one image.")
+        
+        max_files = getattr(settings, 'BULK_UPLOAD_MAX_FILES', 5000)
+        if len(attrs.get('images', [])) > max_files:
+            raise serializers.ValidationError(f"At most {max_files} images can be uploaded at once.")
+        return attrs
+
+
+class BulkUploadJobSerializer(serializers.ModelSerializer):
+    files = serializers.SerializerMethodField()
+    analysis_status = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = BulkUploadJob
+        fields = [
+            'id', 'status', 'total_files', 'accepted_files', 'rejected_files',
+            'error_message', 'analysis_status', 'files', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+    
+    def _images(self, obj):
+        # One query for both per-file statuses and the status summary
+        if not hasattr(obj, '_image_rows'):
+            obj._image_rows = list(obj.images.order_by('id').values('id', 'title', 'status'))
+        return obj._image_rows
+    
+    def get_files(self, obj):
+        files = [
+            {'name': row['title'], 'image_id': row['id'], 'status': row['status']}
+            for row in self._images(obj)
+        ]
+        files.extend(
+            {'name': entry['name'], 'image_id': None, 'status': 'rejected', 'error': entry['error']}
+            for entry in obj.rejected_files
+        )
+        return files
+    
+    def get_analysis_status(self, obj):
+        counts = {key: 0 for key, _ in ImageRecord.STATUS_CHOICES}
+        for row in self._images(obj):
+            counts[row['status']] += 1
+        return counts
@@ -0,0 +1,107 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import ImageRecord
+from .map_tiles import bump_map_version
+from . import geo, rollup
+
+
+def _image_contributions(key):
+    return rollup.image_contributions(*key) if key else {}
+
+
+def _analysis_contributions(key, instance=None):
+    """Resolve the owner of an AnalysisResult key and return its rollup contributions"""
+    if not key:
+        return {}
+    image_record_id, defect_type, condition_label, severity_score = key
+    if instance is not None and instance.image_record_id == image_record_id:
+        user_id = instance.image_record.user_id
+    else:
+        user_id = ImageRecord.objects.filter(id=image_record_id).values_list('user_id', flat=True).first()
+    return rollup.analysis_contributions(user_id, defect_type, condition_label, severity_score)
+
+
+def _map_regions(*map_keys):
+    """Return the geohashes of the positions in ImageRecord map keys, skipping records without a location"""
+    return [
+        geo.encode(map_key[0], map_key[1])
+        for map_key in map_keys
+        if map_key is not None and map_key[0] is not None and map_key[1] is not None
+    ]
+
+
+def _analysis_regions(*keys):
+    """Return the geohashes of the located images the given AnalysisResult keys belong to"""
+    image_record_ids = {key[0] for key in keys if key}
+    if not image_record_ids:
+        return []
+    return list(
+        ImageRecord.objects.filter(id__in=image_record_ids).exclude(geohash='').values_list('geohash', flat=True)
+    )
+
+
+@receiver(post_save, sender=ImageRecord)
+def update_image_map(sender, instance, created, **kwargs):
+    """Invalidate the cached map tiles around a record whose position or displayed fields changed"""
+    old_key = None if created else getattr(instance, '_map_loaded', None)
+    new_key = instance.map_key()
+    if old_key != new_key:
+        regions = _map_regions(old_key, new_key)
+        if regions:
+            bump_map_version(*regions)
+    instance._map_loaded = new_key
+
+
+@receiver(post_delete, sender=ImageRecord)
+def remove_image_map(sender, instance, **kwargs):
+    """Invalidate the cached map tiles around a deleted record"""
+    regions = _map_regions(getattr(instance, '_map_loaded', instance.map_key()))
+    if regions:
+        bump_map_version(*regions)
+
+
+@receiver(post_save, sender=ImageRecord)
+def update_image_rollup(sender, instance, created, update_fields=None, **kwargs):
+    """Apply an ImageRecord's status/owner change to the dashboard rollups"""
+    if update_fields is not None and not {'status', 'user'} & set(update_fields):
+        return
+
+    old_key = None if created else getattr(instance, '_rollup_loaded', None)
+    new_key = instance.rollup_key()
+    if old_key != new_key:
+        rollup.apply_deltas(removed=_image_contributions(old_key), added=_image_contributions(new_key))
+    instance._rollup_loaded = new_key
+
+
+@receiver(post_delete, sender=ImageRecord)
+def remove_image_rollup(sender, instance, **kwargs):
+    """Remove a deleted ImageRecord from the dashboard rollups"""
+    rollup.apply_deltas(removed=_image_contributions(getattr(instance, '_rollup_loaded', instance.rollup_key())))
+
+
+@receiver(post_save, sender='analysis.AnalysisResult')
+def update_analysis_rollup(sender, instance, created, **kwargs):
+    """Apply a new or changed AnalysisResult to the dashboard rollups"""
+    old_key = None if created else getattr(instance, '_rollup_loaded', None)
+    new_key = instance.rollup_key()
+    if old_key != new_key:
+        rollup.apply_deltas(
+            removed=_analysis_contributions(old_key),
+            added=_analysis_contributions(new_key, instance),
+        )
+    # Map tiles show the image, defect type and condition label, not the score
+    if old_key is None or new_key is None or old_key[:3] != new_key[:3]:
+        regions = _analysis_regions(old_key, new_key)
+        if regions:
+            bump_map_version(*regions)
+    instance._rollup_loaded = new_key
+
+
+@receiver(post_delete, sender='analysis.AnalysisResult')
+def remove_analysis_rollup(sender, instance, **kwargs):
+    """Remove a deleted AnalysisResult from the dashboard rollups"""
+    key = getattr(instance, '_rollup_loaded', instance.rollup_key())
+    rollup.apply_deltas(removed=_analysis_contributions(key, instance))
+    regions = _analysis_regions(key)
+    if regions:
+        bump_map_version(*regions)
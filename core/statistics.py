@@ -0,0 +1,74 @@
+"""
+Dashboard statistics for ImageRecord querysets.
+
+All totals come from a single grouped query (one row per combination of
+status, defect type and condition label), so the dashboard and the
+statistics API cost one database round-trip regardless of how many
+buckets they report. Defect types and condition labels are counted by
+their stored values: every choice is listed, with zeros where nothing
+matched, followed by any value the model returned that is not one of the
+choices.
+"""
+
+from collections import Counter
+
+from django.db.models import Count, Sum
+
+from analysis.models import AnalysisResult
+from .models import ImageRecord
+
+
+def breakdown(counts, choices, field):
+    """
+    Turn per-value counts into a chart list.
+
+    Args:
+        counts: Mapping of stored value to count
+        choices: Model field choices, listed first and in order, with zeros
+        field: Name of the value key in each entry
+
+    Returns:
+        List of {field: value, 'count': count}
+    """
+    known = [value for value, _ in choices]
+    extra = sorted(value for value, count in counts.items() if value not in known and count)
+    return [{field: value, 'count': counts.get(value, 0)} for value in known + extra]
+
+
+def get_image_statistics(images):
+    """
+    Compute status totals, defect and condition counts and average severity.
+
+    Args:
+        images: QuerySet of ImageRecord instances (filters are respected)
+
+    Returns:
+        Dictionary with total/analyzed/pending/processing/failed image counts,
+        defect_stats and severity_stats lists ([{'defect_type': ..., 'count': ...}],
+        [{'condition_label': ..., 'count': ...}]) and avg_severity
+    """
+    rows = images.order_by().values(
+        'status', 'analysis__defect_type', 'analysis__condition_label'
+    ).annotate(
+        images=Count('id'),
+        results=Count('analysis'),
+        severity_total=Sum('analysis__severity_score'),
+    )
+
+    statuses, defects, conditions = Counter(), Counter(), Counter()
+    severity_count, severity_total = 0, 0.0
+    for row in rows:
+        statuses[row['status']] += row['images']
+        if row['results']:
+            defects[row['analysis__defect_type']] += row['results']
+            conditions[row['analysis__condition_label']] += row['results']
+            severity_count += row['results']
+            severity_total += row['severity_total'] or 0.0
+
+    stats = {'total_images': sum(statuses.values())}
+    for status, _ in ImageRecord.STATUS_CHOICES:
+        stats[f'{status}_images'] = statuses[status]
+    stats['defect_stats'] = breakdown(defects, AnalysisResult.DEFECT_TYPE_CHOICES, 'defect_type')
+    stats['severity_stats'] = breakdown(conditions, AnalysisResult.CONDITION_CHOICES, 'condition_label')
+    stats['avg_severity'] = round(severity_total / severity_count, 2) if severity_count else 0
+    return stats
@@ -3,6 +3,8 @@ Custom template tags for core app
 """
 from django import template
 
+from core.thumbnails import derivative_url
+
 register = template.Library()
 
 @register.filter
@@ -12,3 +14,9 @@ def multiply(value, arg):
         return float(value) * float(arg)
     except (ValueError, TypeError):
         return ''
+
+
+@register.filter
+def thumbnail(image_file, preset='thumb'):
+    """URL of a downscaled copy of an image field (see core.thumbnails)"""
+    return derivative_url(image_file, preset)
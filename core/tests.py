@@ -1,4 +1,1053 @@
 # Django test module
-from django.test import TestCase
+import io
+import math
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import cv2
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageDraw, ImageFilter
+
+from accounts.models import User
+from analysis.models import AnalysisResult
+from analysis.tasks import analyze_image_batch_task, enqueue_analysis
+from . import checks, dedup, geo, image_metadata, map_tiles, perceptual_hash, thumbnails
+from .models import DashboardRollup, ImageRecord
+from .rollup import compute_rollup_rows, get_rollup_statistics, stored_rollup_rows
+from .statistics import get_image_statistics
+
+
+def make_png(width=1, height=1):
+    """Return the bytes of a small solid-colour PNG"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (90, 90, 90)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def make_frame(seed, format='JPEG', quality=90, brightness=0):
+    """Return the bytes of a textured 640x480 frame; the same seed gives the same scene"""
+    rng = random.Random(seed)
+    img = Image.new('L', (640, 480), 128)
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rng.randrange(640), rng.randrange(480)
+        w, h = rng.randrange(40, 240), rng.randrange(40, 180)
+        draw.ellipse((x, y, x + w, y + h), fill=rng.randrange(256))
+    img = img.filter(ImageFilter.GaussianBlur(4)).point(lambda v: min(v + brightness, 255))
+
+    buffer = io.BytesIO()
+    img.convert('RGB').save(buffer, format=format, quality=quality)
+    return buffer.getvalue()
+
+
+def make_exif_jpeg(width=64, height=48):
+    """Return the bytes of a JPEG whose EXIF block records orientation, GPS and capture time"""
+    exif = Image.Exif()
+    exif[image_metadata.ORIENTATION] = 6
+    exif[image_metadata.GPS_IFD] = {
+        image_metadata.GPS_LATITUDE_REF: 'S',
+        image_metadata.GPS_LATITUDE: (6.0, 55.0, 37.56),
+        image_metadata.GPS_LONGITUDE_REF: 'E',
+        image_metadata.GPS_LONGITUDE: (79.0, 51.0, 40.32),
+    }
+    exif[image_metadata.EXIF_IFD] = {
+        image_metadata.DATETIME_ORIGINAL: '2026:10:01 08:30:00',
+        image_metadata.OFFSET_TIME_ORIGINAL: '+05:30',
+    }
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (90, 90, 90)).save(buffer, format='JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class ImageFixturesTestCase(TestCase):
+    """Base test case with a temporary MEDIA_ROOT and a small set of images"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='engineer', email='engineer@example.com', password='pass', role='engineer'
+        )
+        self.other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='engineer'
+        )
+
+        self.create_image(self.user, 'pending')
+        self.create_image(self.user, 'processing')
+        self.create_image(self.user, 'failed')
+        self.create_analyzed(self.user, 'crack', 'poor', 60)
+        self.create_analyzed(self.user, 'crack', 'critical', 90)
+        self.create_analyzed(self.user, 'no_defect', 'good', 10)
+        self.create_analyzed(self.other, 'pothole', 'critical', 80)
+
+    def create_image(self, user, status='pending', title='Road'):
+        return ImageRecord.objects.create(
+            user=user,
+            image=SimpleUploadedFile('road.png', make_png(), content_type='image/png'),
+            title=title,
+            status=status,
+        )
+
+    def create_analyzed(self, user, defect_type, condition_label, severity):
+        image = self.create_image(user, 'analyzed')
+        return AnalysisResult.objects.create(
+            image_record=image,
+            defect_type=defect_type,
+            condition_label=condition_label,
+            severity_score=severity,
+            ai_confidence=0.9,
+        )
+
+
+class StatisticsTestCase(ImageFixturesTestCase):
+    """Dashboard statistics service and the views that use it"""
+
+    def test_statistics_use_a_single_query(self):
+        with self.assertNumQueries(1):
+            stats = get_image_statistics(ImageRecord.objects.filter(user=self.user))
+
+        self.assertEqual(stats['total_images'], 6)
+        self.assertEqual(stats['analyzed_images'], 3)
+        self.assertEqual(stats['pending_images'], 1)
+        self.assertEqual(stats['processing_images'], 1)
+        self.assertEqual(stats['failed_images'], 1)
+        self.assertEqual(stats['avg_severity'], 53.33)
+        self.assertEqual(stats['defect_stats'], [
+            {'defect_type': 'crack', 'count': 2},
+            {'defect_type': 'pothole', 'count': 0},
+            {'defect_type': 'rough_surface', 'count': 0},
+            {'defect_type': 'alligator_crack', 'count': 0},
+            {'defect_type': 'edge_crack', 'count': 0},
+            {'defect_type': 'joint_crack', 'count': 0},
+            {'defect_type': 'no_defect', 'count': 1},
+        ])
+        self.assertEqual(stats['severity_stats'], [
+            {'condition_label': 'good', 'count': 1},
+            {'condition_label': 'moderate', 'count': 0},
+            {'condition_label': 'poor', 'count': 1},
+            {'condition_label': 'critical', 'count': 1},
+        ])
+
+    def test_statistics_respect_queryset_filters(self):
+        stats = get_image_statistics(ImageRecord.objects.filter(status='analyzed'))
+
+        self.assertEqual(stats['total_images'], 4)
+        self.assertEqual(stats['pending_images'], 0)
+        self.assertEqual(stats['avg_severity'], 60.0)
+
+    def test_statistics_for_empty_queryset(self):
+        stats = get_image_statistics(ImageRecord.objects.none())
+
+        self.assertEqual(stats['total_images'], 0)
+        self.assertEqual(stats['avg_severity'], 0)
+        self.assertEqual(sum(row['count'] for row in stats['defect_stats']), 0)
+        self.assertEqual(len(stats['defect_stats']), len(AnalysisResult.DEFECT_TYPE_CHOICES))
+
+    def test_statistics_count_defect_types_outside_the_choices(self):
+        # Gemini may return a defect type the model choices do not list
+        self.create_analyzed(self.user, 'rutting', 'moderate', 40)
+
+        stats = get_image_statistics(ImageRecord.objects.filter(user=self.user))
+
+        self.assertEqual(stats['defect_stats'][-1], {'defect_type': 'rutting', 'count': 1})
+        self.assertEqual(sum(row['count'] for row in stats['defect_stats']), stats['analyzed_images'])
+        self.assertEqual(stats, get_rollup_statistics(self.user))
+
+    def test_filtered_dashboard_uses_live_statistics(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('dashboard'), {'status': 'analyzed'})
+
+        self.assertEqual(response.context['total_images'], 3)
+        self.assertEqual(response.context['pending_images'], 0)
+
+    def test_dashboard_query_count(self):
+        self.client.force_login(self.user)
+
+        # session, user, statistics, recent images, prefetched analyses
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_images'], 6)
+        self.assertEqual(response.context['avg_severity'], 53.33)
+
+    def test_statistics_endpoint_query_count(self):
+        self.client.force_login(self.user)
+
+        # session, user, statistics
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/core/images/statistics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_images'], 6)
+        self.assertEqual(response.json()['analyzed_images'], 3)
+
+
+class DashboardRollupTestCase(ImageFixturesTestCase):
+    """Incremental maintenance of DashboardRollup"""
+
+    def assertRollupsConsistent(self):
+        expected = {key: value for key, value in compute_rollup_rows().items() if value[0] or value[1]}
+        self.assertEqual(stored_rollup_rows(), expected)
+
+    def test_rollup_matches_live_statistics(self):
+        self.assertEqual(
+            get_rollup_statistics(self.user),
+            get_image_statistics(ImageRecord.objects.filter(user=self.user)),
+        )
+        self.assertEqual(
+            get_rollup_statistics(),
+            get_image_statistics(ImageRecord.objects.all()),
+        )
+
+    def test_rollup_read_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            get_rollup_statistics(self.user)
+
+    def test_status_transitions_are_tracked(self):
+        image = ImageRecord.objects.get(user=self.user, status='pending')
+        image.status = 'processing'
+        image.save(update_fields=['status', 'updated_date'])
+
+        stats = get_rollup_statistics(self.user)
+        self.assertEqual(stats['pending_images'], 0)
+        self.assertEqual(stats['processing_images'], 2)
+        self.assertRollupsConsistent()
+
+    def test_reanalysis_moves_counts(self):
+        analysis = AnalysisResult.objects.get(image_record__user=self.user, condition_label='good')
+        analysis.defect_type = 'pothole'
+        analysis.condition_label = 'critical'
+        analysis.severity_score = 95
+        analysis.save()
+
+        stats = get_rollup_statistics(self.user)
+        self.assertIn({'condition_label': 'critical', 'count': 2}, stats['severity_stats'])
+        self.assertIn({'condition_label': 'good', 'count': 0}, stats['severity_stats'])
+        self.assertRollupsConsistent()
+
+    def test_deletes_are_tracked(self):
+        AnalysisResult.objects.filter(image_record__user=self.user, defect_type='crack').first().image_record.delete()
+        ImageRecord.objects.filter(user=self.user, status='failed').delete()
+
+        self.assertEqual(get_rollup_statistics(self.user)['total_images'], 4)
+        self.assertRollupsConsistent()
+
+    def test_deleting_a_user_keeps_global_totals(self):
+        user_id = self.user.id
+        self.user.delete()
+
+        self.assertFalse(DashboardRollup.objects.filter(user_id=user_id).exists())
+        stats = get_rollup_statistics()
+        self.assertEqual(stats['total_images'], 1)
+        self.assertEqual(stats['analyzed_images'], 1)
+        self.assertEqual(stats, get_image_statistics(ImageRecord.objects.all()))
+        self.assertRollupsConsistent()
+
+    def test_location_change_invalidates_map_tiles(self):
+        image = ImageRecord.objects.get(user=self.user, status='pending')
+
+        with mock.patch('core.signals.bump_map_version') as bump:
+            image.title = 'Renamed'
+            image.save(update_fields=['title'])
+            bump.assert_not_called()
+
+            image.latitude, image.longitude = Decimal('51.500000'), Decimal('-0.120000')
+            image.save(update_fields=['latitude', 'longitude'])
+            bump.assert_called_once()
+
+    def test_rebuild_command_repairs_drift(self):
+        DashboardRollup.objects.filter(dimension='status').update(count=0)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_dashboard_rollup', '--verify-only', stdout=io.StringIO(), stderr=io.StringIO())
+
+        call_command('rebuild_dashboard_rollup', stdout=io.StringIO())
+        self.assertRollupsConsistent()
+
+    def test_admin_is_read_only(self):
+        superuser = User.objects.create_superuser(
+            username='root', email='root@example.com', password='pass'
+        )
+        self.client.force_login(superuser)
+        row = DashboardRollup.objects.filter(user=self.user).first()
+        before = stored_rollup_rows()
+
+        self.assertEqual(self.client.get(reverse('admin:core_dashboardrollup_changelist')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('admin:core_dashboardrollup_add')).status_code, 403)
+        response = self.client.post(reverse('admin:core_dashboardrollup_change', args=[row.pk]), {'count': 999})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(reverse('admin:core_dashboardrollup_delete', args=[row.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(stored_rollup_rows(), before)
+
+
+class SpatialLookupTestCase(ImageFixturesTestCase):
+    """Geohash column and the within_bbox/within_radius queryset helpers"""
+
+    POINTS = [
+        (40.7128, -74.0060),   # Manhattan
+        (40.7306, -73.9352),   # Brooklyn, ~6 km east
+        (40.6892, -74.0445),   # Liberty Island, ~4 km south-west
+        (51.5074, -0.1278),    # London
+        (-33.8688, 151.2093),  # Sydney
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.located = []
+        for lat, lng in self.POINTS:
+            image = self.create_image(self.user)
+            image.latitude, image.longitude = lat, lng
+            image.save(update_fields=['latitude', 'longitude'])
+            self.located.append(image)
+
+    def test_geohash_encoding(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        image = ImageRecord.objects.get(pk=self.located[0].pk)
+        self.assertEqual(image.geohash, geo.encode(40.7128, -74.0060))
+
+    def test_cover_contains_every_point_in_box(self):
+        box = (40.70, -74.02, 40.74, -73.93)
+        prefixes = geo.cover(*box)
+        self.assertLessEqual(len(prefixes), 32)
+        for lat in (40.70, 40.72, 40.74):
+            for lng in (-74.02, -73.97, -73.93):
+                self.assertTrue(any(geo.encode(lat, lng).startswith(p) for p in prefixes))
+
+    def test_within_bbox(self):
+        found = ImageRecord.objects.within_bbox(40.70, -74.02, 40.74, -73.93)
+        self.assertEqual(set(found), {self.located[0], self.located[1]})
+
+    def test_within_radius(self):
+        found = list(ImageRecord.objects.within_radius(40.7128, -74.0060, 5).order_by('distance_km'))
+
+        self.assertEqual(found, [self.located[0], self.located[2]])
+        self.assertAlmostEqual(found[0].distance_km, 0, places=3)
+        self.assertAlmostEqual(found[1].distance_km, 4.0, delta=0.3)
+
+    def test_location_api_filters(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get('/api/core/images/', {'near': '51.5,-0.12', 'radius_km': 10})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.located[3].id])
+
+        response = self.client.get('/api/core/images/', {'bbox': 'bad'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_backfill_command(self):
+        ImageRecord.objects.update(geohash='')
+
+        call_command('backfill_geohash', stdout=io.StringIO())
+
+        self.assertEqual(ImageRecord.objects.within_bbox(-90, -180, 90, 180).count(), len(self.POINTS))
+
+
+class ThumbnailTestCase(ImageFixturesTestCase):
+    """Cached downscaled derivatives of uploaded images"""
+
+    def setUp(self):
+        super().setUp()
+        buffer = io.BytesIO()
+        Image.new('RGB', (4000, 3000), (120, 110, 100)).save(buffer, format='JPEG')
+        self.image = ImageRecord.objects.create(
+            user=self.user,
+            image=SimpleUploadedFile('large.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            status='analyzed',
+        )
+
+    def test_derivative_is_stored_next_to_original(self):
+        name = thumbnails.get_derivative(self.image.image, 'thumb')
+
+        self.assertEqual(os.path.dirname(name), os.path.dirname(self.image.image.name))
+        self.assertTrue(name.endswith('.thumb.jpg'))
+        with Image.open(self.image.image.storage.path(name)) as derivative:
+            self.assertEqual(derivative.size, (640, 480))
+
+    def test_same_stem_sources_get_separate_derivatives(self):
+        images = {}
+        for name, color, image_format in (('road.jpg', (200, 30, 30), 'JPEG'), ('road.png', (30, 30, 200), 'PNG')):
+            buffer = io.BytesIO()
+            Image.new('RGB', (800, 600), color).save(buffer, format=image_format)
+            images[color] = ImageRecord.objects.create(
+                user=self.user, image=SimpleUploadedFile(name, buffer.getvalue()), status='analyzed',
+            )
+
+        names = {color: thumbnails.get_derivative(image.image, 'thumb') for color, image in images.items()}
+
+        self.assertEqual(len(set(names.values())), 2)
+        for color, name in names.items():
+            self.assertTrue(name.endswith(os.path.basename(images[color].image.name) + '.thumb.jpg'))
+            with Image.open(images[color].image.storage.path(name)) as derivative:
+                pixel = derivative.convert('RGB').getpixel((10, 10))
+            self.assertTrue(all(abs(a - b) < 10 for a, b in zip(pixel, color)), (pixel, color))
+
+    def test_derivative_is_reused_until_source_changes(self):
+        storage = self.image.image.storage
+        name = thumbnails.get_derivative(self.image.image, 'report')
+        path = storage.path(name)
+        os.utime(path, (2000000000, 2000000000))
+
+        self.assertEqual(thumbnails.get_derivative(self.image.image, 'report'), name)
+        self.assertEqual(os.path.getmtime(path), 2000000000)
+
+        # Source newer than the derivative: regenerate
+        os.utime(storage.path(self.image.image.name), (2000000100, 2000000100))
+        self.assertEqual(thumbnails.get_derivative(self.image.image, 'report'), name)
+        self.assertNotEqual(os.path.getmtime(path), 2000000000)
+
+    def test_image_list_uses_thumbnails(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('image_list'))
+
+        self.assertContains(response, '.thumb.jpg')
+        self.assertNotContains(response, 'large.jpg"')
+
+    def test_unreadable_source_falls_back_to_original(self):
+        image = self.create_image(self.user)
+        with open(image.image.path, 'wb') as broken:
+            broken.write(b'not an image')
+
+        self.assertIsNone(thumbnails.get_derivative(image.image, 'thumb'))
+        self.assertEqual(thumbnails.derivative_url(image.image, 'thumb'), image.image.url)
+
+
+class DuplicateFrameTestCase(ImageFixturesTestCase):
+    """Perceptual hashing and reuse of near-duplicate frames' analysis"""
+
+    def create_frame(self, frame, user=None, latitude=None, longitude=None, **fields):
+        return ImageRecord.objects.create(
+            user=user or self.user,
+            image=SimpleUploadedFile('frame.jpg', frame, content_type='image/jpeg'),
+            title='Frame',
+            latitude=latitude,
+            longitude=longitude,
+            **fields
+        )
+
+    def create_hashed_frame(self, frame, **fields):
+        """Create a frame with its perceptual hash already stored, as analysis leaves it"""
+        record = self.create_frame(frame, **fields)
+        record.set_phash(perceptual_hash.file_dhash(record.image.path))
+        record.save(update_fields=['phash', *perceptual_hash.CHUNK_FIELDS])
+        return record
+
+    def create_analysis(self, record):
+        return AnalysisResult.objects.create(
+            image_record=record,
+            defect_type='pothole',
+            condition_label='critical',
+            severity_score=82,
+            ai_confidence=0.9,
+            analysis_metadata={'model': 'test'},
+        )
+
+    def test_hash_survives_reencoding(self):
+        original = perceptual_hash.file_dhash(io.BytesIO(make_frame(1)))
+        reencoded = perceptual_hash.file_dhash(io.BytesIO(make_frame(1, 'JPEG', quality=60, brightness=8)))
+        png = perceptual_hash.file_dhash(io.BytesIO(make_frame(1, 'PNG')))
+        other = perceptual_hash.file_dhash(io.BytesIO(make_frame(2)))
+
+        self.assertLessEqual(perceptual_hash.hamming(original, reencoded), 6)
+        self.assertLessEqual(perceptual_hash.hamming(original, png), 6)
+        self.assertGreater(perceptual_hash.hamming(original, other), 6)
+        self.assertIsNone(perceptual_hash.file_dhash(io.BytesIO(b'not an image')))
+
+    def test_analysis_stores_hash_and_chunks(self):
+        record = self.create_frame(make_frame(1))
+        self.assertEqual(record.phash, '')
+
+        enqueue_analysis(record.id)
+
+        record.refresh_from_db()
+        value = int(record.phash, 16)
+        self.assertLessEqual(perceptual_hash.hamming(value, perceptual_hash.file_dhash(record.image.path)), 2)
+        self.assertEqual(
+            [getattr(record, field) for field in perceptual_hash.CHUNK_FIELDS],
+            perceptual_hash.split(value),
+        )
+
+    def test_candidates_include_every_hash_within_distance(self):
+        base = 0x0123456789ABCDEF
+        # Flipped bits spread over the chunks, the worst case for the lookup
+        flips = {
+            0: [],
+            3: [0, 16, 32],
+            6: [0, 1, 16, 17, 32, 48],
+            8: [0, 1, 16, 17, 32, 33, 48, 49],
+        }
+        records = {}
+        for distance, bits in flips.items():
+            value = base
+            for bit in bits:
+                value ^= 1 << bit
+            record = self.create_image(self.user)
+            record.set_phash(value)
+            record.save(update_fields=['phash', *perceptual_hash.CHUNK_FIELDS])
+            records[distance] = record
+
+        candidates = set(ImageRecord.objects.phash_candidates(base, 6))
+
+        for distance in (0, 3, 6):
+            self.assertIn(records[distance], candidates)
+        self.assertNotIn(records[8], candidates)
+
+    def test_find_duplicate_respects_user_window_and_location(self):
+        source = self.create_hashed_frame(make_frame(1), latitude=6.9271, longitude=79.8612)
+        self.create_analysis(source)
+
+        nearby = self.create_hashed_frame(make_frame(1, quality=60), latitude=6.9272, longitude=79.8612)
+        self.assertEqual(dedup.find_duplicate(nearby)[0], source)
+
+        far = self.create_hashed_frame(make_frame(1, quality=60), latitude=6.9371, longitude=79.8612)
+        self.assertIsNone(dedup.find_duplicate(far))
+
+        no_location = self.create_hashed_frame(make_frame(1, quality=60))
+        self.assertIsNone(dedup.find_duplicate(no_location))
+
+        other_user = self.create_hashed_frame(make_frame(1, quality=60), user=self.other, latitude=6.9272, longitude=79.8612)
+        self.assertIsNone(dedup.find_duplicate(other_user))
+
+        different = self.create_hashed_frame(make_frame(2), latitude=6.9272, longitude=79.8612)
+        self.assertIsNone(dedup.find_duplicate(different))
+
+        later = self.create_hashed_frame(make_frame(1, quality=60), latitude=6.9272, longitude=79.8612)
+        ImageRecord.objects.filter(pk=later.pk).update(upload_date=source.upload_date + timedelta(hours=1))
+        later.refresh_from_db()
+        self.assertIsNone(dedup.find_duplicate(later))
+
+    def test_analysis_reuses_near_duplicate_result(self):
+        source = self.create_hashed_frame(make_frame(1))
+        self.create_analysis(source)
+        frame = self.create_frame(make_frame(1, quality=60, brightness=8))
+
+        enqueue_analysis(frame.id)
+
+        frame.refresh_from_db()
+        self.assertEqual(frame.status, 'analyzed')
+        self.assertEqual(frame.duplicate_of, source)
+        self.assertEqual(frame.analysis.defect_type, 'pothole')
+        self.assertEqual(frame.analysis.severity_score, 82)
+        self.assertEqual(frame.analysis.analysis_metadata['model'], 'test')
+        self.assertEqual(frame.analysis.analysis_metadata['duplicate']['of'], source.id)
+
+        # A duplicate of the duplicate links to the frame that was analyzed
+        third = self.create_frame(make_frame(1, quality=75))
+        enqueue_analysis(third.id)
+        third.refresh_from_db()
+        self.assertEqual(third.duplicate_of, source)
+
+    @override_settings(DEDUP_ENABLED=False)
+    def test_dedup_can_be_disabled(self):
+        source = self.create_hashed_frame(make_frame(1))
+        self.create_analysis(source)
+        frame = self.create_frame(make_frame(1, quality=60))
+
+        enqueue_analysis(frame.id)
+
+        frame.refresh_from_db()
+        self.assertIsNone(frame.duplicate_of)
+        self.assertNotIn('duplicate', frame.analysis.analysis_metadata)
+
+    def test_reanalysis_runs_the_detector(self):
+        source = self.create_hashed_frame(make_frame(1))
+        self.create_analysis(source)
+        frame = self.create_frame(make_frame(1, quality=60))
+        enqueue_analysis(frame.id)
+
+        enqueue_analysis(frame.id, link_duplicates=False)
+
+        frame.refresh_from_db()
+        frame.analysis.refresh_from_db()
+        self.assertIsNone(frame.duplicate_of)
+        self.assertNotIn('duplicate', frame.analysis.analysis_metadata)
+
+    def test_batch_analyzes_one_frame_per_duplicate_group(self):
+        first = self.create_frame(make_frame(1))
+        repeat = self.create_frame(make_frame(1, quality=60))
+        different = self.create_frame(make_frame(2))
+
+        result = analyze_image_batch_task([first.id, repeat.id, different.id])
+
+        self.assertEqual(result['status'], 'success')
+        for record in (first, repeat, different):
+            record.refresh_from_db()
+            self.assertEqual(record.status, 'analyzed')
+        self.assertIsNone(first.duplicate_of)
+        self.assertEqual(repeat.duplicate_of, first)
+        self.assertIsNone(different.duplicate_of)
+        self.assertEqual(repeat.analysis.defect_type, first.analysis.defect_type)
+        self.assertNotIn('duplicate', different.analysis.analysis_metadata)
+
+    def test_backfill_phash(self):
+        record = self.create_frame(make_frame(1))
+
+        call_command('backfill_phash', stdout=io.StringIO())
+
+        record.refresh_from_db()
+        self.assertEqual(record.phash, perceptual_hash.to_hex(perceptual_hash.file_dhash(io.BytesIO(make_frame(1)))))
+        self.assertIsNotNone(record.phash_0)
+
+
+class ImageMetadataTestCase(ImageFixturesTestCase):
+    """Header-only metadata extraction and the single decode per upload"""
+
+    def test_reads_exif_without_decoding(self):
+        with mock.patch('PIL.Image._getdecoder', wraps=Image._getdecoder) as pil_decoder:
+            metadata = image_metadata.read_image_metadata(io.BytesIO(make_exif_jpeg()))
+
+        self.assertEqual(pil_decoder.call_count, 0)
+        self.assertEqual(metadata, {
+            'width': 64,
+            'height': 48,
+            'orientation': 6,
+            'latitude': Decimal('-6.927100'),
+            'longitude': Decimal('79.861200'),
+            'captured_at': datetime(2026, 10, 1, 3, 0, tzinfo=timezone.utc),
+        })
+
+    def test_missing_or_unreadable_metadata(self):
+        metadata = image_metadata.read_image_metadata(io.BytesIO(make_png(4, 3)))
+        self.assertEqual((metadata['width'], metadata['height']), (4, 3))
+        self.assertIsNone(metadata['orientation'])
+        self.assertIsNone(metadata['latitude'])
+        self.assertIsNone(metadata['captured_at'])
+
+        self.assertIsNone(image_metadata.read_image_metadata(io.BytesIO(b'not an image')))
+
+    def test_save_stores_header_metadata(self):
+        record = ImageRecord.objects.create(
+            user=self.user,
+            image=SimpleUploadedFile('road.jpg', make_exif_jpeg(), content_type='image/jpeg'),
+        )
+
+        self.assertEqual((record.image_width, record.image_height), (64, 48))
+        self.assertEqual(record.orientation, 6)
+        self.assertEqual(record.captured_at, datetime(2026, 10, 1, 3, 0, tzinfo=timezone.utc))
+        # EXIF GPS fills in the missing location
+        self.assertEqual((record.latitude, record.longitude), (Decimal('-6.927100'), Decimal('79.861200')))
+        self.assertEqual(record.geohash, geo.encode(record.latitude, record.longitude))
+
+        entered = ImageRecord.objects.create(
+            user=self.user,
+            image=SimpleUploadedFile('road.jpg', make_exif_jpeg(), content_type='image/jpeg'),
+            latitude=Decimal('7.0'),
+            longitude=Decimal('80.0'),
+        )
+        self.assertEqual((entered.latitude, entered.longitude), (Decimal('7.0'), Decimal('80.0')))
+
+    def test_upload_decodes_image_once(self):
+        self.client.force_login(self.user)
+
+        with mock.patch('cv2.imread', wraps=cv2.imread) as imread, \
+                mock.patch('PIL.Image._getdecoder', wraps=Image._getdecoder) as pil_decoder:
+            response = self.client.post(reverse('upload_image'), {
+                'image': SimpleUploadedFile('road.jpg', make_frame(7), content_type='image/jpeg'),
+                'title': 'Frame',
+            })
+
+        record = ImageRecord.objects.get(title='Frame')
+        self.assertRedirects(response, reverse('image_detail', args=[record.pk]), fetch_redirect_response=False)
+        self.assertEqual(record.status, 'analyzed')
+        self.assertNotEqual(record.phash, '')
+        self.assertEqual((record.image_width, record.image_height), (640, 480))
+        # One full decode for the detector, one reduced draft decode for the
+        # hash; header reads and the JPEG-encoded annotation decode nothing
+        self.assertEqual(imread.call_count, 1)
+        self.assertEqual(pil_decoder.call_count, 1)
+
+    @override_settings(DEDUP_ENABLED=False)
+    def test_result_cache_hit_skips_full_decode(self):
+        self.client.force_login(self.user)
+        frame = make_frame(8)
+        self.client.post(reverse('upload_image'), {
+            'image': SimpleUploadedFile('first.jpg', frame, content_type='image/jpeg'),
+            'title': 'First',
+        })
+
+        with mock.patch('cv2.imread', wraps=cv2.imread) as imread:
+            self.client.post(reverse('upload_image'), {
+                'image': SimpleUploadedFile('again.jpg', frame, content_type='image/jpeg'),
+                'title': 'Again',
+            })
+
+        record = ImageRecord.objects.get(title='Again')
+        self.assertEqual(record.status, 'analyzed')
+        self.assertNotEqual(record.phash, '')
+        self.assertEqual(imread.call_count, 0)
+
+
+class ImageStatusViewTestCase(ImageFixturesTestCase):
+    """JSON status endpoint polled by the image detail page"""
+
+    def test_owner_sees_status(self):
+        image = ImageRecord.objects.filter(user=self.user, status='analyzed').first()
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('image_status', args=[image.pk]))
+
+        self.assertEqual(response.json(), {
+            'id': image.pk,
+            'status': 'analyzed',
+            'status_display': image.get_status_display(),
+            'has_analysis': True,
+        })
+
+    def test_pending_image_has_no_analysis(self):
+        image = ImageRecord.objects.get(user=self.user, status='pending')
+        self.client.force_login(self.user)
+
+        data = self.client.get(reverse('image_status', args=[image.pk])).json()
+
+        self.assertEqual(data['status'], 'pending')
+        self.assertFalse(data['has_analysis'])
+
+    def test_other_users_image_is_forbidden(self):
+        image = ImageRecord.objects.filter(user=self.other).first()
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.client.get(reverse('image_status', args=[image.pk])).status_code, 403)
+
+        admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass', role='admin'
+        )
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(reverse('image_status', args=[image.pk])).status_code, 200)
+
+    def test_requires_login(self):
+        image = ImageRecord.objects.filter(user=self.user).first()
+
+        response = self.client.get(reverse('image_status', args=[image.pk]))
+
+        self.assertEqual(response.status_code, 302)
+
+
+def make_zip(members):
+    """Return an in-memory ZIP upload holding {name: bytes}"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return SimpleUploadedFile('survey.zip', buffer.getvalue(), content_type='application/zip')
+
+
+class BulkUploadTestCase(ImageFixturesTestCase):
+    """ZIP and multi-file ingestion through the bulk upload API"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse('image-bulk-upload')
+
+    def upload(self, **data):
+        return self.client.post(self.url, data)
+
+    def test_multipart_upload_analyzes_each_file(self):
+        response = self.upload(images=[
+            SimpleUploadedFile('a.png', make_png(), content_type='image/png'),
+            SimpleUploadedFile('b.jpg', make_frame(3), content_type='image/jpeg'),
+        ], location_name='Main St')
+
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual((job['total_files'], job['accepted_files']), (2, 2))
+        self.assertEqual(job['analysis_status']['analyzed'], 2)
+        self.assertEqual([f['name'] for f in job['files']], ['a', 'b'])
+        self.assertTrue(all(f['status'] == 'analyzed' for f in job['files']))
+
+        records = ImageRecord.objects.filter(upload_job_id=job['id'])
+        self.assertEqual({r.location_name for r in records}, {'Main St'})
+        self.assertEqual(records.get(title='b').image_width, 640)
+
+    def test_zip_upload_reports_rejected_members(self):
+        archive = make_zip({
+            'survey/road1.png': make_png(),
+            'survey/road2.jpg': make_frame(4),
+            'survey/notes.txt': b'not an image',
+            '__MACOSX/survey/._road1.png': b'resource fork',
+            '../../etc/passwd': b'root:x:0:0',
+            '../../escape.png': make_png(),
+        })
+
+        with mock.patch('analysis.tasks.enqueue_analysis_batch'):
+            job = self.upload(archive=archive).json()
+
+        self.assertEqual(job['total_files'], 5)
+        self.assertEqual(job['accepted_files'], 3)
+        rejected = {f['name']: f for f in job['files'] if f['status'] == 'rejected'}
+        self.assertEqual(set(rejected), {'notes.txt', 'passwd'})
+        self.assertEqual(rejected['notes.txt']['error'], 'Only JPEG and PNG images are allowed.')
+        self.assertIsNone(rejected['passwd']['image_id'])
+
+        # Directories in member names are dropped, so nothing lands outside upload_to
+        for record in ImageRecord.objects.filter(upload_job_id=job['id']):
+            self.assertTrue(record.image.name.startswith('road_images/'))
+            self.assertNotIn('..', record.image.name)
+            self.assertTrue(os.path.realpath(record.image.path).startswith(os.path.realpath(self.media_root)))
+
+    def test_corrupt_member_is_rejected_and_the_rest_ingested(self):
+        archive = make_zip({'a.png': make_png(), 'b.jpg': make_frame(3), 'c.png': make_png(12, 8)})
+        data = bytearray(archive.read())
+        # Damage b.jpg's compressed data so it fails its CRC check mid-stream
+        offset = data.index(b'b.jpg') + len('b.jpg') + 200
+        data[offset:offset + 64] = bytes(64)
+        archive = SimpleUploadedFile('survey.zip', bytes(data), content_type='application/zip')
+        storage = ImageRecord._meta.get_field('image').storage
+        before = {name for _, _, files in os.walk(self.media_root) for name in files}
+
+        job = self.upload(archive=archive).json()
+
+        self.assertEqual(job['status'], 'received')
+        self.assertEqual((job['total_files'], job['accepted_files']), (3, 2))
+        self.assertEqual(job['rejected_files'], [{'name': 'b.jpg', 'error': 'File is corrupt in the archive.'}])
+        records = ImageRecord.objects.filter(upload_job_id=job['id'])
+        self.assertEqual(sorted(r.title for r in records), ['a', 'c'])
+        # Only the accepted members (and their derivatives) reached storage
+        added = {name for _, _, files in os.walk(self.media_root) for name in files} - before
+        self.assertFalse([name for name in added if name.startswith('b')])
+        self.assertTrue(all(storage.exists(r.image.name) for r in records))
+
+    def test_invalid_archive_fails_job(self):
+        job = self.upload(archive=SimpleUploadedFile('bad.zip', b'not a zip', content_type='application/zip')).json()
+
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error_message'], 'Archive is not a valid ZIP file.')
+
+    @override_settings(BULK_UPLOAD_CHUNK_SIZE=2)
+    def test_records_are_created_in_chunks(self):
+        archive = make_zip({f'road{i}.png': make_png() for i in range(5)})
+
+        chunks = []
+        bulk_create = ImageRecord.objects.bulk_create
+
+        def record_chunk(records):
+            # The caller reuses its list, so note the size now
+            chunks.append(len(records))
+            return bulk_create(records)
+
+        with mock.patch.object(ImageRecord.objects, 'bulk_create', side_effect=record_chunk), \
+                mock.patch('analysis.tasks.enqueue_analysis_batch') as enqueue:
+            job = self.upload(archive=archive).json()
+
+        self.assertEqual(chunks, [2, 2, 1])
+        self.assertEqual([len(call.args[0]) for call in enqueue.call_args_list], [2, 2, 1])
+        self.assertEqual(job['accepted_files'], 5)
+        self.assertEqual(job['analysis_status']['pending'], 5)
+
+    def test_job_is_visible_to_its_owner_only(self):
+        with mock.patch('analysis.tasks.enqueue_analysis_batch'):
+            job = self.upload(images=[SimpleUploadedFile('a.png', make_png(), content_type='image/png')]).json()
+
+        detail = self.client.get(reverse('upload-job-detail', args=[job['id']]))
+        self.assertEqual(detail.json()['files'][0]['status'], 'pending')
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(reverse('upload-job-detail', args=[job['id']])).status_code, 404)
+
+    def test_geotagged_upload_invalidates_map_tiles(self):
+        with mock.patch('core.bulk_upload.bump_map_version') as bump, \
+                mock.patch('analysis.tasks.enqueue_analysis_batch'):
+            self.upload(images=[SimpleUploadedFile('a.png', make_png(), content_type='image/png')])
+            bump.assert_not_called()
+
+            self.upload(
+                images=[SimpleUploadedFile('a.png', make_png(), content_type='image/png')],
+                latitude='6.9271', longitude='79.8612',
+            )
+        bump.assert_called_once_with(geo.encode(Decimal('6.927100'), Decimal('79.861200')))
+
+
+def tile_for(latitude, longitude, z):
+    """Return the (x, y) of the Web Mercator tile containing a point"""
+    n = 2 ** z
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2 * n)
+    return x, y
+
+
+class MapTileTestCase(ImageFixturesTestCase):
+    """Tiled map endpoint and regional cache invalidation"""
+
+    COLOMBO = (6.9271, 79.8612)
+    LONDON = (51.5072, -0.1276)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.user)
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass', role='admin'
+        )
+        self.colombo = self.place(
+            AnalysisResult.objects.get(image_record__user=self.user, severity_score=90).image_record, self.COLOMBO
+        )
+        self.nearby = self.place(
+            AnalysisResult.objects.get(image_record__user=self.user, severity_score=60).image_record, self.COLOMBO, 0.001
+        )
+        self.place(AnalysisResult.objects.get(image_record__user=self.other).image_record, self.COLOMBO, 0.002)
+        self.london = self.place(ImageRecord.objects.get(user=self.user, status='pending'), self.LONDON)
+
+    def place(self, image, position, offset=0.0):
+        image.latitude = Decimal(f'{position[0] + offset:.6f}')
+        image.longitude = Decimal(f'{position[1] + offset:.6f}')
+        image.save()
+        return image
+
+    def get_tile(self, z, position):
+        x, y = tile_for(*position, z)
+        return self.client.get(reverse('map_tile', kwargs={'z': z, 'x': x, 'y': y}))
+
+    def test_low_zoom_tiles_are_clustered(self):
+        response = self.get_tile(2, self.COLOMBO)
+
+        self.assertEqual(response.status_code, 200)
+        tile = response.json()
+        self.assertTrue(tile['clustered'])
+        self.assertEqual(len(tile['features']), 1)
+        self.assertEqual(tile['features'][0]['properties'], {'cluster': True, 'count': 2, 'severity': 'critical'})
+
+    def test_high_zoom_tiles_list_points_in_scope(self):
+        tile = self.get_tile(16, self.COLOMBO).json()
+        self.assertFalse(tile['clustered'])
+        self.assertEqual({feature['properties']['id'] for feature in tile['features']}, {self.colombo.id, self.nearby.id})
+
+        self.client.force_login(self.admin)
+        tile = self.get_tile(12, self.COLOMBO).json()
+        self.assertEqual(sum(feature['properties']['count'] for feature in tile['features']), 3)
+
+    def test_invalid_tile_is_rejected(self):
+        response = self.client.get(reverse('map_tile', kwargs={'z': 2, 'x': 9, 'y': 0}))
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_tiles_are_served_from_cache(self):
+        self.get_tile(16, self.COLOMBO)
+
+        # session and user only
+        with self.assertNumQueries(2):
+            response = self.get_tile(16, self.COLOMBO)
+        self.assertEqual(len(response.json()['features']), 2)
+
+    def test_tile_region_is_the_geohash_cell_containing_the_tile(self):
+        self.assertEqual(map_tiles.tile_region(0, 0, 0), '')
+        x, y = tile_for(*self.COLOMBO, 16)
+        self.assertEqual(map_tiles.tile_region(16, x, y), geo.encode(*self.COLOMBO)[:4])
+
+    def test_change_invalidates_only_its_region(self):
+        self.get_tile(16, self.COLOMBO)
+        self.get_tile(16, self.LONDON)
+        self.get_tile(0, self.LONDON)
+
+        analysis = self.colombo.analysis
+        analysis.condition_label = 'moderate'
+        analysis.save()
+
+        with mock.patch('core.map_tiles.build_tile', wraps=map_tiles.build_tile) as build:
+            self.assertEqual(self.get_tile(16, self.LONDON).status_code, 200)
+            build.assert_not_called()
+
+            tile = self.get_tile(16, self.COLOMBO).json()
+            severities = {feature['properties']['id']: feature['properties']['severity'] for feature in tile['features']}
+            self.assertEqual(severities[self.colombo.id], 'moderate')
+            self.assertEqual(build.call_count, 1)
+
+    def test_changes_do_not_rebuild_coarse_tiles(self):
+        self.get_tile(0, self.LONDON)
+        x, y = tile_for(*self.LONDON, 16)
+        self.assertEqual(len(map_tiles.tile_region(16, x, y)), 4)
+
+        self.place(self.london, self.LONDON, 0.001)
+
+        self.assertIsNone(cache.get(map_tiles._version_key('')))
+        self.assertIsNone(cache.get(map_tiles._version_key(geo.encode(*self.LONDON)[:1])))
+        self.assertIsNotNone(cache.get(map_tiles._version_key(geo.encode(*self.LONDON)[:2])))
+        with mock.patch('core.map_tiles.build_tile') as build:
+            self.get_tile(0, self.LONDON)
+        build.assert_not_called()
+
+    @override_settings(MAP_TILE_COARSE_TIMEOUT=30)
+    def test_coarse_tiles_expire_on_their_own(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.get_tile(0, self.LONDON)
+            self.get_tile(16, self.LONDON)
+
+        self.assertEqual([call.kwargs['timeout'] for call in cache_set.call_args_list], [30, 300])
+
+    def test_severity_only_change_keeps_tiles(self):
+        self.get_tile(16, self.COLOMBO)
+
+        analysis = self.colombo.analysis
+        analysis.severity_score = 95
+        analysis.save()
+
+        with mock.patch('core.map_tiles.build_tile') as build:
+            self.get_tile(16, self.COLOMBO)
+        build.assert_not_called()
+
+    def test_moving_an_image_invalidates_both_regions(self):
+        self.get_tile(16, self.LONDON)
+
+        self.place(self.colombo, self.LONDON, 0.0001)
+
+        tile = self.get_tile(16, self.LONDON).json()
+        self.assertIn(self.colombo.id, [feature['properties']['id'] for feature in tile['features']])
+        tile = self.get_tile(16, self.COLOMBO).json()
+        self.assertEqual([feature['properties']['id'] for feature in tile['features']], [self.nearby.id])
+
+    def test_deleting_an_image_invalidates_its_region(self):
+        self.get_tile(16, self.LONDON)
+
+        self.london.delete()
+
+        self.assertEqual(self.get_tile(16, self.LONDON).json()['features'], [])
+
+    def test_geohash_backfill_invalidates_its_regions(self):
+        ImageRecord.objects.filter(pk=self.london.pk).update(geohash='')
+        self.assertEqual(self.get_tile(16, self.LONDON).json()['features'], [])
+
+        call_command('backfill_geohash', stdout=io.StringIO())
+
+        tile = self.get_tile(16, self.LONDON).json()
+        self.assertEqual([feature['properties']['id'] for feature in tile['features']], [self.london.id])
+
+
+class SharedCacheCheckTestCase(TestCase):
+    """core.W001: async task execution needs a shared cache"""
+
+    @override_settings(TASK_EXECUTION_MODE='async')
+    def test_warns_for_process_local_cache_with_workers(self):
+        self.assertEqual([warning.id for warning in checks.check_shared_cache(None)], ['core.W001'])
+
+    @override_settings(TASK_EXECUTION_MODE='sync')
+    def test_sync_mode_needs_no_shared_cache(self):
+        self.assertEqual(checks.check_shared_cache(None), [])
+
+    @override_settings(
+        TASK_EXECUTION_MODE='async',
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1'}},
+    )
+    def test_shared_cache_passes(self):
+        self.assertEqual(checks.check_shared_cache(None), [])
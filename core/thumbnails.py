@@ -0,0 +1,122 @@
+"""
+Downscaled derivative images (thumbnails and report-sized JPEGs).
+
+Derivatives are stored next to their source as "<name>.<preset>.jpg"
+(road.png -> road.png.thumb.jpg, keeping the suffix so road.jpg and road.png
+in one directory get separate derivatives) and regenerated when the source is newer than the derivative. JPEG sources are
+decoded with PIL's draft mode, which lets libjpeg scale down by 1/2, 1/4
+or 1/8 while decoding instead of materialising the full-size image first.
+"""
+
+import logging
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRESETS = {
+    'thumb': {'size': (640, 640), 'quality': 80},
+    'report': {'size': (1600, 1600), 'quality': 85},
+}
+
+
+def get_preset(preset):
+    """Return the size/quality settings of a preset"""
+    presets = getattr(settings, 'IMAGE_DERIVATIVE_PRESETS', DEFAULT_PRESETS)
+    try:
+        return presets[preset]
+    except KeyError:
+        raise ValueError(f"Unknown image derivative preset '{preset}'")
+
+
+def derivative_name(name, preset):
+    """Return the storage name of a preset derivative of `name`"""
+    path = PurePosixPath(name)
+    return str(path.with_name(f"{path.name}.{preset}.jpg"))
+
+
+def render_derivative(source, size, quality):
+    """
+    Downscale an image file to fit within `size` and encode it as JPEG.
+
+    Args:
+        source: Readable binary file object
+        size: (max_width, max_height) in pixels
+        quality: JPEG quality
+
+    Returns:
+        JPEG bytes
+    """
+    with Image.open(source) as img:
+        # Let the JPEG decoder do most of the downscaling
+        img.draft('RGB', size)
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail(size, Image.LANCZOS)
+
+        output = BytesIO()
+        img.save(output, format='JPEG', quality=quality, optimize=True)
+        return output.getvalue()
+
+
+def _is_fresh(storage, name, source_name):
+    if not storage.exists(name):
+        return False
+    try:
+        return storage.get_modified_time(name) >= storage.get_modified_time(source_name)
+    except NotImplementedError:
+        # Storages without timestamps: a changed source gets a new name anyway
+        return True
+
+
+def get_derivative(field_file, preset):
+    """
+    Return the storage name of a preset derivative, generating it if needed.
+
+    Args:
+        field_file: FieldFile of the source image (ImageRecord.image, annotated_image, ...)
+        preset: Preset name, e.g. 'thumb' or 'report'
+
+    Returns:
+        Storage name of the derivative, or None if it could not be produced
+    """
+    if not field_file:
+        return None
+
+    options = get_preset(preset)
+    storage = field_file.storage
+    name = derivative_name(field_file.name, preset)
+
+    try:
+        if _is_fresh(storage, name, field_file.name):
+            return name
+
+        with storage.open(field_file.name, 'rb') as source:
+            data = render_derivative(source, tuple(options['size']), options.get('quality', 85))
+
+        if storage.exists(name):
+            storage.delete(name)
+        return storage.save(name, ContentFile(data))
+
+    except Exception as e:
+        logger.warning(f"Could not create '{preset}' derivative of {field_file.name}: {str(e)}")
+        return None
+
+
+def derivative_url(field_file, preset):
+    """URL of a preset derivative, falling back to the original image"""
+    if not field_file:
+        return ''
+    name = get_derivative(field_file, preset)
+    return field_file.storage.url(name) if name else field_file.url
+
+
+def derivative_path(field_file, preset):
+    """Local filesystem path of a preset derivative, falling back to the original image"""
+    name = get_derivative(field_file, preset)
+    return field_file.storage.path(name) if name else field_file.path
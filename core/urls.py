@@ -6,5 +6,6 @@ urlpatterns = [
     path('upload/', views.upload_image, name='upload_image'),
     path('images/', views.image_list, name='image_list'),
     path('images/<int:pk>/', views.image_detail, name='image_detail'),
+    path('images/<int:pk>/status/', views.image_status, name='image_status'),
     path('map/', views.map_view, name='map_view'),
 ]
@@ -1,11 +1,15 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.contrib import messages
 from django.views.generic import TemplateView, ListView
-from django.db.models import Count, Q, Avg
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.urls import reverse
 from .models import ImageRecord
 from .forms import ImageUploadForm
-from analysis.models import AnalysisResult
+from .rollup import get_rollup_statistics
+from .statistics import get_image_statistics
 
 
 class HomeView(TemplateView):
@@ -39,38 +43,23 @@ def dashboard_view(request):
             Q(location_name__icontains=search_query)
         )
     
-    # Get statistics
-    total_images = images.count()
-    analyzed_images = images.filter(status='analyzed').count()
-    pending_images = images.filter(status='pending').count()
-    processing_images = images.filter(status='processing').count()
-    
-    # Get defect statistics
-    defect_stats = AnalysisResult.objects.filter(
-        image_record__in=images
-    ).values('defect_type').annotate(count=Count('id'))
-    
-    # Get severity distribution
-    severity_stats = AnalysisResult.objects.filter(
-        image_record__in=images
-    ).values('condition_label').annotate(count=Count('id'))
-    
-    # Average severity score
-    avg_severity = AnalysisResult.objects.filter(
-        image_record__in=images
-    ).aggregate(avg=Avg('severity_score'))['avg'] or 0
+    # Get statistics: O(1) rollup read when unfiltered, single aggregate query otherwise
+    if status_filter or search_query:
+        stats = get_image_statistics(images)
+    else:
+        stats = get_rollup_statistics(None if user.is_admin else user)
     
     # Recent images
     recent_images = images.select_related('user').prefetch_related('analysis')[:10]
     
     context = {
-        'total_images': total_images,
-        'analyzed_images': analyzed_images,
-        'pending_images': pending_images,
-        'processing_images': processing_images,
-        'defect_stats': list(defect_stats),
-        'severity_stats': list(severity_stats),
-        'avg_severity': round(avg_severity, 2),
+        'total_images': stats['total_images'],
+        'analyzed_images': stats['analyzed_images'],
+        'pending_images': stats['pending_images'],
+        'processing_images': stats['processing_images'],
+        'defect_stats': stats['defect_stats'],
+        'severity_stats': stats['severity_stats'],
+        'avg_severity': stats['avg_severity'],
         'recent_images': recent_images,
         'status_filter': status_filter,
         'search_query': search_query,
@@ -89,44 +78,19 @@ def upload_image(request):
             image_record.user = request.user
             image_record.save()
             
-            # Run AI analysis synchronously (without Celery)
-            try:
-                from analysis.models import AnalysisResult
-                from analysis.ai_model import get_detector
-                from pathlib import Path
-                
-                # Update status to processing
-                image_record.status = 'processing'
-                image_record.save()
-                
-                # Get AI detector and analyze
-                detector = get_detector()
-                image_path = image_record.image.path
-                results = detector.analyze_image(image_path)
-                
-                # Save analysis results
-                analysis = AnalysisResult.objects.create(
-                    image_record=image_record,
-                    defect_type=results['defect_type'],
-                    severity_score=results['severity_score'],
-                    condition_label=results['condition_label'],
-                    ai_confidence=results['ai_confidence'],
-                    model_name=results['model_name'],
-                    model_version=results['model_version'],
-                    analysis_metadata=results.get('analysis_metadata', {}),
-                )
-                
-                # Update status to completed
-                image_record.status = 'completed'
-                image_record.save()
-                
+            # Queue AI analysis (runs inline when TASK_EXECUTION_MODE is 'sync')
+            from analysis.tasks import enqueue_analysis
+            enqueue_analysis(image_record.id)
+            
+            image_record.refresh_from_db(fields=['status'])
+            if image_record.status == 'analyzed':
                 messages.success(request, 'Image uploaded and analyzed successfully!')
-            except Exception as e:
-                image_record.status = 'failed'
-                image_record.save()
-                messages.error(request, f'Error analyzing image: {str(e)}')
+            elif image_record.status == 'failed':
+                messages.error(request, 'Image uploaded, but analysis failed.')
+            else:
+                messages.success(request, 'Image uploaded! Analysis is running in the background.')
             
-            return redirect('dashboard')
+            return redirect('image_detail', pk=image_record.pk)
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
@@ -181,45 +145,52 @@ def image_detail(request, pk):
     return render(request, 'core/image_detail.html', context)
 
 
+@login_required
+def image_status(request, pk):
+    """Return the analysis status of an image as JSON, polled by the detail page"""
+    image = get_object_or_404(ImageRecord, pk=pk)
+    
+    # Check permissions
+    if not request.user.is_admin and image.user != request.user:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    return JsonResponse({
+        'id': image.id,
+        'status': image.status,
+        'status_display': image.get_status_display(),
+        'has_analysis': hasattr(image, 'analysis'),
+    })
+
+
 @login_required
 def map_view(request):
-    """Map view showing all geotagged images"""
+    """Map view; marker data is loaded per tile from the map tile API"""
     user = request.user
     
-    if user.is_admin:
-        images = ImageRecord.objects.filter(
-            latitude__isnull=False,
-            longitude__isnull=False
-        ).select_related('user').prefetch_related('analysis')
-    else:
-        images = ImageRecord.objects.filter(
-            user=user,
-            latitude__isnull=False,
-            longitude__isnull=False
-        ).prefetch_related('analysis')
-    
-    # Prepare data for map markers
-    map_data = []
-    for img in images:
-        marker = {
-            'id': img.id,
-            'lat': float(img.latitude),
-            'lng': float(img.longitude),
-            'title': img.title or 'Road Image',
-            'status': img.status,
-            'location': img.location_name,
-        }
-        
-        # Add severity info if analyzed
-        if hasattr(img, 'analysis') and img.analysis:
-            marker['severity'] = img.analysis.condition_label
-            marker['defect_type'] = img.analysis.defect_type
-        
-        map_data.append(marker)
+    images = ImageRecord.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    if not user.is_admin:
+        images = images.filter(user=user)
+    
+    # Initial viewport from a single aggregate instead of loading every marker
+    extent = images.order_by().aggregate(
+        min_lat=Min('latitude'),
+        max_lat=Max('latitude'),
+        min_lng=Min('longitude'),
+        max_lng=Max('longitude'),
+    )
+    bounds = None
+    if extent['min_lat'] is not None:
+        bounds = [
+            [float(extent['min_lat']), float(extent['min_lng'])],
+            [float(extent['max_lat']), float(extent['max_lng'])],
+        ]
     
     context = {
-        'map_data': map_data,
-        'google_maps_api_key': '',  # Will be loaded from settings in template
+        'map_config': {
+            'bounds': bounds,
+            'tile_url': reverse('map_tile', kwargs={'z': 0, 'x': 0, 'y': 0}).replace('/0/0/0/', '/{z}/{x}/{y}/'),
+            'cluster_max_zoom': settings.MAP_CLUSTER_MAX_ZOOM,
+        },
     }
     
     return render(request, 'core/map.html', context)
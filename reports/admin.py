@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import ReportArtifact
 
-# Register your models here (if any)
+
+@admin.register(ReportArtifact)
+class ReportArtifactAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', 'status', 'progress', 'created_at', 'completed_at')
+    list_filter = ('kind', 'status', 'created_at')
+    search_fields = ('user__email',)
+    readonly_fields = ('filter_key', 'watermark', 'created_at', 'updated_at', 'completed_at')
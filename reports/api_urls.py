@@ -0,0 +1,10 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from . import api_views
+
+router = DefaultRouter()
+router.register(r'artifacts', api_views.ReportArtifactViewSet, basename='report-artifact')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
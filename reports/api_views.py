@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.http import FileResponse
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .artifacts import request_report_bundle
+from .bundles import bundle_queryset
+from .models import ReportArtifact
+from .serializers import ReportArtifactSerializer, ReportBundleSerializer
+
+
+class ReportArtifactViewSet(viewsets.ReadOnlyModelViewSet):
+    """API ViewSet for generated report artifacts"""
+    serializer_class = ReportArtifactSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return ReportArtifact.objects.filter(user=self.request.user)
+    
+    def get_serializer_class(self):
+        if self.action == 'bundle':
+            return ReportBundleSerializer
+        return ReportArtifactSerializer
+    
+    @action(detail=False, methods=['post'])
+    def bundle(self, request):
+        """
+        Request a PDF report bundle for many images.
+        
+        Accepts image IDs and/or filters; returns 202 with the artifact's
+        poll URL while the bundle is rendered, or 200 when an identical
+        bundle for unchanged data is already available.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.to_params()
+        
+        max_images = getattr(settings, 'REPORT_BUNDLE_MAX_IMAGES', 1000)
+        count = bundle_queryset(request.user, params).count()
+        if count == 0:
+            return Response({'error': 'No analyzed images match this request.'}, status=status.HTTP_400_BAD_REQUEST)
+        if count > max_images:
+            return Response(
+                {'error': f'{count} images match; at most {max_images} can be bundled at once.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        artifact = request_report_bundle(request.user, params)
+        data = ReportArtifactSerializer(artifact, context={'request': request}).data
+        return Response(data, status=status.HTTP_200_OK if artifact.is_ready else status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download a generated artifact"""
+        artifact = self.get_object()
+        if not artifact.is_ready:
+            return Response(
+                ReportArtifactSerializer(artifact, context={'request': request}).data,
+                status=status.HTTP_409_CONFLICT
+            )
+        return FileResponse(artifact.file.open('rb'), as_attachment=True, filename=artifact.file.name.rsplit('/', 1)[-1])
@@ -0,0 +1,147 @@
+"""
+Cached report artifacts.
+
+A report request is reduced to (user, kind, filter_key, watermark). The
+filter key hashes the report parameters. The watermark fingerprints the
+data the report reads: the newest updated_at and the row count (so
+deletions are noticed too). If a matching artifact exists it is reused;
+otherwise one is created and its generation queued.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from analysis.models import AnalysisResult
+from .models import ReportArtifact
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FILTERS = ('condition',)
+
+
+def summary_params(query_params):
+    """Return the summary report parameters present in a request's query string"""
+    return {name: query_params[name] for name in SUMMARY_FILTERS if query_params.get(name)}
+
+
+def summary_queryset(user, params):
+    """Analysis results a summary report for `user` with `params` covers"""
+    if user.is_admin:
+        analysis_results = AnalysisResult.objects.all()
+    else:
+        analysis_results = AnalysisResult.objects.filter(image_record__user=user)
+
+    if params.get('condition'):
+        analysis_results = analysis_results.filter(condition_label=params['condition'])
+
+    return analysis_results
+
+
+def make_filter_key(kind, params):
+    """Hash report parameters into a stable key"""
+    canonical = json.dumps({'kind': kind, 'params': params}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def data_watermark(queryset, timestamp_fields=('updated_at',)):
+    """
+    Fingerprint the rows of a queryset with one aggregate query.
+
+    Args:
+        queryset: Rows the report reads
+        timestamp_fields: auto_now fields (may span relations) whose maximum
+            changes whenever report-relevant data is edited
+    """
+    aggregates = {f'latest_{idx}': Max(field) for idx, field in enumerate(timestamp_fields)}
+    stats = queryset.order_by().aggregate(rows=Count('id'), **aggregates)
+    parts = [stats[name].isoformat() if stats[name] else '-' for name in aggregates]
+    return '|'.join(parts + [str(stats['rows'])])
+
+
+def request_artifact(user, kind, params, watermark, task):
+    """
+    Return the artifact for these parameters and data, queueing generation if needed.
+
+    Args:
+        user: User requesting the report
+        kind: ReportArtifact kind
+        params: Report parameters (JSON-serializable dict)
+        watermark: Data watermark from data_watermark()
+        task: Celery task taking the artifact id
+
+    Returns:
+        ReportArtifact (ready, or pending/running generation)
+    """
+    from analysis.tasks import enqueue_task
+
+    filter_key = make_filter_key(kind, params)
+    lookup = {'user': user, 'kind': kind, 'filter_key': filter_key, 'watermark': watermark}
+
+    try:
+        with transaction.atomic():
+            artifact, created = ReportArtifact.objects.get_or_create(**lookup, defaults={'params': params})
+    except IntegrityError:
+        # A concurrent request created it first
+        artifact, created = ReportArtifact.objects.get(**lookup), False
+
+    if not created:
+        if artifact.is_ready:
+            return artifact
+        stale_after = getattr(settings, 'REPORT_GENERATION_TIMEOUT', 900)
+        in_progress = artifact.status in ('pending', 'running')
+        if in_progress and artifact.updated_at > timezone.now() - timedelta(seconds=stale_after):
+            return artifact
+        # Retry failed or stalled generation, or regenerate a file that went missing
+        artifact.status = 'pending'
+        artifact.progress = 0
+        artifact.error_message = ''
+        artifact.save(update_fields=['status', 'progress', 'error_message', 'updated_at'])
+
+    enqueue_task(task, artifact.id)
+    artifact.refresh_from_db()
+    return artifact
+
+
+def request_summary_report(user, params):
+    """Return the summary report artifact for `user`, queueing generation if needed"""
+    from .tasks import generate_summary_report_task
+
+    # The report also shows image fields (location), so image edits count as changes
+    watermark = data_watermark(summary_queryset(user, params), ('updated_at', 'image_record__updated_date'))
+    return request_artifact(user, 'summary', params, watermark, generate_summary_report_task)
+
+
+def request_report_bundle(user, params):
+    """Return the report bundle artifact for `user`, queueing generation if needed"""
+    from .bundles import bundle_queryset
+    from .tasks import generate_report_bundle_task
+
+    watermark = data_watermark(bundle_queryset(user, params), ('updated_at', 'image_record__updated_date'))
+    return request_artifact(user, 'bundle', params, watermark, generate_report_bundle_task)
+
+
+def set_progress(artifact, progress):
+    """Record generation progress (percent) for pollers"""
+    artifact.progress = progress
+    artifact.save(update_fields=['progress', 'updated_at'])
+
+
+def delete_superseded(artifact):
+    """Delete older artifacts (and their files) for the same user, kind and parameters"""
+    superseded = ReportArtifact.objects.filter(
+        user=artifact.user_id, kind=artifact.kind, filter_key=artifact.filter_key,
+        status__in=['ready', 'failed'],
+    ).exclude(pk=artifact.pk)
+
+    for old in superseded:
+        logger.info(f"Deleting superseded report artifact {old.id}")
+        if old.file:
+            old.file.delete(save=False)
+        old.delete()
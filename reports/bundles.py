@@ -0,0 +1,128 @@
+"""
+Report bundles: the PDF reports of many images as a ZIP or one merged PDF.
+
+Rendering is CPU bound (image decoding, downscaling, PDF layout), so inside
+a Celery worker it runs in a process pool. Pool workers receive fully
+loaded model instances and never query the database; each warms the shared
+report style set once. Eager tasks render serially in the calling thread
+(see reports.tasks.generate_report_bundle_task).
+"""
+
+import logging
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+from analysis.models import AnalysisResult
+from core.thumbnails import get_derivative
+from .pdf_generator import PDFReportGenerator, get_report_styles
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMATS = ('zip', 'pdf')
+
+
+def bundle_queryset(user, params):
+    """
+    Analysis results included in a bundle for `user` with `params`.
+
+    Params may hold 'ids' (ImageRecord IDs) and/or the filters 'condition',
+    'date_from' and 'date_to' (ISO dates, on upload date).
+    """
+    if user.is_admin:
+        analysis_results = AnalysisResult.objects.all()
+    else:
+        analysis_results = AnalysisResult.objects.filter(image_record__user=user)
+
+    if params.get('ids'):
+        analysis_results = analysis_results.filter(image_record_id__in=params['ids'])
+    if params.get('condition'):
+        analysis_results = analysis_results.filter(condition_label=params['condition'])
+    if params.get('date_from'):
+        analysis_results = analysis_results.filter(image_record__upload_date__date__gte=params['date_from'])
+    if params.get('date_to'):
+        analysis_results = analysis_results.filter(image_record__upload_date__date__lte=params['date_to'])
+
+    return analysis_results
+
+
+def _init_worker():
+    # The parent's database connections were inherited by fork; drop the
+    # references so nothing in this process can use or close their sockets.
+    for conn in connections.all(initialized_only=True):
+        conn.connection = None
+    get_report_styles()
+
+
+def _render_report(analysis):
+    """Render one image report; runs in a pool worker"""
+    return PDFReportGenerator().generate_report(analysis.image_record, analysis)
+
+
+def _warm_derivatives(analysis):
+    """Create the report-sized images a report embeds; runs in a pool worker"""
+    get_derivative(analysis.image_record.image, 'report')
+    if analysis.annotated_image:
+        get_derivative(analysis.annotated_image, 'report')
+    return analysis.id
+
+
+def _map(func, items, workers):
+    """
+    Yield func(item) for each item in order, using a process pool when possible.
+
+    Falls back to the calling process for a single worker or when this
+    process is a daemon (daemonic processes may not have children).
+    """
+    if workers <= 1 or len(items) <= 1 or multiprocessing.current_process().daemon:
+        get_report_styles()
+        for item in items:
+            yield func(item)
+        return
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        yield from pool.map(func, items, chunksize=max(1, min(8, len(items) // (workers * 4))))
+
+
+def write_bundle(analysis_results, output, bundle_format, progress=None, workers=None):
+    """
+    Render reports for `analysis_results` into `output`.
+
+    Args:
+        analysis_results: List of AnalysisResult with image_record and
+            image_record.user loaded
+        output: Binary file object to write the ZIP or PDF to
+        bundle_format: 'zip' (one PDF per image) or 'pdf' (one merged PDF)
+        progress: Optional callable receiving a completion percentage
+        workers: Pool size; defaults to settings.REPORT_BUNDLE_WORKERS
+    """
+    if bundle_format not in BUNDLE_FORMATS:
+        raise ValueError(f"Unknown bundle format '{bundle_format}'")
+    if workers is None:
+        workers = getattr(settings, 'REPORT_BUNDLE_WORKERS', 4)
+
+    total = len(analysis_results) or 1
+    report_every = max(1, total // 20)
+
+    def advance(done, start, span):
+        if progress and (done % report_every == 0 or done == total):
+            progress(start + span * done // total)
+
+    if bundle_format == 'zip':
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+            # PDFs are already compressed; storing avoids recompressing them
+            rendered = _map(_render_report, analysis_results, workers)
+            for done, (analysis, pdf) in enumerate(zip(analysis_results, rendered), start=1):
+                archive.writestr(f"road_analysis_{analysis.image_record_id}.pdf", pdf)
+                advance(done, 5, 90)
+        return
+
+    # Merged PDF: downscale images in parallel, then lay out every report in one build
+    for done, _ in enumerate(_map(_warm_derivatives, analysis_results, workers), start=1):
+        advance(done, 5, 55)
+    PDFReportGenerator().generate_bundle_pdf(analysis_results, output)
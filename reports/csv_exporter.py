@@ -1,131 +1,232 @@
 """
-CSV Export utilities for data export
+CSV and Excel export utilities for data export
 """
 
 import csv
+import tempfile
 from io import StringIO
-import pandas as pd
-from datetime import datetime
+
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+
+CSV_HEADERS = [
+    'ID',
+    'Image ID',
+    'User Email',
+    'Upload Date',
+    'Location',
+    'Latitude',
+    'Longitude',
+    'Defect Type',
+    'Severity Score',
+    'Condition',
+    'AI Confidence',
+    'Model Name',
+    'Model Version',
+    'Maintenance Suggestion',
+    'Analysis Date',
+]
+
+# Rows fetched per database round trip and bytes buffered per yielded chunk
+CSV_CHUNK_SIZE = 2000
+CSV_FLUSH_BYTES = 64 * 1024
+
+
+def format_analysis_row(analysis):
+    """
+    Return the CSV column values for one analysis result.
+    
+    Args:
+        analysis: AnalysisResult with image_record and image_record.user loaded
+        
+    Returns:
+        List of values in CSV_HEADERS order
+    """
+    img = analysis.image_record
+    return [
+        analysis.id,
+        img.id,
+        img.user.email,
+        img.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
+        img.location_name or 'N/A',
+        img.latitude or '',
+        img.longitude or '',
+        analysis.get_defect_type_display(),
+        f"{analysis.severity_score:.2f}",
+        analysis.get_condition_label_display(),
+        f"{analysis.ai_confidence:.4f}",
+        analysis.model_name,
+        analysis.model_version,
+        analysis.maintenance_suggestion,
+        analysis.analyzed_at.strftime('%Y-%m-%d %H:%M:%S'),
+    ]
+
+
+def iter_analysis_csv(analysis_results, chunk_size=CSV_CHUNK_SIZE):
+    """
+    Generate CSV text for analysis results in bounded-size chunks.
+    
+    The header is yielded before the query runs, and rows are read with a
+    chunked .iterator() so memory use does not grow with the row count.
+    
+    Args:
+        analysis_results: QuerySet of AnalysisResult instances
+        chunk_size: Rows fetched from the database per round trip
+        
+    Yields:
+        CSV text chunks
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    
+    writer.writerow(CSV_HEADERS)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    
+    rows = analysis_results.select_related('image_record__user').iterator(chunk_size=chunk_size)
+    for analysis in rows:
+        writer.writerow(format_analysis_row(analysis))
+        if buffer.tell() >= CSV_FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
 
 
 def export_analysis_to_csv(analysis_results):
     """
     Export analysis results to CSV format.
     
+    Builds the whole file in memory; use iter_analysis_csv() for large exports.
+    
     Args:
         analysis_results: QuerySet of AnalysisResult instances
         
     Returns:
         CSV string
     """
-    # Create StringIO buffer
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Write headers
-    headers = [
-        'ID',
-        'Image ID',
-        'User Email',
-        'Upload Date',
-        'Location',
-        'Latitude',
-        'Longitude',
-        'Defect Type',
-        'Severity Score',
-        'Condition',
-        'AI Confidence',
-        'Model Name',
-        'Model Version',
-        'Maintenance Suggestion',
-        'Analysis Date',
+    return ''.join(iter_analysis_csv(analysis_results))
+
+
+# Rows used to estimate Excel column widths, and the width bounds
+EXCEL_SAMPLE_ROWS = 200
+EXCEL_MIN_WIDTH = 8
+EXCEL_MAX_WIDTH = 50
+
+
+def _excel_datetime(value):
+    # Excel has no time zones; write local time as a naive datetime
+    return timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+
+
+def format_analysis_excel_row(analysis):
+    """
+    Return the Excel cell values for one analysis result.
+    
+    Same columns as the CSV export, but numbers and dates keep their native
+    types so they sort and filter correctly in a spreadsheet.
+    """
+    img = analysis.image_record
+    return [
+        analysis.id,
+        img.id,
+        img.user.email,
+        _excel_datetime(img.upload_date),
+        img.location_name or 'N/A',
+        float(img.latitude) if img.latitude is not None else None,
+        float(img.longitude) if img.longitude is not None else None,
+        analysis.get_defect_type_display(),
+        round(analysis.severity_score, 2),
+        analysis.get_condition_label_display(),
+        round(analysis.ai_confidence, 4),
+        analysis.model_name,
+        analysis.model_version,
+        analysis.maintenance_suggestion,
+        _excel_datetime(analysis.analyzed_at),
     ]
-    writer.writerow(headers)
-    
-    # Write data
-    for analysis in analysis_results:
-        img = analysis.image_record
-        row = [
-            analysis.id,
-            img.id,
-            img.user.email,
-            img.upload_date.strftime('%Y-%m-%d %H:%M:%S'),
-            img.location_name or 'N/A',
-            img.latitude or '',
-            img.longitude or '',
-            analysis.get_defect_type_display(),
-            f"{analysis.severity_score:.2f}",
-            analysis.get_condition_label_display(),
-            f"{analysis.ai_confidence:.4f}",
-            analysis.model_name,
-            analysis.model_version,
-            analysis.maintenance_suggestion,
-            analysis.analyzed_at.strftime('%Y-%m-%d %H:%M:%S'),
-        ]
-        writer.writerow(row)
-    
-    # Get CSV string
-    csv_string = output.getvalue()
-    output.close()
-    
-    return csv_string
 
 
-def export_analysis_to_excel(analysis_results):
+def _estimate_column_widths(sample_rows):
+    """Estimate column widths from the header and a sample of rows"""
+    widths = [len(header) for header in CSV_HEADERS]
+    for row in sample_rows:
+        for idx, value in enumerate(row):
+            if value is not None:
+                length = 19 if hasattr(value, 'strftime') else len(str(value))
+                widths[idx] = max(widths[idx], length)
+    return [min(max(width + 2, EXCEL_MIN_WIDTH), EXCEL_MAX_WIDTH) for width in widths]
+
+
+def write_analysis_excel(analysis_results, output, chunk_size=CSV_CHUNK_SIZE):
     """
-    Export analysis results to Excel format using pandas.
+    Write analysis results to an XLSX workbook.
+    
+    Uses openpyxl's write-only mode, which streams rows to temporary files
+    instead of keeping cell objects in memory. Rows are read with a chunked
+    .iterator(); only the first EXCEL_SAMPLE_ROWS are held at once, to size
+    the columns (write-only sheets need widths before the first row).
     
     Args:
         analysis_results: QuerySet of AnalysisResult instances
-        
-    Returns:
-        Excel file bytes
+        output: File path or binary file object to save the workbook to
+        chunk_size: Rows fetched from the database per round trip
     """
-    # Prepare data
-    data = []
-    
-    for analysis in analysis_results:
-        img = analysis.image_record
-        data.append({
-            'ID': analysis.id,
-            'Image ID': img.id,
-            'User Email': img.user.email,
-            'Upload Date': img.upload_date,
-            'Location': img.location_name or 'N/A',
-            'Latitude': img.latitude,
-            'Longitude': img.longitude,
-            'Defect Type': analysis.get_defect_type_display(),
-            'Severity Score': analysis.severity_score,
-            'Condition': analysis.get_condition_label_display(),
-            'AI Confidence': analysis.ai_confidence,
-            'Model Name': analysis.model_name,
-            'Model Version': analysis.model_version,
-            'Maintenance Suggestion': analysis.maintenance_suggestion,
-            'Analysis Date': analysis.analyzed_at,
-        })
-    
-    # Create DataFrame
-    df = pd.DataFrame(data)
-    
-    # Create Excel file in memory
-    output = BytesIO()
-    
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Analysis Results', index=False)
-        
-        # Auto-adjust column widths
-        worksheet = writer.sheets['Analysis Results']
-        for idx, col in enumerate(df.columns):
-            max_length = max(
-                df[col].astype(str).apply(len).max(),
-                len(col)
-            )
-            worksheet.column_dimensions[chr(65 + idx)].width = min(max_length + 2, 50)
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Analysis Results')
+    
+    rows = (
+        format_analysis_excel_row(analysis)
+        for analysis in analysis_results.select_related('image_record__user').iterator(chunk_size=chunk_size)
+    )
+    sample = []
+    for row in rows:
+        sample.append(row)
+        if len(sample) >= EXCEL_SAMPLE_ROWS:
+            break
+    
+    for idx, width in enumerate(_estimate_column_widths(sample), start=1):
+        worksheet.column_dimensions[get_column_letter(idx)].width = width
+    worksheet.freeze_panes = 'A2'
     
-    excel_data = output.getvalue()
-    output.close()
+    bold = Font(bold=True)
+    header = []
+    for title in CSV_HEADERS:
+        cell = WriteOnlyCell(worksheet, value=title)
+        cell.font = bold
+        header.append(cell)
+    worksheet.append(header)
     
-    return excel_data
+    for row in sample:
+        worksheet.append(row)
+    for row in rows:
+        worksheet.append(row)
+    
+    workbook.save(output)
 
 
-from io import BytesIO
+def export_analysis_to_excel(analysis_results):
+    """
+    Export analysis results to Excel format.
+    
+    Args:
+        analysis_results: QuerySet of AnalysisResult instances
+        
+    Returns:
+        Temporary file containing the XLSX workbook, positioned at the start.
+        It is deleted when closed.
+    """
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        write_analysis_excel(analysis_results, output)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
@@ -0,0 +1,58 @@
+"""
+Export analysis results to CSV without going through the web server.
+
+Uses the same streaming row formatter as the CSV download view, so memory
+stays flat regardless of the number of rows.
+
+Usage:
+    python manage.py export_analysis_csv --output analyses.csv
+    python manage.py export_analysis_csv --user engineer@example.com --condition critical > critical.csv
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.models import AnalysisResult
+from reports.csv_exporter import CSV_CHUNK_SIZE, iter_analysis_csv
+
+
+class Command(BaseCommand):
+    help = 'Stream analysis results to a CSV file (or stdout)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', '-o', type=str, default='',
+            help='File to write; defaults to stdout'
+        )
+        parser.add_argument(
+            '--user', type=str, default='',
+            help='Only export images uploaded by this email address'
+        )
+        parser.add_argument(
+            '--condition', type=str, default='',
+            help='Only export results with this condition label (good, moderate, poor, critical)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CSV_CHUNK_SIZE,
+            help=f'Rows fetched per database round trip (default: {CSV_CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        analysis_results = AnalysisResult.objects.all()
+        if options['user']:
+            analysis_results = analysis_results.filter(image_record__user__email=options['user'])
+        if options['condition']:
+            valid = {choice for choice, _ in AnalysisResult.CONDITION_CHOICES}
+            if options['condition'] not in valid:
+                raise CommandError(f'Unknown condition "{options["condition"]}"; choose from {", ".join(sorted(valid))}')
+            analysis_results = analysis_results.filter(condition_label=options['condition'])
+
+        chunks = iter_analysis_csv(analysis_results, chunk_size=options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Exported analysis results to {options["output"]}'))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportartifact',
+            name='kind',
+            field=models.CharField(choices=[('summary', 'Summary Report'), ('bundle', 'Report Bundle')], max_length=20),
+        ),
+    ]
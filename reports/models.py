@@ -1,3 +1,56 @@
 from django.db import models
+from django.conf import settings
 
-# Reports app doesn't need models, but we include this file for Django convention
+
+class ReportArtifact(models.Model):
+    """
+    A generated report file.
+    
+    Artifacts are keyed by (user, kind, filter_key, watermark): the hash of
+    the report parameters and a fingerprint of the data it was built from.
+    A repeat request for the same parameters and unchanged data is served
+    from the stored file instead of being regenerated.
+    """
+    
+    KIND_CHOICES = [
+        ('summary', 'Summary Report'),
+        ('bundle', 'Report Bundle'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='report_artifacts')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    filter_key = models.CharField(max_length=64)  # SHA-256 of the canonical params
+    watermark = models.CharField(max_length=100)  # latest data change + row count
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    file = models.FileField(upload_to='reports/%Y/%m/%d/', blank=True)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Report Artifact'
+        verbose_name_plural = 'Report Artifacts'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'kind', 'filter_key', 'watermark'],
+                name='unique_report_artifact',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} - {self.user.email} - {self.status}"
+    
+    @property
+    def is_ready(self):
+        return self.status == 'ready' and bool(self.file) and self.file.storage.exists(self.file.name)
@@ -11,53 +11,91 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from datetime import datetime
+from django.db.models import Count, Q
+from PIL import Image as PILImage
+from functools import lru_cache
 from io import BytesIO
 import os
 
+from core.thumbnails import derivative_path
+
+
+@lru_cache(maxsize=None)
+def get_report_styles():
+    """
+    Return the (sample style sheet, custom styles) used by every report.
+    
+    Built once per process and shared by all PDFReportGenerator instances;
+    report bundles warm it in each worker before rendering starts.
+    """
+    sample = getSampleStyleSheet()
+    styles = {}
+    
+    # Title style
+    styles['CustomTitle'] = ParagraphStyle(
+        'CustomTitle',
+        parent=sample['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#1f2937'),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    )
+    
+    # Heading style
+    styles['CustomHeading'] = ParagraphStyle(
+        'CustomHeading',
+        parent=sample['Heading2'],
+        fontSize=16,
+        textColor=colors.HexColor('#374151'),
+        spaceAfter=12,
+        spaceBefore=12,
+        fontName='Helvetica-Bold'
+    )
+    
+    # Normal text
+    styles['CustomNormal'] = ParagraphStyle(
+        'CustomNormal',
+        parent=sample['Normal'],
+        fontSize=11,
+        textColor=colors.HexColor('#4b5563'),
+        spaceAfter=8,
+    )
+    
+    return sample, styles
+
 
 class PDFReportGenerator:
     """Generate PDF reports for road condition analysis"""
     
+    FOOTER_TEXT = """
+        <para alignment="center">
+        <b>RoadHealth AI - Automated Pavement Condition Assessment</b><br/>
+        This report is generated automatically by AI analysis and should be reviewed by qualified engineers.<br/>
+        For questions or concerns, please contact your system administrator.
+        </para>
+        """
+    
     def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self.custom_styles = self._create_custom_styles()
+        self.styles, self.custom_styles = get_report_styles()
     
-    def _create_custom_styles(self):
-        """Create custom paragraph styles"""
-        styles = {}
-        
-        # Title style
-        styles['CustomTitle'] = ParagraphStyle(
-            'CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#1f2937'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Heading style
-        styles['CustomHeading'] = ParagraphStyle(
-            'CustomHeading',
-            parent=self.styles['Heading2'],
-            fontSize=16,
-            textColor=colors.HexColor('#374151'),
-            spaceAfter=12,
-            spaceBefore=12,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Normal text
-        styles['CustomNormal'] = ParagraphStyle(
-            'CustomNormal',
-            parent=self.styles['Normal'],
-            fontSize=11,
-            textColor=colors.HexColor('#4b5563'),
-            spaceAfter=8,
-        )
-        
-        return styles
+    def _fitted_image(self, path, max_width=5*inch, max_height=3.5*inch):
+        """Return a reportlab Image scaled to fit the box while keeping its aspect ratio"""
+        with PILImage.open(path) as img:
+            width, height = img.size
+        scale = min(max_width / width, max_height / height)
+        return Image(path, width=width * scale, height=height * scale)
+    
+    def _report_document(self, output):
+        return SimpleDocTemplate(output, pagesize=letter, rightMargin=72, leftMargin=72,
+                                 topMargin=72, bottomMargin=18)
+    
+    def _footer_elements(self):
+        return [
+            PageBreak(),
+            Spacer(1, 2*inch),
+            Paragraph(self.FOOTER_TEXT, self.styles['Normal']),
+        ]
     
     def generate_report(self, image_record, analysis_result):
         """
@@ -68,12 +106,55 @@ class PDFReportGenerator:
             analysis_result: AnalysisResult instance
             
         Returns:
-            BytesIO buffer containing the PDF
+            PDF bytes
         """
         buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72,
-                               topMargin=72, bottomMargin=18)
+        doc = self._report_document(buffer)
+        
+        elements = self.build_report_elements(image_record, analysis_result)
+        elements.extend(self._footer_elements())
+        
+        # Build PDF
+        doc.build(elements)
+        
+        # Get the value of the BytesIO buffer
+        pdf = buffer.getvalue()
+        buffer.close()
+        
+        return pdf
+    
+    def generate_bundle_pdf(self, analysis_results, output):
+        """
+        Write the reports of many analyses into one PDF.
         
+        All reports go through a single doc.build, one report per section
+        with a page break in between and the footer once at the end.
+        
+        Args:
+            analysis_results: Iterable of AnalysisResult instances with
+                image_record and image_record.user loaded
+            output: Binary file object to write the PDF to
+        """
+        elements = []
+        for index, analysis in enumerate(analysis_results):
+            if index:
+                elements.append(PageBreak())
+            elements.extend(self.build_report_elements(analysis.image_record, analysis))
+        elements.extend(self._footer_elements())
+        
+        self._report_document(output).build(elements)
+    
+    def build_report_elements(self, image_record, analysis_result):
+        """
+        Return the flowables of a single image report (without the footer page).
+        
+        Args:
+            image_record: ImageRecord instance
+            analysis_result: AnalysisResult instance
+            
+        Returns:
+            List of reportlab flowables
+        """
         # Container for the 'Flowable' objects
         elements = []
         
@@ -171,12 +252,11 @@ class PDFReportGenerator:
         elements.append(Paragraph(analysis_result.maintenance_suggestion, self.custom_styles['CustomNormal']))
         elements.append(Spacer(1, 0.3 * inch))
         
-        # Add images if available
+        # Add images if available, using report-sized copies instead of full-resolution originals
         try:
             if os.path.exists(image_record.image.path):
                 elements.append(Paragraph("Original Image", self.custom_styles['CustomHeading']))
-                img = Image(image_record.image.path, width=5*inch, height=3.5*inch)
-                elements.append(img)
+                elements.append(self._fitted_image(derivative_path(image_record.image, 'report')))
                 elements.append(Spacer(1, 0.2 * inch))
         except:
             pass
@@ -184,42 +264,23 @@ class PDFReportGenerator:
         try:
             if analysis_result.annotated_image and os.path.exists(analysis_result.annotated_image.path):
                 elements.append(Paragraph("Annotated Analysis Image", self.custom_styles['CustomHeading']))
-                img = Image(analysis_result.annotated_image.path, width=5*inch, height=3.5*inch)
-                elements.append(img)
+                elements.append(self._fitted_image(derivative_path(analysis_result.annotated_image, 'report')))
         except:
             pass
         
-        # Footer
-        elements.append(PageBreak())
-        footer_text = """
-        <para alignment="center">
-        <b>RoadHealth AI - Automated Pavement Condition Assessment</b><br/>
-        This report is generated automatically by AI analysis and should be reviewed by qualified engineers.<br/>
-        For questions or concerns, please contact your system administrator.
-        </para>
-        """
-        elements.append(Spacer(1, 2*inch))
-        elements.append(Paragraph(footer_text, self.styles['Normal']))
-        
-        # Build PDF
-        doc.build(elements)
-        
-        # Get the value of the BytesIO buffer
-        pdf = buffer.getvalue()
-        buffer.close()
-        
-        return pdf
+        return elements
     
-    def generate_summary_report(self, image_records, analysis_results):
+    def generate_summary_report(self, image_records, analysis_results, progress=None):
         """
         Generate summary PDF report for multiple analyses.
         
         Args:
-            image_records: QuerySet of ImageRecord instances
+            image_records: Unused; kept for backwards compatibility
             analysis_results: QuerySet of AnalysisResult instances
+            progress: Optional callable receiving a completion percentage
             
         Returns:
-            BytesIO buffer containing the PDF
+            PDF bytes
         """
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -232,12 +293,21 @@ class PDFReportGenerator:
                                  self.styles['Normal']))
         elements.append(Spacer(1, 0.3 * inch))
         
-        # Summary statistics
-        total = analysis_results.count()
-        critical = analysis_results.filter(condition_label='critical').count()
-        poor = analysis_results.filter(condition_label='poor').count()
-        moderate = analysis_results.filter(condition_label='moderate').count()
-        good = analysis_results.filter(condition_label='good').count()
+        # Summary statistics in a single aggregate query
+        counts = analysis_results.order_by().aggregate(
+            total=Count('id'),
+            **{
+                condition: Count('id', filter=Q(condition_label=condition))
+                for condition in ('critical', 'poor', 'moderate', 'good')
+            }
+        )
+        total = counts['total']
+        critical = counts['critical']
+        poor = counts['poor']
+        moderate = counts['moderate']
+        good = counts['good']
+        if progress:
+            progress(30)
         
         summary_data = [
             ['Condition', 'Count', 'Percentage'],
@@ -268,7 +338,12 @@ class PDFReportGenerator:
         
         record_data = [['ID', 'Location', 'Defect', 'Condition', 'Severity']]
         
-        for analysis in analysis_results[:50]:  # Limit to 50 records
+        # Limit to 50 records; join the image and load only the columns shown
+        records = analysis_results.select_related('image_record').only(
+            'id', 'defect_type', 'condition_label', 'severity_score',
+            'image_record__id', 'image_record__location_name',
+        )[:50]
+        for analysis in records:
             record_data.append([
                 str(analysis.image_record.id),
                 analysis.image_record.location_name[:20] if analysis.image_record.location_name else 'N/A',
@@ -289,6 +364,8 @@ class PDFReportGenerator:
         ]))
         
         elements.append(t)
+        if progress:
+            progress(60)
         
         doc.build(elements)
         pdf = buffer.getvalue()
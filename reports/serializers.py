@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.urls import reverse
+from rest_framework import serializers
+from analysis.models import AnalysisResult
+from .bundles import BUNDLE_FORMATS
+from .models import ReportArtifact
+
+
+class ReportBundleSerializer(serializers.Serializer):
+    """Input for a report bundle: image IDs and/or filters, and the output format"""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    condition = serializers.ChoiceField(choices=AnalysisResult.CONDITION_CHOICES, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    format = serializers.ChoiceField(choices=BUNDLE_FORMATS, default='zip')
+    
+    def validate_ids(self, value):
+        max_images = getattr(settings, 'REPORT_BUNDLE_MAX_IMAGES', 1000)
+        if len(value) > max_images:
+            raise serializers.ValidationError(f"At most {max_images} images can be bundled at once.")
+        return sorted(set(value))
+    
+    def validate(self, attrs):
+        if not any(attrs.get(name) for name in ('ids', 'condition', 'date_from', 'date_to')):
+            raise serializers.ValidationError("Provide image IDs or at least one filter.")
+        return attrs
+    
+    def to_params(self):
+        """Canonical, JSON-serializable bundle parameters"""
+        params = {'format': self.validated_data['format']}
+        for name in ('ids', 'condition'):
+            if self.validated_data.get(name):
+                params[name] = self.validated_data[name]
+        for name in ('date_from', 'date_to'):
+            if self.validated_data.get(name):
+                params[name] = self.validated_data[name].isoformat()
+        return params
+
+
+class ReportArtifactSerializer(serializers.ModelSerializer):
+    poll_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ReportArtifact
+        fields = [
+            'id', 'kind', 'params', 'status', 'progress', 'error_message',
+            'poll_url', 'download_url', 'created_at', 'completed_at'
+        ]
+        read_only_fields = fields
+    
+    def _absolute(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+    
+    def get_poll_url(self, obj):
+        return self._absolute(reverse('report-artifact-detail', args=[obj.id]))
+    
+    def get_download_url(self, obj):
+        if not obj.is_ready:
+            return None
+        return self._absolute(reverse('report-artifact-download', args=[obj.id]))
@@ -0,0 +1,117 @@
+"""
+Celery tasks for background report generation
+"""
+
+from celery import shared_task
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.utils import timezone
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_summary_report_task(artifact_id):
+    """
+    Build a summary PDF and store it on its ReportArtifact.
+    
+    Args:
+        artifact_id: ID of the ReportArtifact to generate
+    """
+    from .artifacts import delete_superseded, set_progress, summary_queryset
+    from .models import ReportArtifact
+    from .pdf_generator import PDFReportGenerator
+    
+    try:
+        artifact = ReportArtifact.objects.select_related('user').get(id=artifact_id)
+    except ReportArtifact.DoesNotExist:
+        logger.error(f"Report artifact {artifact_id} not found")
+        return
+    
+    artifact.status = 'running'
+    artifact.progress = 10
+    artifact.save(update_fields=['status', 'progress', 'updated_at'])
+    
+    try:
+        analysis_results = summary_queryset(artifact.user, artifact.params)
+        pdf = PDFReportGenerator().generate_summary_report(
+            None, analysis_results, progress=lambda percent: set_progress(artifact, percent)
+        )
+        
+        filename = f"road_analysis_summary_{artifact.user_id}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        artifact.file.save(filename, ContentFile(pdf), save=False)
+        artifact.status = 'ready'
+        artifact.progress = 100
+        artifact.completed_at = timezone.now()
+        artifact.save(update_fields=['file', 'status', 'progress', 'completed_at', 'updated_at'])
+        
+        delete_superseded(artifact)
+        logger.info(f"Summary report {artifact.id} generated for {artifact.user.email}")
+    
+    except Exception as e:
+        logger.error(f"Summary report {artifact.id} failed: {str(e)}")
+        artifact.status = 'failed'
+        artifact.error_message = str(e)
+        artifact.save(update_fields=['status', 'error_message', 'updated_at'])
+
+
+@shared_task
+def generate_report_bundle_task(artifact_id):
+    """
+    Render the reports of many images into a ZIP or merged PDF artifact.
+    
+    Args:
+        artifact_id: ID of the ReportArtifact (kind 'bundle') to generate
+    """
+    from .artifacts import delete_superseded, set_progress
+    from .bundles import bundle_queryset, write_bundle
+    from .models import ReportArtifact
+    
+    try:
+        artifact = ReportArtifact.objects.select_related('user').get(id=artifact_id)
+    except ReportArtifact.DoesNotExist:
+        logger.error(f"Report artifact {artifact_id} not found")
+        return
+    
+    artifact.status = 'running'
+    artifact.progress = 0
+    artifact.save(update_fields=['status', 'progress', 'updated_at'])
+    
+    bundle_format = artifact.params.get('format', 'zip')
+    try:
+        analysis_results = list(
+            bundle_queryset(artifact.user, artifact.params)
+            .select_related('image_record__user')
+            .order_by('image_record_id')
+        )
+        
+        # Eager (TASK_EXECUTION_MODE='sync') or direct calls run in the web
+        # request thread, which must not fork a process pool: render serially
+        request = generate_report_bundle_task.request
+        in_worker = bool(request.id) and not request.is_eager
+        
+        with tempfile.TemporaryFile() as output:
+            write_bundle(
+                analysis_results, output, bundle_format,
+                progress=lambda percent: set_progress(artifact, percent),
+                workers=None if in_worker else 1,
+            )
+            output.seek(0)
+            filename = f"road_analysis_bundle_{artifact.user_id}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{bundle_format}"
+            artifact.file.save(filename, File(output), save=False)
+        
+        artifact.status = 'ready'
+        artifact.progress = 100
+        artifact.completed_at = timezone.now()
+        artifact.save(update_fields=['file', 'status', 'progress', 'completed_at', 'updated_at'])
+        
+        delete_superseded(artifact)
+        logger.info(f"Report bundle {artifact.id} with {len(analysis_results)} reports generated for {artifact.user.email}")
+    
+    except Exception as e:
+        logger.error(f"Report bundle {artifact.id} failed: {str(e)}")
+        artifact.status = 'failed'
+        artifact.error_message = str(e)
+        artifact.save(update_fields=['status', 'error_message', 'updated_at'])
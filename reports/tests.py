@@ -1,4 +1,234 @@
 # Django test module
-from django.test import TestCase
+import csv
+import io
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.http import FileResponse, StreamingHttpResponse
+from django.test import override_settings
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from analysis.models import AnalysisResult
+from core.models import ImageRecord
+from core.tests import ImageFixturesTestCase
+from .artifacts import make_filter_key
+from .bundles import write_bundle
+from .csv_exporter import CSV_HEADERS, export_analysis_to_csv
+from .models import ReportArtifact
+from .pdf_generator import PDFReportGenerator
+
+
+class CSVExportTestCase(ImageFixturesTestCase):
+    """Streaming CSV export view and management command"""
+
+    def read_csv(self, text):
+        return list(csv.reader(io.StringIO(text)))
+
+    def test_export_view_streams_rows(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('export_csv'))
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        rows = self.read_csv(b''.join(response.streaming_content).decode())
+        self.assertEqual(rows[0], CSV_HEADERS)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row[2] for row in rows[1:]}, {'engineer@example.com'})
+
+    def test_export_view_applies_condition_filter(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('export_csv'), {'condition': 'critical'})
+
+        rows = self.read_csv(b''.join(response.streaming_content).decode())
+        self.assertEqual([row[9] for row in rows[1:]], ['Critical'])
+
+    def test_export_query_count_is_independent_of_row_count(self):
+        from analysis.models import AnalysisResult
+
+        # One query for all rows, users included
+        with self.assertNumQueries(1):
+            export_analysis_to_csv(AnalysisResult.objects.all())
+
+    def test_management_command_matches_view_format(self):
+        from analysis.models import AnalysisResult
+
+        out = io.StringIO()
+        call_command('export_analysis_csv', stdout=out)
+
+        self.assertEqual(out.getvalue(), export_analysis_to_csv(AnalysisResult.objects.all()))
+        self.assertEqual(len(self.read_csv(out.getvalue())), 5)
+
+
+class ExcelExportTestCase(ImageFixturesTestCase):
+    """Write-only XLSX export"""
+
+    def test_export_view_returns_workbook(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('export_excel'))
+
+        self.assertIsInstance(response, FileResponse)
+        self.assertIn('.xlsx', response['Content-Disposition'])
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        sheet = workbook['Analysis Results']
+        rows = list(sheet.iter_rows(values_only=True))
+
+        self.assertEqual(list(rows[0]), CSV_HEADERS)
+        self.assertEqual(len(rows), 4)
+        # Numbers and dates keep native types
+        self.assertIsInstance(rows[1][8], (int, float))
+        self.assertTrue(hasattr(rows[1][3], 'year'))
+        self.assertGreaterEqual(sheet.column_dimensions['C'].width, len('engineer@example.com'))
+
+
+class SummaryReportArtifactTestCase(ImageFixturesTestCase):
+    """Background summary reports served from cached artifacts"""
+
+    def get_summary(self, **extra):
+        return self.client.get(reverse('summary_report'), **extra)
+
+    def test_summary_generator_query_count(self):
+        from analysis.models import AnalysisResult
+
+        # condition counts, detailed records
+        with self.assertNumQueries(2):
+            pdf = PDFReportGenerator().generate_summary_report(None, AnalysisResult.objects.all())
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+    def test_summary_is_generated_once_for_unchanged_data(self):
+        self.client.force_login(self.user)
+
+        first = self.get_summary()
+        second = self.get_summary()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Type'], 'application/pdf')
+        self.assertEqual(second.status_code, 200)
+        artifact = ReportArtifact.objects.get()
+        self.assertEqual(artifact.status, 'ready')
+        self.assertEqual(artifact.progress, 100)
+
+    def test_changed_data_regenerates_and_replaces_artifact(self):
+        self.client.force_login(self.user)
+        self.get_summary()
+        old = ReportArtifact.objects.get()
+
+        self.create_analyzed(self.user, 'pothole', 'critical', 85)
+        self.get_summary()
+
+        artifact = ReportArtifact.objects.get()
+        self.assertNotEqual(artifact.pk, old.pk)
+        self.assertNotEqual(artifact.watermark, old.watermark)
+
+    def test_pending_report_returns_poll_url(self):
+        self.client.force_login(self.user)
+        self.get_summary()
+        artifact = ReportArtifact.objects.get()
+        ReportArtifact.objects.filter(pk=artifact.pk).update(status='running', progress=40)
+
+        response = self.get_summary(HTTP_ACCEPT='application/json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['progress'], 40)
+        poll = self.client.get(response.json()['poll_url'])
+        self.assertEqual(poll.status_code, 202)
+        self.assertIsNone(poll.json()['download_url'])
+
+        page = self.get_summary()
+        self.assertEqual(page.status_code, 202)
+        self.assertTemplateUsed(page, 'reports/report_pending.html')
+
+    def test_artifacts_are_private(self):
+        self.client.force_login(self.user)
+        self.get_summary()
+        artifact = ReportArtifact.objects.get()
+
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('report_artifact_download', args=[artifact.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_filter_key_is_order_independent(self):
+        self.assertEqual(
+            make_filter_key('summary', {'condition': 'poor', 'status': 'analyzed'}),
+            make_filter_key('summary', {'status': 'analyzed', 'condition': 'poor'}),
+        )
+
+
+class ReportBundleTestCase(ImageFixturesTestCase):
+    """Multi-image report bundles, rendered in a process pool inside Celery workers"""
+
+    url = '/api/reports/artifacts/bundle/'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.ids = list(
+            ImageRecord.objects.filter(user=self.user, analysis__isnull=False).order_by('id').values_list('id', flat=True)
+        )
+
+    def download(self, response):
+        return b''.join(self.client.get(response.json()['download_url']).streaming_content)
+
+    @override_settings(REPORT_BUNDLE_WORKERS=2)
+    def test_zip_bundle_contains_one_report_per_image(self):
+        # Sync mode runs the task eagerly in the request thread: no process pool
+        with mock.patch('reports.bundles.ProcessPoolExecutor') as pool:
+            response = self.client.post(self.url, {'ids': self.ids}, content_type='application/json')
+        pool.assert_not_called()
+
+        self.assertEqual(response.status_code, 200)
+        artifact = ReportArtifact.objects.get(kind='bundle')
+        self.assertEqual((artifact.status, artifact.progress), ('ready', 100))
+        with zipfile.ZipFile(io.BytesIO(self.download(response))) as archive:
+            names = archive.namelist()
+            self.assertEqual(names, [f'road_analysis_{pk}.pdf' for pk in self.ids])
+            self.assertTrue(archive.read(names[0]).startswith(b'%PDF'))
+
+    @override_settings(REPORT_BUNDLE_WORKERS=1)
+    def test_merged_pdf_bundle_from_filter(self):
+        response = self.client.post(
+            self.url, {'condition': 'critical', 'format': 'pdf'}, content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.download(response).startswith(b'%PDF'))
+        self.assertEqual(ReportArtifact.objects.get().params, {'format': 'pdf', 'condition': 'critical'})
+
+    @override_settings(REPORT_BUNDLE_WORKERS=1)
+    def test_repeat_bundle_reuses_artifact(self):
+        first = self.client.post(self.url, {'ids': self.ids}, content_type='application/json')
+        second = self.client.post(self.url, {'ids': list(reversed(self.ids))}, content_type='application/json')
+
+        self.assertEqual(first.json()['id'], second.json()['id'])
+        self.assertEqual(ReportArtifact.objects.count(), 1)
+
+    def test_worker_renders_in_a_process_pool(self):
+        analysis_results = list(
+            AnalysisResult.objects.filter(image_record_id__in=self.ids)
+            .select_related('image_record__user')
+            .order_by('image_record_id')
+        )
+        output = io.BytesIO()
+
+        with mock.patch('reports.bundles.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool:
+            write_bundle(analysis_results, output, 'zip', workers=2)
+
+        pool.assert_called_once()
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(archive.namelist(), [f'road_analysis_{pk}.pdf' for pk in self.ids])
+
+    def test_bundle_only_includes_own_images(self):
+        foreign = ImageRecord.objects.get(user=self.other).id
+
+        response = self.client.post(self.url, {'ids': [foreign]}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_bundle_requires_ids_or_filter(self):
+        response = self.client.post(self.url, {'format': 'zip'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
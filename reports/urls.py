@@ -5,5 +5,8 @@ urlpatterns = [
     path('generate/<int:pk>/', views.generate_report, name='generate_report'),
     path('preview/<int:pk>/', views.report_preview, name='report_preview'),
     path('export/csv/', views.export_csv, name='export_csv'),
+    path('export/excel/', views.export_excel, name='export_excel'),
     path('summary/', views.summary_report, name='summary_report'),
+    path('artifacts/<int:pk>/', views.report_artifact_status, name='report_artifact_status'),
+    path('artifacts/<int:pk>/download/', views.report_artifact_download, name='report_artifact_download'),
 ]
@@ -1,12 +1,17 @@
+import os
+
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, FileResponse
+from django.http import HttpResponse, FileResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.db.models import Q
 from datetime import datetime
 from core.models import ImageRecord
 from analysis.models import AnalysisResult
+from .artifacts import request_summary_report, summary_params
+from .models import ReportArtifact
 from .pdf_generator import PDFReportGenerator
-from .csv_exporter import export_analysis_to_csv
+from .csv_exporter import export_analysis_to_excel, iter_analysis_csv
 
 
 @login_required
@@ -36,63 +41,115 @@ def generate_report(request, pk):
     return response
 
 
-@login_required
-def export_csv(request):
-    """Export analysis data to CSV"""
+def _export_queryset(request):
+    """Analysis results the user may export, with the request's filters applied"""
     user = request.user
     
     # Get filter parameters
-    status_filter = request.GET.get('status', '')
     condition_filter = request.GET.get('condition', '')
     
     # Base queryset
     if user.is_admin:
-        analysis_results = AnalysisResult.objects.all().select_related('image_record__user')
+        analysis_results = AnalysisResult.objects.all()
     else:
-        analysis_results = AnalysisResult.objects.filter(
-            image_record__user=user
-        ).select_related('image_record')
+        analysis_results = AnalysisResult.objects.filter(image_record__user=user)
     
     # Apply filters
     if condition_filter:
         analysis_results = analysis_results.filter(condition_label=condition_filter)
     
-    # Generate CSV
-    csv_data = export_analysis_to_csv(analysis_results)
+    return analysis_results
+
+
+@login_required
+def export_csv(request):
+    """Export analysis data to CSV"""
+    analysis_results = _export_queryset(request)
     
-    # Create response
-    response = HttpResponse(csv_data, content_type='text/csv')
+    # Stream rows as they are read so memory stays flat for full-history exports
+    response = StreamingHttpResponse(iter_analysis_csv(analysis_results), content_type='text/csv')
     filename = f"road_analysis_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     
     return response
 
 
+@login_required
+def export_excel(request):
+    """Export analysis data to an Excel workbook"""
+    analysis_results = _export_queryset(request)
+    
+    # The workbook is built in a temporary file and streamed from disk
+    workbook = export_analysis_to_excel(analysis_results)
+    filename = f"road_analysis_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    
+    return FileResponse(
+        workbook,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def _artifact_payload(request, artifact):
+    """JSON status of a report artifact for pollers"""
+    return {
+        'id': artifact.id,
+        'kind': artifact.kind,
+        'status': artifact.status,
+        'progress': artifact.progress,
+        'error': artifact.error_message,
+        'poll_url': request.build_absolute_uri(reverse('report_artifact_status', args=[artifact.id])),
+        'download_url': (
+            request.build_absolute_uri(reverse('report_artifact_download', args=[artifact.id]))
+            if artifact.is_ready else None
+        ),
+    }
+
+
+def _serve_artifact(artifact):
+    extension = os.path.splitext(artifact.file.name)[1] or '.pdf'
+    filename = f"road_analysis_{artifact.kind}_{artifact.created_at.strftime('%Y%m%d')}{extension}"
+    return FileResponse(artifact.file.open('rb'), as_attachment=True, filename=filename)
+
+
+def _artifact_response(request, artifact):
+    """Serve a ready artifact, or answer 202 with a poll URL while it is generated"""
+    if artifact.is_ready:
+        return _serve_artifact(artifact)
+    
+    payload = _artifact_payload(request, artifact)
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse(payload, status=202)
+    return render(request, 'reports/report_pending.html', {'artifact': artifact, 'payload': payload}, status=202)
+
+
 @login_required
 def summary_report(request):
-    """Generate summary PDF report for all analyses"""
-    user = request.user
-    
-    # Get data
-    if user.is_admin:
-        image_records = ImageRecord.objects.all().select_related('user')
-        analysis_results = AnalysisResult.objects.all().select_related('image_record__user')
-    else:
-        image_records = ImageRecord.objects.filter(user=user)
-        analysis_results = AnalysisResult.objects.filter(
-            image_record__user=user
-        ).select_related('image_record')
-    
-    # Generate PDF
-    generator = PDFReportGenerator()
-    pdf = generator.generate_summary_report(image_records, analysis_results)
-    
-    # Create response
-    response = HttpResponse(pdf, content_type='application/pdf')
-    filename = f"road_analysis_summary_{datetime.now().strftime('%Y%m%d')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    """
+    Summary PDF report for all analyses the user can see.
+    
+    Served from a stored artifact when the data is unchanged; otherwise
+    generation is queued and a 202 response points at the poll URL.
+    """
+    artifact = request_summary_report(request.user, summary_params(request.GET))
+    return _artifact_response(request, artifact)
+
+
+@login_required
+def report_artifact_status(request, pk):
+    """Poll the generation status of a report artifact"""
+    artifact = get_object_or_404(ReportArtifact, pk=pk, user=request.user)
+    return JsonResponse(_artifact_payload(request, artifact), status=200 if artifact.is_ready else 202)
+
+
+@login_required
+def report_artifact_download(request, pk):
+    """Download a generated report artifact"""
+    artifact = get_object_or_404(ReportArtifact, pk=pk, user=request.user)
+    if not artifact.is_ready:
+        return JsonResponse(_artifact_payload(request, artifact), status=409)
+    return _serve_artifact(artifact)
 
 
 @login_required
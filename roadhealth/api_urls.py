@@ -13,4 +13,5 @@ urlpatterns = [
     path('accounts/', include('accounts.api_urls')),
     path('core/', include('core.api_urls')),
     path('analysis/', include('analysis.api_urls')),
+    path('reports/', include('reports.api_urls')),
 ]
@@ -198,21 +198,147 @@ GOOGLE_MAPS_API_KEY = config('GOOGLE_MAPS_API_KEY', default='')
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
 
+# Gemini vision client (analysis.remote_vision): one pooled HTTP session per
+# process, GEMINI_MAX_CONCURRENCY requests in flight, shared token-bucket rate
+# limit, retries with exponential backoff; images are downscaled to
+# GEMINI_IMAGE_MAX_SIZE on the long side and sent as JPEG
+GEMINI_MODEL = config('GEMINI_MODEL', default='gemini-1.5-flash')
+GEMINI_API_BASE_URL = config('GEMINI_API_BASE_URL', default='https://generativelanguage.googleapis.com/v1beta')
+GEMINI_MAX_CONCURRENCY = config('GEMINI_MAX_CONCURRENCY', default=4, cast=int)
+GEMINI_REQUESTS_PER_MINUTE = config('GEMINI_REQUESTS_PER_MINUTE', default=60, cast=int)
+GEMINI_MAX_RETRIES = config('GEMINI_MAX_RETRIES', default=4, cast=int)
+GEMINI_RETRY_BACKOFF = config('GEMINI_RETRY_BACKOFF', default=1.0, cast=float)
+GEMINI_TIMEOUT = config('GEMINI_TIMEOUT', default=60, cast=int)
+GEMINI_IMAGE_MAX_SIZE = config('GEMINI_IMAGE_MAX_SIZE', default=1024, cast=int)
+
+# Circuit breaker for Gemini (analysis.circuit_breaker): calls over LATENCY_BUDGET
+# seconds (retries included) count as failures; at ERROR_RATE failures among the
+# last WINDOW calls (once MIN_CALLS were made) requests go straight to the local
+# model for RESET_TIMEOUT seconds, then HALF_OPEN_PROBES calls test the endpoint
+GEMINI_CIRCUIT_BREAKER = {
+    'LATENCY_BUDGET': config('GEMINI_LATENCY_BUDGET', default=15.0, cast=float),  # 0 = no budget
+    'ERROR_RATE': config('GEMINI_BREAKER_ERROR_RATE', default=0.5, cast=float),
+    'MIN_CALLS': config('GEMINI_BREAKER_MIN_CALLS', default=5, cast=int),
+    'WINDOW': config('GEMINI_BREAKER_WINDOW', default=20, cast=int),
+    'RESET_TIMEOUT': config('GEMINI_BREAKER_RESET_TIMEOUT', default=30, cast=int),  # seconds
+    'HALF_OPEN_PROBES': config('GEMINI_BREAKER_HALF_OPEN_PROBES', default=1, cast=int),
+}
+
+# Detector cascade: with a Gemini key, the local model screens every image and
+# only those with a local severity score in [AI_CASCADE_BAND_LOW,
+# AI_CASCADE_BAND_HIGH) are sent to Gemini; see the cascade_report command
+AI_CASCADE_ENABLED = config('AI_CASCADE_ENABLED', default=False, cast=bool)
+AI_CASCADE_BAND_LOW = config('AI_CASCADE_BAND_LOW', default=3.0, cast=float)
+AI_CASCADE_BAND_HIGH = config('AI_CASCADE_BAND_HIGH', default=75.0, cast=float)
+GEMINI_COST_PER_REQUEST = config('GEMINI_COST_PER_REQUEST', default=0.0, cast=float)  # for cascade_report
+
+# Task execution mode
+# 'async' queues analysis and other background work on Celery (requires Redis and a worker);
+# 'sync' runs tasks inline in the request so small installs without Redis still work.
+TASK_EXECUTION_MODE = config('TASK_EXECUTION_MODE', default='sync')
+
 # Celery Configuration
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
+CELERY_TASK_ALWAYS_EAGER = TASK_EXECUTION_MODE == 'sync'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Dedicated analysis workers (manage.py run_analysis_workers)
+# 0 concurrency = one process per core divided by ANALYSIS_WORKER_THREADS
+ANALYSIS_WORKER_CONCURRENCY = config('ANALYSIS_WORKER_CONCURRENCY', default=0, cast=int)
+ANALYSIS_WORKER_THREADS = config('ANALYSIS_WORKER_THREADS', default=1, cast=int)
+
 # File Upload Settings
 MAX_UPLOAD_SIZE = 10485760  # 10MB
 ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/png', 'image/jpg']
 
+# Downscaled JPEG copies stored next to the originals ("<stem>.<preset>.jpg")
+IMAGE_DERIVATIVE_PRESETS = {
+    'thumb': {'size': (640, 640), 'quality': 80},     # image lists and cards
+    'report': {'size': (1600, 1600), 'quality': 85},  # PDF reports and detail pages
+}
+
+# Bulk upload: files per request and images per analysis batch
+BULK_UPLOAD_MAX_FILES = config('BULK_UPLOAD_MAX_FILES', default=5000, cast=int)
+BULK_UPLOAD_CHUNK_SIZE = config('BULK_UPLOAD_CHUNK_SIZE', default=32, cast=int)
+DATA_UPLOAD_MAX_NUMBER_FILES = BULK_UPLOAD_MAX_FILES + 1  # + the optional ZIP archive
+# ZIP members are decompressed into a temporary file first; larger ones spill to disk
+BULK_UPLOAD_SPOOL_SIZE = config('BULK_UPLOAD_SPOOL_SIZE', default=1024 * 1024, cast=int)  # bytes
+
+# Near-duplicate frames (core.dedup): a frame whose perceptual hash is within
+# DEDUP_MAX_DISTANCE bits of an analyzed frame of the same user, uploaded within
+# DEDUP_WINDOW seconds and (if geotagged) DEDUP_RADIUS_M metres, reuses that analysis
+DEDUP_ENABLED = config('DEDUP_ENABLED', default=True, cast=bool)
+DEDUP_MAX_DISTANCE = config('DEDUP_MAX_DISTANCE', default=6, cast=int)  # of 64 bits
+DEDUP_WINDOW = config('DEDUP_WINDOW', default=600, cast=int)  # seconds
+DEDUP_RADIUS_M = config('DEDUP_RADIUS_M', default=25, cast=float)
+
+# Report artifacts: pending/running generation older than this (seconds) is requeued
+REPORT_GENERATION_TIMEOUT = config('REPORT_GENERATION_TIMEOUT', default=900, cast=int)
+
+# Report bundles: process pool size for rendering and the largest bundle accepted
+REPORT_BUNDLE_WORKERS = config('REPORT_BUNDLE_WORKERS', default=min(4, os.cpu_count() or 1), cast=int)
+REPORT_BUNDLE_MAX_IMAGES = config('REPORT_BUNDLE_MAX_IMAGES', default=1000, cast=int)
+
 # AI Model Settings
 AI_MODEL_PATH = BASE_DIR / 'ai_models'
+# Trained model backend from analysis.backends ('onnxruntime'); empty uses the built-in edge detector
+AI_MODEL_BACKEND = config('AI_MODEL_BACKEND', default='')
+AI_MODEL_FILE = config('AI_MODEL_FILE', default='road_defects.onnx')  # relative to AI_MODEL_PATH
+# Model variant from AI_MODEL_PATH/manifest.json: fp32, fp16 (half-precision storage) or int8
+AI_MODEL_PRECISION = config('AI_MODEL_PRECISION', default='fp32')
+AI_INTRA_OP_THREADS = config('AI_INTRA_OP_THREADS', default=0, cast=int)  # 0 = runtime default
+AI_INTER_OP_THREADS = config('AI_INTER_OP_THREADS', default=0, cast=int)
 AI_CONFIDENCE_THRESHOLD = 0.5
+# Smallest long side of the frame annotated images are drawn on; uploads are
+# decoded at the largest JPEG reduction that keeps it (0 = full resolution)
+AI_ANNOTATION_MIN_SIZE = config('AI_ANNOTATION_MIN_SIZE', default=1600, cast=int)
+# Locate edge-dense regions in overlapping tiles and store/draw their bounding boxes
+AI_TILED_LOCALIZATION = config('AI_TILED_LOCALIZATION', default=True, cast=bool)
+
+# AI result cache, keyed on (image SHA-256, model name, model version)
+# BACKEND: 'lru' (in-process, one per worker), 'disk' (per host), 'django' (uses CACHES,
+# shared between hosts with REDIS_CACHE_URL) or 'none'. Hit/miss counters go to CACHES too.
+AI_RESULT_CACHE = {
+    'BACKEND': config('AI_RESULT_CACHE_BACKEND', default='lru'),
+    'MAX_ENTRIES': config('AI_RESULT_CACHE_MAX_ENTRIES', default=1024, cast=int),
+    'TTL': config('AI_RESULT_CACHE_TTL', default=7 * 24 * 3600, cast=int),  # seconds, 0 = no expiry
+    'LOCATION': config('AI_RESULT_CACHE_LOCATION', default=str(BASE_DIR / 'cache' / 'analysis_results')),
+    'CACHE_ALIAS': 'default',
+}
+
+# Map tiles: grid clustering below MAP_CLUSTER_MAX_ZOOM, individual points above
+MAP_CLUSTER_MAX_ZOOM = config('MAP_CLUSTER_MAX_ZOOM', default=15, cast=int)
+MAP_CLUSTER_GRID = config('MAP_CLUSTER_GRID', default=8, cast=int)  # cells per tile side
+MAP_TILE_MAX_POINTS = config('MAP_TILE_MAX_POINTS', default=2000, cast=int)
+MAP_TILE_CACHE_TIMEOUT = config('MAP_TILE_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+# Geohash length of the regions whose version keys cached tiles (4 = about 39 x 20 km)
+MAP_TILE_VERSION_PRECISION = config('MAP_TILE_VERSION_PRECISION', default=4, cast=int)
+# Tiles spanning regions shorter than this (about zoom 6 and below) are not versioned
+# and expire after MAP_TILE_COARSE_TIMEOUT instead of being rebuilt on every change
+MAP_TILE_MIN_VERSION_PRECISION = config('MAP_TILE_MIN_VERSION_PRECISION', default=2, cast=int)
+MAP_TILE_COARSE_TIMEOUT = config('MAP_TILE_COARSE_TIMEOUT', default=60, cast=int)  # seconds
+
+# Cache (tiles and their region version counters). LocMemCache is per process:
+# with TASK_EXECUTION_MODE=async, set REDIS_CACHE_URL so changes saved by Celery
+# workers invalidate the tiles cached by the web processes (check core.W001)
+REDIS_CACHE_URL = config('REDIS_CACHE_URL', default='')
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 # Logging
 LOGGING = {